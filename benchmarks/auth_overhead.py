@@ -0,0 +1,59 @@
+"""
+Per-request authentication overhead benchmark.
+
+Times the auth dependency used by RoleChecker (``Auth.get_token_user``) for a token
+whose version is already known to the worker, so no query is made and the numbers are
+pure JWT cost. Runs once with the verified-token cache disabled and once with it enabled.
+
+Usage::
+
+    python benchmarks/auth_overhead.py --calls 20000
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+from src.database.models import User, UserRole  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.cache import verified_token_cache  # noqa: E402
+from src.services.roles import RoleChecker  # noqa: E402
+
+
+async def measure(calls: int, token: str) -> float:
+    checker = RoleChecker([UserRole.Admin.name])
+    started = time.perf_counter()
+    for _ in range(calls):
+        await checker(token, None)
+    return (time.perf_counter() - started) / calls
+
+
+async def main(calls: int):
+    user = User(email="bench@example.com", user_role=UserRole.Admin.name, is_active=True, token_version=0)
+    token = await auth_service.create_user_access_token(user)
+    maxsize = verified_token_cache.maxsize
+
+    verified_token_cache.maxsize = 0  # every entry is evicted right away
+    verified_token_cache.clear()
+    without_cache = await measure(calls, token)
+
+    verified_token_cache.maxsize = maxsize
+    verified_token_cache.clear()
+    with_cache = await measure(calls, token)
+
+    print(f"calls={calls}")
+    print(f"without cache: {without_cache * 1e6:8.2f} us/request")
+    print(f"with cache:    {with_cache * 1e6:8.2f} us/request")
+    print(f"speedup:       {without_cache / with_cache:8.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls))
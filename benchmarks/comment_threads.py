@@ -0,0 +1,164 @@
+"""
+Thread rendering benchmark: the materialized path of comments against adjacency list reads.
+
+Fills a SQLite database with ``--posts`` posts of ``--comments`` comments each; a comment
+replies to a random earlier comment of its post with probability ``--reply-ratio`` and
+starts a thread otherwise. Then times, for one post, reading the whole thread in reply
+order, its first page of ``--limit`` comments and the subtree of its largest thread with:
+
+* ``get_thread``, one range scan of the (post_id, path) index;
+* a recursive CTE over parent_id that builds the sort path while reading;
+* one query per level of replies over parent_id, ordered in Python.
+
+The database is kept and reused by later runs with the same size.
+
+Usage::
+
+    python benchmarks/comment_threads.py --comments 10000
+"""
+import argparse
+import asyncio
+import math
+import os
+import pathlib
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import DateTime, create_engine, func, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+
+from src.database.comment_threads import COMMENT_PATH_WIDTH  # noqa: E402
+from src.database.models import Base, Comment  # noqa: E402
+from src.repository.comments import get_thread  # noqa: E402
+
+RECURSIVE_THREAD = """
+    WITH RECURSIVE thread(id, sort_path) AS (
+        SELECT id, printf('%010d', id) FROM comments
+        WHERE post_id = :post_id AND {roots}
+        UNION ALL
+        SELECT comments.id, thread.sort_path || printf('%010d', comments.id)
+        FROM comments JOIN thread ON comments.parent_id = thread.id
+    )
+    SELECT comments.id, comments.comment_text, comments.created_at, comments.updated_at, comments.user_id,
+           comments.parent_id, comments.reply_count, users.first_name, users.last_name, users.username
+    FROM thread JOIN comments ON comments.id = thread.id JOIN users ON users.id = comments.user_id
+    ORDER BY thread.sort_path LIMIT :limit
+"""
+
+
+def fill(path: str, posts: int, comments: int, reply_ratio: float):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = random.Random(1)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO users(id, username, email, password, first_name, last_name) "
+                                   "VALUES (1, 'bench', 'b@b', 'x', 'Bench', 'Mark')")
+        connection.exec_driver_sql("INSERT INTO posts(id, photo_url, description, user_id) "
+                                   "VALUES (?, 'media/bench.jpg', 'bench', 1)", [(index,) for index in
+                                                                                 range(1, posts + 1)])
+        next_id = 1
+        for post_id in range(1, posts + 1):
+            rows = []
+            for index in range(comments):
+                parent = rng.randrange(next_id - index, next_id) if index and rng.random() < reply_ratio else None
+                rows.append((next_id, f"comment {index}", post_id, parent))
+                next_id += 1
+            # one row at a time, so that the trigger finds the path of the parent
+            connection.exec_driver_sql("INSERT INTO comments(id, comment_text, post_id, user_id, parent_id) "
+                                       "VALUES (?, ?, ?, 1, ?)", rows)
+    engine.dispose()
+
+
+async def by_level(db: AsyncSession, post_id: int, root_id: int | None, limit: int) -> list:
+    level = (await db.execute(select(Comment, text("users.username")).join_from(Comment, Comment.user)
+                              .filter(Comment.post_id == post_id, Comment.parent_id.is_(None) if root_id is None
+                                      else Comment.id == root_id))).all()
+    children = defaultdict(list)
+    roots = [row.Comment.id for row in level]
+    while level:
+        ids = [row.Comment.id for row in level]
+        level = (await db.execute(select(Comment, text("users.username")).join_from(Comment, Comment.user)
+                                  .filter(Comment.parent_id.in_(ids)))).all()
+        for row in level:
+            children[row.Comment.parent_id].append(row.Comment.id)
+    ordered, stack = [], list(reversed(sorted(roots)))
+    while stack and len(ordered) < limit:
+        comment_id = stack.pop()
+        ordered.append(comment_id)
+        stack.extend(reversed(sorted(children[comment_id])))
+    return ordered
+
+
+async def timed(read, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await read()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[math.ceil(len(samples) * 0.95) - 1]
+
+
+async def measure(path: str, comments: int, limit: int, repeat: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with AsyncSession(engine) as db:
+        post_id = 1
+        root, size = (await db.execute(
+            select(func.substr(Comment.path, 1, COMMENT_PATH_WIDTH), func.count()).filter_by(post_id=post_id)
+            .group_by(func.substr(Comment.path, 1, COMMENT_PATH_WIDTH)).order_by(func.count().desc()).limit(1))
+        ).one()
+        root_id = int(root)
+        depth = await db.scalar(select(func.max(func.length(Comment.path) // COMMENT_PATH_WIDTH))
+                                .filter_by(post_id=post_id))
+        print(f"comments={comments} limit={limit} deepest reply={depth - 1} largest thread={size}")
+
+        def recursive(root: int | None, rows: int):
+            roots = "parent_id IS NULL" if root is None else f"id = {root}"
+            # the dates are read as datetimes, like the other reads do
+            sql = text(RECURSIVE_THREAD.format(roots=roots)).columns(created_at=DateTime, updated_at=DateTime)
+            return lambda: db.execute(sql, {"post_id": post_id, "limit": rows})
+
+        cases = {
+            "whole thread": (None, comments),
+            f"first {limit}": (None, limit),
+            "largest subtree": (root_id, size),
+        }
+        for name, (root, rows) in cases.items():
+            reads = {
+                "materialized path": lambda: get_thread(0, rows, db, post_id, root),
+                "recursive CTE": recursive(root, rows),
+                "query per level": lambda: by_level(db, post_id, root, rows),
+            }
+            print(f"  {name}")
+            for read_name, read in reads.items():
+                p50, p95 = await timed(read, repeat)
+                print(f"    {read_name:18s} p50 {p50 * 1e3:8.2f} ms p95 {p95 * 1e3:8.2f} ms")
+    await engine.dispose()
+
+
+def main(posts: int, comments: int, reply_ratio: float, limit: int, repeat: int, directory: str):
+    path = os.path.join(directory, f"comment_threads_bench_{posts}_{comments}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        fill(path, posts, comments, reply_ratio)
+        print(f"filled {posts * comments} comments in {time.perf_counter() - started:.1f} s")
+    asyncio.run(measure(path, comments, limit, repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--reply-ratio", type=float, default=0.8)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--dir", default=".")
+    args = parser.parse_args()
+    main(args.posts, args.comments, args.reply_ratio, args.limit, args.repeat, args.dir)
@@ -0,0 +1,106 @@
+"""
+Load benchmark: concurrent mixed read/write traffic against the ASGI app.
+
+Runs the application in-process through ``httpx.AsyncClient`` so every request
+shares one event loop, exactly like a single uvicorn worker. Reports
+requests-per-second and latency percentiles.
+
+Usage::
+
+    POSTGRES_URL=sqlite:///./bench.db python benchmarks/load_mixed_traffic.py --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from main import app  # noqa: E402
+from src.database.connect import DATABASE_URL  # noqa: E402
+from src.database.models import Base, Post, Comment, User  # noqa: E402
+
+USER = {"username": "bench", "first_name": "bench", "last_name": "bench",
+        "email": "bench@example.com", "password": "benchmark"}
+
+
+def seed(posts: int):
+    engine = create_engine(DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    author = User(username="author", first_name="author", last_name="author", email="author@example.com",
+                  password="x")
+    db.add(author)
+    db.commit()
+    for i in range(posts):
+        post = Post(photo_url=f"media/{i}.jpg", description=f"bench photo {i}", user_id=author.id)
+        db.add(post)
+        db.flush()
+        db.add_all([Comment(post_id=post.id, user_id=author.id, comment_text=f"comment {j}") for j in range(5)])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+async def run(total: int, concurrency: int, posts: int):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/auth/signup", json=USER)
+        response = await client.post("/api/auth/login", data={"username": USER["email"], "password": USER["password"]})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        def pick():
+            post_id = random.randint(1, posts)
+            return random.choice([
+                lambda: client.get(f"/api/posts/p/{post_id}"),
+                lambda: client.get(f"/api/{post_id}/comments/", params={"limit": 20}),
+                lambda: client.post("/api/search/posts", json={"search_str": "photo 1", "sort": "date"},
+                                    headers=headers),
+                lambda: client.post(f"/api/rate/{post_id}", json={"rate": random.randint(1, 5)}, headers=headers),
+                lambda: client.get("/api/rate/", headers=headers),
+            ])
+
+        latencies = []
+        errors = 0
+        queue = asyncio.Queue()
+        for _ in range(total):
+            queue.put_nowait(pick())
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                call = queue.get_nowait()
+                started = time.perf_counter()
+                response = await call()
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code >= 500
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"requests={total} concurrency={concurrency} rps={total / elapsed:.1f} "
+          f"p50={p50:.1f}ms p99={p99:.1f}ms errors={errors}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--posts", type=int, default=200)
+    args = parser.parse_args()
+    seed(args.posts)
+    asyncio.run(run(args.requests, args.concurrency, args.posts))
@@ -0,0 +1,79 @@
+"""
+Login throughput benchmark.
+
+Fires logins from 1, 8 and 64 concurrent clients while a probe client pings
+``GET /`` to show how long other endpoints on the same worker are stalled by
+password hashing.
+
+Usage::
+
+    POSTGRES_URL=sqlite:///./bench.db python benchmarks/login_throughput.py --logins 64
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from main import app  # noqa: E402
+from src.database.connect import DATABASE_URL  # noqa: E402
+from src.database.models import Base  # noqa: E402
+
+USER = {"username": "bench", "first_name": "bench", "last_name": "bench",
+        "email": "bench@example.com", "password": "benchmark"}
+
+
+async def run(logins: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/auth/signup", json=USER)
+        form = {"username": USER["email"], "password": USER["password"]}
+        remaining = logins
+        statuses = {}
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.post("/api/auth/login", data=form)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    probe_latencies.sort()
+    probe_max = probe_latencies[-1] * 1000 if probe_latencies else 0
+    print(f"concurrency={concurrency} logins={logins} logins/s={logins / elapsed:.1f} "
+          f"probe_max={probe_max:.1f}ms statuses={statuses}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+    engine = create_engine(DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    for concurrency in (1, 8, 64):
+        asyncio.run(run(args.logins, concurrency))
@@ -0,0 +1,105 @@
+"""
+Deep page latency benchmark: ``skip`` (OFFSET) against the keyset cursor.
+
+Fills a SQLite database with the comments of one post and with posts, ``--rows`` of each,
+one second apart. Then times pages 1, 100 and 1000 (``--pages``) of ``--limit`` rows of
+``get_comments`` and of the search sorted by date, once reached with ``skip`` and once
+with the cursor of the page before, which is read beforehand and not timed.
+The database is kept and reused by later runs with the same size.
+
+Usage::
+
+    python benchmarks/pagination.py --rows 100000 --pages 1 100 1000
+"""
+import argparse
+import asyncio
+import math
+import os
+import pathlib
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+
+from src.database.models import Base  # noqa: E402
+from src.repository.comments import get_comments  # noqa: E402
+from src.repository.search import get_search_posts  # noqa: E402
+from src.services.pagination import decode_cursor  # noqa: E402
+
+CHUNK = 10000
+START = datetime(2026, 1, 1)
+
+
+def fill(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO users(id, username, email, password) VALUES (1, 'bench', 'b@b', 'x')")
+        for start in range(0, rows, CHUNK):
+            dates = [(index + 1, str(START + timedelta(seconds=index)))
+                     for index in range(start, min(start + CHUNK, rows))]
+            connection.exec_driver_sql("INSERT INTO posts(id, photo_url, description, user_id, created_at, "
+                                       "updated_at) VALUES (?, 'media/bench.jpg', 'bench', 1, ?, ?)",
+                                       [(post_id, date, date) for post_id, date in dates])
+            connection.exec_driver_sql("INSERT INTO comments(comment_text, post_id, user_id, created_at) "
+                                       "VALUES ('bench', 1, 1, ?)", [(date,) for _, date in dates])
+    engine.dispose()
+
+
+async def timed(read, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await read()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[math.ceil(len(samples) * 0.95) - 1]
+
+
+async def measure(path: str, rows: int, pages: list[int], limit: int, repeat: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    lists = {
+        "comments": lambda skip, cursor, db: get_comments(skip, limit, db, 1, cursor),
+        "search by date": lambda skip, cursor, db: get_search_posts('', 'date', 1, skip, limit, db, cursor),
+    }
+    async with AsyncSession(engine) as db:
+        print(f"rows={rows} limit={limit}")
+        for name, read in lists.items():
+            for page in pages:
+                skip = (page - 1) * limit
+                cursor = None
+                if page > 1:
+                    cursor = decode_cursor((await read(skip - limit, None, db)).next_cursor)
+                offset = await timed(lambda: read(skip, None, db), repeat)
+                keyset = await timed(lambda: read(0, cursor, db), repeat)
+                print(f"  {name:14s} page {page:5d} offset p50 {offset[0] * 1e3:8.2f} ms p95 {offset[1] * 1e3:8.2f} ms"
+                      f" | cursor p50 {keyset[0] * 1e3:6.2f} ms p95 {keyset[1] * 1e3:6.2f} ms"
+                      f" | {offset[0] / keyset[0]:6.1f}x")
+    await engine.dispose()
+
+
+def main(rows: int, pages: list[int], limit: int, repeat: int, directory: str):
+    path = os.path.join(directory, f"pagination_bench_{rows}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        fill(path, rows)
+        print(f"filled {rows} rows in {time.perf_counter() - started:.1f} s")
+    asyncio.run(measure(path, rows, pages, limit, repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--dir", default=".")
+    args = parser.parse_args()
+    main(args.rows, args.pages, args.limit, args.repeat, args.dir)
@@ -0,0 +1,130 @@
+"""
+Rating write throughput under contention.
+
+``--workers`` concurrent clients, each with its own session, rate ``--posts`` posts as
+``--users`` users (so several clients write the same rate at once) ``--rates`` times each.
+Runs the former read-then-write path of ``set_rate_for_image`` (select the post, select
+the rate, insert or update it, commit, refresh), the single upsert statement and the
+write-behind buffer (timed until its last flush is written), and reports rates per second and the requests that failed: on the unique constraint, or with
+"database is locked" when SQLite gives up on a lock upgrade.
+
+Usage::
+
+    python benchmarks/rate_writes.py --workers 16 --rates 200
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import and_, create_engine, delete, select  # noqa: E402
+from sqlalchemy.exc import IntegrityError, OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from src.database.models import Base, Post, RatePost, User  # noqa: E402
+from src.repository.rates import set_rate_for_image  # noqa: E402
+from src.services.rate_buffer import RateBuffer  # noqa: E402
+
+PATH = "rate_bench.db"
+
+
+async def read_then_write(image_id: int, user_rate: int, current_user: User, db) -> RatePost:
+    post = await db.scalar(select(Post).filter(and_(Post.id == image_id, Post.user_id != current_user.id)))
+    rate = None
+    if post:
+        rate = await db.scalar(select(RatePost).filter(and_(RatePost.photo_id == image_id,
+                                                            RatePost.user_id == current_user.id)))
+        if rate is None:
+            rate = RatePost(photo_id=image_id, user_id=current_user.id, rate=user_rate)
+            db.add(rate)
+        else:
+            rate.rate = user_rate
+            rate.updated_at = datetime.now()
+        await db.commit()
+        await db.refresh(rate)
+    return rate
+
+
+def fill(posts: int, users: int):
+    engine = create_engine(f"sqlite:///{PATH}")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO users(id, username, email, password) VALUES (?, ?, ?, 'x')",
+                                   [(index, f"u{index}", f"u{index}@b") for index in range(1, users + 2)])
+        # posted by a user that does not rate
+        connection.exec_driver_sql("INSERT INTO posts(id, photo_url, user_id) VALUES (?, 'media/bench.jpg', ?)",
+                                   [(index, users + 1) for index in range(1, posts + 1)])
+    engine.dispose()
+
+
+async def run(rate, workers: int, rates: int, posts: int, users: int) -> tuple[float, dict]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{PATH}", connect_args={"timeout": 60}, pool_size=workers)
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with sessions() as db:
+        await db.execute(delete(RatePost))
+        await db.commit()
+    errors = {"duplicate": 0, "locked": 0}
+
+    async def client(seed: int):
+        rng = random.Random(seed)
+        async with sessions() as db:
+            for _ in range(rates):
+                user = User(id=rng.randint(1, users))
+                try:
+                    await rate(rng.randint(1, posts), rng.randint(1, 5), user, db)
+                except IntegrityError:
+                    await db.rollback()
+                    errors["duplicate"] += 1
+                except OperationalError:
+                    await db.rollback()
+                    errors["locked"] += 1
+
+    buffer = None
+    if rate == "write-behind":
+        buffer = RateBuffer(sessions)
+
+        async def rate(image_id: int, user_rate: int, current_user: User, db):
+            buffer.add(image_id, current_user.id, user_rate)
+            await asyncio.sleep(0)  # a request handler yields to the event loop at least once
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(workers)))
+    if buffer is not None:
+        await buffer.shutdown()
+        stats = buffer.stats()
+        errors["flushes"], errors["batch_size_avg"] = stats["flushes"], stats["batch_size_avg"]
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return workers * rates / elapsed, errors
+
+
+async def main(workers: int, rates: int, posts: int, users: int):
+    fill(posts, users)
+    print(f"workers={workers} rates={rates} posts={posts} users={users}")
+    for name, rate in (("read then write", read_then_write), ("upsert", set_rate_for_image),
+                       ("write-behind", "write-behind")):
+        throughput, errors = await run(rate, workers, rates, posts, users)
+        print(f"{name:16s} {throughput:9.1f} rates/s   failed: {errors['duplicate']} duplicate, "
+              f"{errors['locked']} locked", end="")
+        if "flushes" in errors:
+            print(f"   {errors['flushes']} flushes of {errors['batch_size_avg']:.1f} rates", end="")
+        print()
+    os.remove(PATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rates", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=4)
+    parser.add_argument("--users", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.rates, args.posts, args.users))
@@ -0,0 +1,118 @@
+"""
+Post search latency benchmark: full-text index against the former ilike query.
+
+Fills a SQLite database with ``--posts`` posts (descriptions of random words and three
+tags each; the FTS5 index is kept by the same triggers the app uses), then times the
+first page of search results for a frequent word, a rare word, a word prefix and two
+words, with the former ``ilike`` query over the tag joins and with ``match_posts``.
+The database is kept and reused by later runs with the same size.
+
+Usage::
+
+    python benchmarks/search_fts.py --posts 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import os
+import pathlib
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine, desc, func, or_, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+
+from src.database.models import Base, Post, RatePost, Tag, User, post_tag  # noqa: E402
+from src.database.search_index import search_document, search_terms  # noqa: E402
+from src.repository.search import match_posts  # noqa: E402
+
+WORDS = [f"w{index:05d}" for index in range(20000)]
+TAGS = [f"tag{index:04d}" for index in range(2000)]
+QUERIES = {"frequent word": "w00001", "rare word": "w19999", "prefix": "w1999", "two words": "w00001 w00002"}
+# Zipf: the n-th word is n times rarer than the first one
+WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+CHUNK = 10000
+
+
+def fill(path: str, posts: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = random.Random(posts)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO users(id, username, email, password) VALUES (1, 'bench', 'b@b', 'x')")
+        connection.exec_driver_sql("INSERT INTO tags(id, tag, user_id) VALUES (?, ?, 1)",
+                                   [(index + 1, tag) for index, tag in enumerate(TAGS)])
+        for start in range(0, posts, CHUNK):
+            rows, links = [], []
+            for post_id in range(start + 1, min(start + CHUNK, posts) + 1):
+                description = ' '.join(rng.choices(WORDS, cum_weights=WEIGHTS, k=rng.randint(3, 12)))
+                tag_ids = rng.sample(range(len(TAGS)), 3)
+                rows.append((post_id, description, search_document(description, [TAGS[i] for i in tag_ids])))
+                links.extend((post_id, tag_id + 1) for tag_id in tag_ids)
+            connection.exec_driver_sql("INSERT INTO posts(id, photo_url, description, search_vector, user_id, "
+                                       "created_at) VALUES (?, 'media/bench.jpg', ?, ?, 1, datetime('now'))", rows)
+            connection.exec_driver_sql("INSERT INTO post_tag(post, tag) VALUES (?, ?)", links)
+    engine.dispose()
+
+
+def ilike_query(search_str: str):
+    return select(Post.id, User.username, func.coalesce(func.avg(RatePost.rate), 0).label('rate')) \
+        .select_from(Post).join(User).join(RatePost, isouter=True) \
+        .join(post_tag, isouter=True).join(Tag, isouter=True) \
+        .filter(or_(Post.description.ilike(f'%{search_str}%'), Tag.tag.ilike(f'%{search_str}%'))) \
+        .group_by(Post.id, User.username).order_by(desc(Post.created_at)).limit(20)
+
+
+def fts_query(search_str: str, db: AsyncSession):
+    sql = select(Post.id, User.username, Post.rate_avg.label('rate')).select_from(Post).join(User)
+    return match_posts(sql, search_terms(search_str), db) \
+        .order_by(desc(Post.created_at)).limit(20)
+
+
+async def timed(db: AsyncSession, sql, repeat: int) -> tuple[float, float, int]:
+    samples, found = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = len((await db.execute(sql)).all())
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[math.ceil(len(samples) * 0.95) - 1], found
+
+
+async def measure(path: str, posts: int, repeat: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with AsyncSession(engine) as db:
+        print(f"posts={posts}")
+        for name, search_str in QUERIES.items():
+            ilike = await timed(db, ilike_query(search_str), max(1, repeat // 10 if posts >= 100000 else repeat))
+            fts = await timed(db, fts_query(search_str, db), repeat)
+            print(f"  {name:14s} ilike p50 {ilike[0] * 1e3:9.2f} ms p95 {ilike[1] * 1e3:9.2f} ms | "
+                  f"fts p50 {fts[0] * 1e3:7.2f} ms p95 {fts[1] * 1e3:7.2f} ms | "
+                  f"{ilike[0] / fts[0]:7.1f}x ({fts[2]} rows)")
+    await engine.dispose()
+
+
+def main(sizes: list[int], repeat: int, directory: str):
+    for posts in sizes:
+        path = os.path.join(directory, f"search_bench_{posts}.db")
+        if not os.path.exists(path):
+            started = time.perf_counter()
+            fill(path, posts)
+            print(f"filled {posts} posts in {time.perf_counter() - started:.1f} s")
+        asyncio.run(measure(path, posts, repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--dir", default=".")
+    args = parser.parse_args()
+    main(args.posts, args.repeat, args.dir)
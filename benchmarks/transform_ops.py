@@ -0,0 +1,116 @@
+"""
+Local transform engine throughput per effect.
+
+Renders every operation of ``TransformImageModel`` ``--iterations`` times on a generated
+photo of ``--width`` x ``--height`` pixels and reports operations per second and latency
+percentiles, first in-process (one core) and then through the process pool of the local
+backend with ``--workers`` workers, and finally the same requests again, served from its cache::
+
+    python benchmarks/transform_ops.py --width 1920 --height 1280 --iterations 20 --workers 2
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from src.database.models import Post  # noqa: E402
+from src.schemas_transform_posts import TransformImageModel  # noqa: E402
+from src.services.local_transform import render_transformation  # noqa: E402
+from src.services.transform_backends import LocalTransformBackend  # noqa: E402
+
+EFFECTS = {
+    "resize fill": {"resize": {"width": 480, "height": 480, "crop": "fill"}},
+    "resize pad": {"resize": {"width": 480, "height": 480, "crop": "pad", "background": "white"}},
+    "crop": {"resize": {"width": 480, "height": 480, "crop": "crop", "gravity": "north_east"}},
+    "rotate": {"rotate": {"degree": 30}},
+    "radius": {"radius": {"all": 60}},
+    "art_effect": {"art_effect": {"effect": "sizzle"}},
+    "grayscale": {"simple_effect": [{"effect": "grayscale", "strength": 100}]},
+    "negative": {"simple_effect": [{"effect": "negative", "strength": 100}]},
+    "black_white": {"simple_effect": [{"effect": "black_white", "strength": 50}]},
+    "cartoonify": {"simple_effect": [{"effect": "cartoonify", "strength": 80}]},
+    "oil_paint": {"simple_effect": [{"effect": "oil_paint", "strength": 50}]},
+    "contrast": {"contrast_effect": [{"effect": "contrast", "level": 40}]},
+    "blur_region": {"blur_effect": [{"effect": "blur_region", "strength": 800,
+                                     "x": 100, "y": 100, "width": 400, "height": 400}]},
+}
+
+
+def make_photo(path: str, width: int, height: int):
+    image = Image.radial_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, 64):
+        draw.line((i, 0, width - i, height), fill=(i % 256, 80, 200), width=5)
+    image.save(path, 'JPEG', quality=90)
+
+
+def report(name: str, latencies: list[float], elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(f"{name:<14} {len(latencies) / elapsed:8.1f} ops/s  p50 {statistics.median(latencies) * 1000:7.1f} ms"
+          f"  p95 {p95 * 1000:7.1f} ms")
+
+
+async def run_pool(source: str, workdir: str, iterations: int, workers: int):
+    backend = LocalTransformBackend(output_dir=workdir, workers=workers)
+    # renderings are cached per source image, so every iteration gets its own (hard-linked) copy
+    sources = [os.path.join(workdir, f"photo-{i}.jpg") for i in range(iterations)]
+    for path in sources:
+        os.link(source, path)
+    # start the worker processes before measuring
+    await asyncio.gather(*(backend.transform(Post(photo_url=source), TransformImageModel()) for _ in range(workers)))
+
+    async def timed(path: str, body: TransformImageModel) -> float:
+        started = time.perf_counter()
+        await backend.transform(Post(photo_url=path), body)
+        return time.perf_counter() - started
+
+    print(f"\nprocess pool, {workers} workers")
+    for name, transformation in EFFECTS.items():
+        body = TransformImageModel(**transformation)
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(timed(path, body) for path in sources))
+        report(name, latencies, time.perf_counter() - started)
+
+    body = TransformImageModel(**EFFECTS["rotate"])
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(path, body) for path in sources))
+    report("cached", latencies, time.perf_counter() - started)
+    print(backend.stats()["cache"])
+    await backend.shutdown()
+
+
+def run(width: int, height: int, iterations: int, workers: int):
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "photo.jpg")
+        make_photo(source, width, height)
+        print(f"{width}x{height} photo, {iterations} iterations per effect\n\nin-process")
+        for name, transformation in EFFECTS.items():
+            data = TransformImageModel(**transformation).dict()
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(iterations):
+                begin = time.perf_counter()
+                render_transformation(source, data, os.path.join(workdir, "out"))
+                latencies.append(time.perf_counter() - begin)
+            report(name, latencies, time.perf_counter() - started)
+        asyncio.run(run_pool(source, workdir, iterations, workers))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1280)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    run(args.width, args.height, args.iterations, args.workers)
@@ -0,0 +1,90 @@
+"""
+Concurrent large upload memory benchmark.
+
+Sends ``--uploads`` photos of ``--size-mb`` MB each to ``POST /api/posts/p`` from
+``--concurrency`` clients and reports the peak of Python heap allocations (tracemalloc)
+and the peak RSS of the process, together with how long a ``GET /`` probe was stalled.
+
+Run it in a fresh process per configuration, since peak RSS never goes down::
+
+    POSTGRES_URL=sqlite:///./bench.db python benchmarks/upload_memory.py --size-mb 20 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault("POSTGRES_URL", "sqlite:///./bench.db")
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from main import app  # noqa: E402
+from src.database.connect import DATABASE_URL  # noqa: E402
+from src.database.models import Base  # noqa: E402
+
+USER = {"username": "bench", "first_name": "bench", "last_name": "bench",
+        "email": "bench@example.com", "password": "benchmark"}
+
+
+async def run(uploads: int, concurrency: int, size_mb: int):
+    photo = b'\x89PNG\r\n\x1a\n' + os.urandom(size_mb * 1024 * 1024 - 8)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/auth/signup", json=USER)
+        response = await client.post("/api/auth/login",
+                                      data={"username": USER["email"], "password": USER["password"]})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        remaining = uploads
+        statuses = {}
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.post("/api/posts/p", params={"description": "bench"}, headers=headers,
+                                             files={"img_file": ("photo.png", photo, "image/png")})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"uploads={uploads} size={size_mb}MB concurrency={concurrency} statuses={statuses} "
+          f"elapsed={elapsed:.2f}s heap_peak={(peak - baseline) / 2 ** 20:.1f}MB rss_peak={rss:.1f}MB "
+          f"probe_max={max(probe_latencies) * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=20)
+    args = parser.parse_args()
+    engine = create_engine(DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    asyncio.run(run(args.uploads, args.concurrency, args.size_mb))
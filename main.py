@@ -1,23 +1,53 @@
+import logging
+
 import uvicorn
 import pathlib
 
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.connect import get_db
-from src.routes import auth, posts, users, transform_posts, rates, comments, search
+from src.database.connect import SessionLocal, get_db
+from src.repository.tags import warm_tag_cache
+from src.routes import auth, posts, users, transform_posts, rates, comments, search, metrics, post_events
 from src.services.messages_templates import DB_CONFIG_ERROR, DB_CONNECT_ERROR, WELCOME_MESSAGE
+from src.services.derivatives import derivative_pool
+from src.services.passwords import password_pool
+from src.services.post_events import post_events as post_event_hub
+from src.services.rate_buffer import rate_buffer
+from src.services.transform_backends import transform_backend
 
 app = FastAPI()
 pathlib.Path("media").mkdir(exist_ok=True)
 app.mount("/media", StaticFiles(directory="media"), name="media")
+logger = logging.getLogger(__name__)
+
+
+@app.on_event("startup")
+async def startup():
+    try:
+        async with SessionLocal() as db:
+            await warm_tag_cache(db)
+    except Exception:
+        # tags are then cached as they are used
+        logger.warning("tag cache warm-up failed", exc_info=True)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await password_pool.shutdown()
+    await derivative_pool.shutdown()
+    await transform_backend.shutdown()
+    await rate_buffer.shutdown()
+    await post_event_hub.shutdown()
+
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = await db.execute(text("SELECT 1"))
+        result = result.fetchone()
         if result is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail=DB_CONFIG_ERROR)
@@ -39,6 +69,8 @@ app.include_router(transform_posts.router, prefix='/api')
 app.include_router(rates.router, prefix='/api')
 app.include_router(search.router, prefix='/api')
 app.include_router(comments.router, prefix='/api')
+app.include_router(metrics.router, prefix='/api')
+app.include_router(post_events.router, prefix='/api')
 
 if __name__ == '__main__':
     uvicorn.run(app="main:app", reload=True)
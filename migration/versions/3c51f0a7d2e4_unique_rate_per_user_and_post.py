@@ -0,0 +1,49 @@
+"""unique rate per user and post
+
+Revision ID: 3c51f0a7d2e4
+Revises: a0dbc98e15af
+Create Date: 2026-10-17 20:12:37.608114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.rate_aggregates import POSTGRESQL_RATE_DDL, SQLITE_RATE_DDL, SQLITE_RATE_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = '3c51f0a7d2e4'
+down_revision = 'a0dbc98e15af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keep the latest rate of every user and post
+    op.execute("""
+        DELETE FROM rates_posts WHERE id NOT IN (
+            SELECT max(id) FROM rates_posts GROUP BY photo_id, user_id
+        )
+    """)
+    with op.batch_alter_table('rates_posts') as batch_op:
+        batch_op.create_unique_constraint('uq_rates_posts_photo_id_user_id', ['photo_id', 'user_id'])
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    for statement in POSTGRESQL_RATE_DDL if is_postgresql else SQLITE_RATE_DDL:
+        op.execute(statement)
+    op.execute("""
+        UPDATE posts SET
+            rate_sum = (SELECT coalesce(sum(rate), 0) FROM rates_posts WHERE rates_posts.photo_id = posts.id),
+            rate_count = (SELECT count(*) FROM rates_posts WHERE rates_posts.photo_id = posts.id),
+            rate_avg = coalesce((SELECT avg(rate) FROM rates_posts WHERE rates_posts.photo_id = posts.id), 0)
+    """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS rates_posts_aggregate ON rates_posts")
+        op.execute("DROP FUNCTION IF EXISTS rates_posts_aggregate()")
+    else:
+        for trigger in SQLITE_RATE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    with op.batch_alter_table('rates_posts') as batch_op:
+        batch_op.drop_constraint('uq_rates_posts_photo_id_user_id', type_='unique')
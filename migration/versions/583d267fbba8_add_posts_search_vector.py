@@ -0,0 +1,49 @@
+"""add posts search_vector
+
+Revision ID: 583d267fbba8
+Revises: fe2e4499d206
+Create Date: 2026-10-17 18:52:40.117204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.database.search_index import SQLITE_FTS_DDL, SQLITE_FTS_TABLE, TEXT_SEARCH_CONFIG
+
+
+# revision identifiers, used by Alembic.
+revision = '583d267fbba8'
+down_revision = 'fe2e4499d206'
+branch_labels = None
+depends_on = None
+
+# description and tag names of every post, as search_document() builds them
+DOCUMENT = """trim(coalesce(posts.description, '') || ' ' || coalesce((
+    SELECT {aggregate} FROM post_tag JOIN tags ON tags.id = post_tag.tag WHERE post_tag.post = posts.id
+), ''))"""
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        document = DOCUMENT.format(aggregate="string_agg(tags.tag, ' ' ORDER BY post_tag.id)")
+        op.execute(f"UPDATE posts SET search_vector = to_tsvector('{TEXT_SEARCH_CONFIG}', {document})")
+        op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], unique=False, postgresql_using='gin')
+    else:
+        op.add_column('posts', sa.Column('search_vector', sa.Text(), nullable=True))
+        document = DOCUMENT.format(aggregate="group_concat(tags.tag, ' ')")
+        op.execute(f"UPDATE posts SET search_vector = {document}")
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        op.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_posts_search_vector', table_name='posts', postgresql_using='gin')
+    else:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+    op.drop_column('posts', 'search_vector')
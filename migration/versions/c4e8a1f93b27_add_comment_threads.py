@@ -0,0 +1,57 @@
+"""add comment threads
+
+Revision ID: c4e8a1f93b27
+Revises: b7e19c0d4f52
+Create Date: 2026-10-17 23:41:12.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.comment_threads import POSTGRESQL_PATH_SEGMENT, POSTGRESQL_THREAD_DDL, SQLITE_PATH_SEGMENT, \
+    SQLITE_THREAD_DDL, SQLITE_THREAD_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f93b27'
+down_revision = 'b7e19c0d4f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('path', sa.String(collation='C') if is_postgresql else sa.String(),
+                                      nullable=True))
+        batch_op.add_column(sa.Column('reply_count', sa.Integer(), server_default='0', nullable=False))
+    # every existing comment is the root of its own thread
+    segment = POSTGRESQL_PATH_SEGMENT if is_postgresql else SQLITE_PATH_SEGMENT
+    op.execute(f"UPDATE comments SET path = {segment.format(id='id')}")
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.alter_column('path', existing_type=sa.String(), nullable=False, server_default='')
+        batch_op.create_foreign_key('fk_comments_parent_id_comments', 'comments', ['parent_id'], ['id'],
+                                    ondelete='CASCADE')
+        batch_op.create_index('ix_comments_parent_id', ['parent_id'], unique=False)
+        batch_op.create_index('ix_comments_post_id_path', ['post_id', 'path'], unique=False)
+    for statement in POSTGRESQL_THREAD_DDL if is_postgresql else SQLITE_THREAD_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS comments_thread_insert ON comments")
+        op.execute("DROP TRIGGER IF EXISTS comments_thread_delete ON comments")
+        op.execute("DROP FUNCTION IF EXISTS comments_thread()")
+    else:
+        for trigger in SQLITE_THREAD_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    # replies become comments of their own
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.drop_index('ix_comments_post_id_path')
+        batch_op.drop_index('ix_comments_parent_id')
+        batch_op.drop_constraint('fk_comments_parent_id_comments', type_='foreignkey')
+        batch_op.drop_column('reply_count')
+        batch_op.drop_column('path')
+        batch_op.drop_column('parent_id')
@@ -0,0 +1,38 @@
+"""add comment count to posts
+
+Revision ID: d91f3a6b2c08
+Revises: c4e8a1f93b27
+Create Date: 2026-10-18 00:52:37.114209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.comment_counts import POSTGRESQL_COMMENT_COUNT_DDL, SQLITE_COMMENT_COUNT_DDL, \
+    SQLITE_COMMENT_COUNT_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = 'd91f3a6b2c08'
+down_revision = 'c4e8a1f93b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    for statement in POSTGRESQL_COMMENT_COUNT_DDL if is_postgresql else SQLITE_COMMENT_COUNT_DDL:
+        op.execute(statement)
+    op.execute("UPDATE posts SET comment_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS comments_count ON comments")
+        op.execute("DROP FUNCTION IF EXISTS comments_count()")
+    else:
+        for trigger in SQLITE_COMMENT_COUNT_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    # not a batch operation: rebuilding posts on SQLite breaks the triggers of rates_posts that update it
+    op.drop_column('posts', 'comment_count')
@@ -0,0 +1,27 @@
+"""
+Prints how much disk space the content-addressed media store saves.
+
+Usage::
+
+    python -m src.commands.media_report
+"""
+import asyncio
+
+from src.database.connect import SessionLocal, engine
+from src.repository.media import get_dedup_report
+
+
+async def main():
+    async with SessionLocal() as db:
+        report = await get_dedup_report(db)
+    await engine.dispose()
+    print(f"files stored:      {report['files']}")
+    print(f"post references:   {report['references']}")
+    print(f"stored bytes:      {report['stored_bytes']}")
+    print(f"logical bytes:     {report['logical_bytes']}")
+    print(f"bytes saved:       {report['bytes_saved']}")
+    print(f"dedup ratio:       {report['dedup_ratio']:.2f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
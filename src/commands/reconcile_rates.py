@@ -0,0 +1,24 @@
+"""
+Rebuilds the rate aggregates of posts (sum, count and average) from rates_posts.
+The triggers of rates_posts keep them current; this fixes the posts rated while the
+triggers were missing or disabled, e.g. by a bulk load.
+
+Usage::
+
+    python -m src.commands.reconcile_rates
+"""
+import asyncio
+
+from src.database.connect import SessionLocal, engine
+from src.repository.rates import rebuild_rate_aggregates
+
+
+async def main():
+    async with SessionLocal() as db:
+        fixed = await rebuild_rate_aggregates(db)
+    await engine.dispose()
+    print(f"posts fixed:       {fixed}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""
+Uploads the photos of posts that are not on Cloudinary yet: posts created before the
+upload state was recorded, posts whose upload failed, or uploads cut short by a restart.
+
+Usage::
+
+    python -m src.commands.upload_pending [--limit 100]
+"""
+import argparse
+import asyncio
+
+from src.database.connect import engine
+from src.services.remote_uploads import remote_uploader
+
+
+async def main(limit: int):
+    done = await remote_uploader.upload_pending(limit)
+    await engine.dispose()
+    stats = remote_uploader.stats()
+    print(f"uploaded:          {stats['uploaded']}")
+    print(f"already uploaded:  {stats['reused']}")
+    print(f"retries:           {stats['retries']}")
+    print(f"failed:            {stats['failed']}")
+    print(f"posts ready:       {done}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.limit))
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseSettings
 
 
@@ -6,6 +8,33 @@ class Settings(BaseSettings):
     cloudinary_name: str = 'cloud_name'
     cloudinary_api_key: str = 'api_key'
     cloudinary_api_secret: str = 'api_secret'
+    password_pool_kind: str = 'thread'
+    password_pool_workers: int = 4
+    password_pool_queue_size: int = 64
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 60.0
+    token_cache_size: int = 4096
+    tag_cache_size: int = 4096
+    tag_cache_ttl: float = 3600.0
+    media_dir: str = 'media'
+    upload_max_size: int = 20 * 1024 * 1024
+    derivative_widths: List[int] = [160, 480, 1080]
+    derivative_workers: int = 2
+    transform_backend: str = 'cloudinary'
+    transform_workers: int = 2
+    transform_cache_max_bytes: int = 512 * 1024 * 1024
+    transform_max_pixels: int = 25_000_000
+    remote_upload_attempts: int = 5
+    remote_upload_backoff: float = 1.0
+    rate_write_behind: bool = False
+    rate_flush_interval: float = 0.5
+    rate_flush_size: int = 500
+    rate_buffer_max_pending: int = 10000
+    post_events_broker: str = 'local'
+    post_events_redis_url: str = 'redis://localhost:6379/0'
+    post_events_queue_size: int = 100
+    post_events_heartbeat: float = 15.0
+    posts_batch_max_size: int = 100
 
     class Config:
         env_file = ".env"
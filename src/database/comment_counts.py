@@ -0,0 +1,29 @@
+"""
+Comment counts of posts.
+
+``posts.comment_count`` is kept by triggers on ``comments``, as the rate aggregates are on
+``rates_posts``: every inserted or deleted comment changes the count of its post by one,
+including the replies deleted with a comment, by the foreign key cascade on PostgreSQL and
+by the range delete of the thread trigger on SQLite.
+"""
+
+_CHANGE = "UPDATE posts SET comment_count = comment_count {sign} 1 WHERE id = {row}.post_id;"
+
+SQLITE_COMMENT_COUNT_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS comments_count_insert AFTER INSERT ON comments BEGIN "
+    f"{_CHANGE.format(sign='+', row='new')} END",
+    # also fired by the deletes of the thread trigger, which is another trigger
+    "CREATE TRIGGER IF NOT EXISTS comments_count_delete AFTER DELETE ON comments BEGIN "
+    f"{_CHANGE.format(sign='-', row='old')} END",
+)
+
+POSTGRESQL_COMMENT_COUNT_DDL = (
+    "CREATE OR REPLACE FUNCTION comments_count() RETURNS trigger AS $$ BEGIN "
+    f"IF TG_OP = 'INSERT' THEN {_CHANGE.format(sign='+', row='NEW')} "
+    f"ELSE {_CHANGE.format(sign='-', row='OLD')} END IF; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER comments_count AFTER INSERT OR DELETE ON comments "
+    "FOR EACH ROW EXECUTE FUNCTION comments_count()",
+)
+
+SQLITE_COMMENT_COUNT_TRIGGERS = ('comments_count_insert', 'comments_count_delete')
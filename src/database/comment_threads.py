@@ -0,0 +1,52 @@
+"""
+Reply threads of comments.
+
+``comments.path`` is the materialized path of a comment: the ids of the comments from the
+root of its thread down to it, each zero-padded to ``COMMENT_PATH_WIDTH`` digits. Sorting
+the comments of a post by path lists every thread in reply order, and the replies below a
+comment are the paths in ``[path, path || '~')``, so both are one range of the
+``(post_id, path)`` index. ``comments.reply_count`` counts the direct replies of a comment.
+
+Both are kept by triggers, so a comment is written with a single statement and comments
+inserted or deleted outside the repository are accounted for too. Deleting a comment
+deletes the replies below it: with the foreign key cascade on PostgreSQL, with a range
+delete on SQLite, where foreign keys are not enforced.
+"""
+
+# width of the zero-padded comment ids a path is made of
+COMMENT_PATH_WIDTH = 10
+
+# sorts after every digit of a path, so that path || SUBTREE_END bounds the subtree of path
+SUBTREE_END = '~'
+
+# the id zero-padded to COMMENT_PATH_WIDTH digits
+SQLITE_PATH_SEGMENT = f"substr('{'0' * COMMENT_PATH_WIDTH}' || {{id}}, -{COMMENT_PATH_WIDTH})"
+POSTGRESQL_PATH_SEGMENT = f"lpad({{id}}::text, {COMMENT_PATH_WIDTH}, '0')"
+
+_PARENT_PATH = "coalesce((SELECT path FROM comments WHERE id = {row}.parent_id), '')"
+_COUNT_REPLY = "UPDATE comments SET reply_count = reply_count {sign} 1 WHERE id = {row}.parent_id;"
+
+SQLITE_THREAD_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS comments_thread_insert AFTER INSERT ON comments BEGIN "
+    f"UPDATE comments SET path = {_PARENT_PATH.format(row='new')} || {SQLITE_PATH_SEGMENT.format(id='new.id')} "
+    "WHERE id = new.id; "
+    f"{_COUNT_REPLY.format(sign='+', row='new')} END",
+    "CREATE TRIGGER IF NOT EXISTS comments_thread_delete AFTER DELETE ON comments BEGIN "
+    f"DELETE FROM comments WHERE post_id = old.post_id AND path > old.path AND path < old.path || '{SUBTREE_END}'; "
+    f"{_COUNT_REPLY.format(sign='-', row='old')} END",
+)
+
+POSTGRESQL_THREAD_DDL = (
+    "CREATE OR REPLACE FUNCTION comments_thread() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    f"NEW.path := {_PARENT_PATH.format(row='NEW')} || {POSTGRESQL_PATH_SEGMENT.format(id='NEW.id')}; "
+    f"{_COUNT_REPLY.format(sign='+', row='NEW')} RETURN NEW; END IF; "
+    f"{_COUNT_REPLY.format(sign='-', row='OLD')} RETURN NULL; END $$ LANGUAGE plpgsql",
+    # the id of a new row is known before it is inserted on PostgreSQL
+    "CREATE TRIGGER comments_thread_insert BEFORE INSERT ON comments "
+    "FOR EACH ROW EXECUTE FUNCTION comments_thread()",
+    "CREATE TRIGGER comments_thread_delete AFTER DELETE ON comments "
+    "FOR EACH ROW EXECUTE FUNCTION comments_thread()",
+)
+
+SQLITE_THREAD_TRIGGERS = ('comments_thread_insert', 'comments_thread_delete')
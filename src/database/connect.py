@@ -1,17 +1,49 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 from src.conf.config import settings
 
 DATABASE_URL = settings.postgres_url
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_async_url(url: str) -> str:
+    """
+    Maps a synchronous database URL (the one Alembic uses) to its asyncio driver.
 
-def get_db():
-    db = SessionLocal()
-    try:
+    :param url: Database URL with a sync driver, e.g. ``postgresql://...`` or ``sqlite:///...``
+    :type url: str
+    :return: The same URL using ``asyncpg`` for PostgreSQL or ``aiosqlite`` for SQLite
+    :rtype: str
+    """
+    scheme, sep, rest = url.partition("://")
+    drivers = {
+        "postgres": "postgresql+asyncpg",
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }
+    return f"{drivers.get(scheme, scheme)}{sep}{rest}"
+
+
+def dialect_insert(db: AsyncSession):
+    """
+    Returns the ``insert()`` construct of the session's dialect, which has ``on_conflict_do_*``.
+
+    :param db: Database session
+    :type db: AsyncSession
+    :return: ``sqlalchemy.dialects.postgresql.insert`` or ``sqlalchemy.dialects.sqlite.insert``
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+ASYNC_DATABASE_URL = get_async_url(DATABASE_URL)
+
+engine = create_async_engine(ASYNC_DATABASE_URL)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,10 +1,16 @@
 import enum
 
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, func, Table, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, func, Table, Boolean, Index, DDL, event, inspect, \
+    Float, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, backref, deferred, Session
 from sqlalchemy.sql.sqltypes import DateTime
 
+from src.database.comment_counts import SQLITE_COMMENT_COUNT_DDL, POSTGRESQL_COMMENT_COUNT_DDL
+from src.database.comment_threads import COMMENT_PATH_WIDTH, SQLITE_THREAD_DDL, POSTGRESQL_THREAD_DDL
+from src.database.rate_aggregates import SQLITE_RATE_DDL, POSTGRESQL_RATE_DDL
+from src.database.search_index import TSVector, SQLITE_FTS_DDL, SQLITE_FTS_TABLE, search_document
+
 Base = declarative_base()
 
 
@@ -14,6 +20,12 @@ class UserRole(int, enum.Enum):
     User = 3
 
 
+class UploadStatus(str, enum.Enum):
+    pending = 'pending'
+    uploaded = 'uploaded'
+    failed = 'failed'
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,6 +40,22 @@ class User(Base):
     updated_at = Column('updated_at', DateTime, default=func.now())
     is_active = Column(Boolean, default=True)
     user_role = Column(Integer, default=UserRole.User.name)
+    token_version = Column(Integer, default=0, server_default='0', nullable=False)  # bumped to make issued access tokens stale
+
+    __table_args__ = (
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
+
+
+class MediaBlob(Base):
+    __tablename__ = "media_blobs"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    path = Column(String(), nullable=False)
+    size = Column(Integer, nullable=False)
+    refcount = Column(Integer, default=0, nullable=False)  # number of posts using the file
+    created_at = Column('created_at', DateTime, default=func.now())
 
 
 post_tag = Table('post_tag',
@@ -49,12 +77,48 @@ class Post(Base):
     created_at = Column('created_at', DateTime, default=func.now())
     updated_at = Column('updated_at', DateTime, default=func.now())
     user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
+    media_id = Column(Integer, ForeignKey(MediaBlob.id), nullable=True)
+    remote_public_id = Column(String(), nullable=True)  # Cloudinary public_id once the photo is uploaded
+    upload_status = Column(String(20), default=UploadStatus.pending.value, server_default=UploadStatus.pending.value,
+                           nullable=False, index=True)
+    upload_attempts = Column(Integer, default=0, server_default='0', nullable=False)
+    search_vector = deferred(Column(TSVector()))  # description and tag names, maintained on flush
+    # aggregates of rates_posts, maintained by the triggers of src.database.rate_aggregates
+    rate_sum = Column(Integer, default=0, server_default='0', nullable=False)
+    rate_count = Column(Integer, default=0, server_default='0', nullable=False)
+    rate_avg = Column(Float, default=0, server_default='0', nullable=False)
+    # number of comments, maintained by the triggers of src.database.comment_counts
+    comment_count = Column(Integer, default=0, server_default='0', nullable=False)
     marked = Column(Boolean, default=False)  # deletion mark
     marked = Column(Boolean)  # deletion mark
     tags = relationship("Tag", secondary=post_tag,
                         backref="posts", passive_deletes=True)
     user = relationship('User', backref="photos")
 
+    __table_args__ = (
+        Index('ix_posts_search_vector', 'search_vector', postgresql_using='gin').ddl_if(dialect='postgresql'),
+        # sort keys of the paginated lists: (sort column, id)
+        Index('ix_posts_created_at_id', 'created_at', 'id'),
+        Index('ix_posts_rate_avg_id', 'rate_avg', 'id'),
+        Index('ix_posts_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Post.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Post.__table__, 'before_drop',
+             DDL(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}").execute_if(dialect='sqlite'))
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_search_vector(session, flush_context, instances):
+    for post in [*session.new, *session.dirty]:
+        if not isinstance(post, Post):
+            continue
+        state = inspect(post)
+        if state.pending or state.attrs.description.history.has_changes() or state.attrs.tags.history.has_changes():
+            post.search_vector = search_document(post.description, [tag.tag for tag in post.tags])
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -66,10 +130,34 @@ class Comment(Base):
 
     post_id = Column(Integer, ForeignKey(Post.id, ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey(User.id))
+    parent_id = Column(Integer, ForeignKey('comments.id', ondelete="CASCADE"), nullable=True, index=True)
+    # reply thread, maintained by the triggers of src.database.comment_threads; paths are compared
+    # byte by byte whatever the collation of the database
+    path = Column(String().with_variant(String(collation='C'), 'postgresql'), nullable=False, server_default='')
+    reply_count = Column(Integer, nullable=False, server_default='0')
 
     user = relationship('User', backref="comments")
     post = relationship('Post', backref="comments")
 
+    __table_args__ = (
+        Index('ix_comments_post_id_created_at_id', 'post_id', 'created_at', 'id'),
+        Index('ix_comments_post_id_path', 'post_id', 'path'),
+    )
+
+    @property
+    def depth(self) -> int:
+        return len(self.path) // COMMENT_PATH_WIDTH - 1
+
+
+for statement in SQLITE_THREAD_DDL:
+    event.listen(Comment.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_THREAD_DDL:
+    event.listen(Comment.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_COMMENT_COUNT_DDL:
+    event.listen(Comment.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_COMMENT_COUNT_DDL:
+    event.listen(Comment.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -93,6 +181,25 @@ class TransformPosts(Base):
 
     post = relationship('Post', backref="transform_posts")
 
+    __table_args__ = (
+        Index('ix_transform_posts_created_at_id', 'created_at', 'id'),
+        Index('ix_transform_posts_photo_id_created_at_id', 'photo_id', 'created_at', 'id'),
+    )
+
+
+class PostDerivative(Base):
+    __tablename__ = 'post_derivatives'
+
+    id = Column(Integer, primary_key=True)
+    photo_url = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    post_id = Column(Integer, ForeignKey(Post.id, ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column('created_at', DateTime, default=func.now())
+
+    post = relationship('Post', backref=backref("derivatives", order_by="PostDerivative.width",
+                                                passive_deletes=True))
+
 
 class RatePost(Base):
     __tablename__ = 'rates_posts'
@@ -106,3 +213,15 @@ class RatePost(Base):
 
     post = relationship('Post', backref="rates_posts")
     user = relationship('User', backref="rates_posts")
+
+    __table_args__ = (
+        UniqueConstraint('photo_id', 'user_id', name='uq_rates_posts_photo_id_user_id'),
+        Index('ix_rates_posts_photo_id_created_at_id', 'photo_id', 'created_at', 'id'),
+        Index('ix_rates_posts_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+
+
+for statement in SQLITE_RATE_DDL:
+    event.listen(RatePost.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_RATE_DDL:
+    event.listen(RatePost.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
@@ -0,0 +1,40 @@
+"""
+Rate aggregates of posts.
+
+``posts.rate_sum``, ``rate_count`` and ``rate_avg`` are kept by triggers on ``rates_posts``,
+so a rate is written with a single statement and rates removed by a cascade are accounted
+for too. Every trigger changes the aggregates relative to the stored values: concurrent
+rates of one post are serialized by the lock on its row.
+"""
+
+# the average after adding {sign}{rate} to the sum and {sign}1 to the count
+_AVERAGE = "CASE WHEN rate_count {sign} 1 > 0 " \
+           "THEN CAST(rate_sum {sign} coalesce({rate}, 0) AS DOUBLE PRECISION) / (rate_count {sign} 1) ELSE 0 END"
+
+
+def _change(sign: str, row: str) -> str:
+    rate = f"{row}.rate"
+    return f"UPDATE posts SET rate_sum = rate_sum {sign} coalesce({rate}, 0), rate_count = rate_count {sign} 1, " \
+           f"rate_avg = {_AVERAGE.format(sign=sign, rate=rate)} WHERE id = {row}.photo_id;"
+
+
+SQLITE_RATE_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS rates_posts_aggregate_insert AFTER INSERT ON rates_posts BEGIN "
+    f"{_change('+', 'new')} END",
+    "CREATE TRIGGER IF NOT EXISTS rates_posts_aggregate_delete AFTER DELETE ON rates_posts BEGIN "
+    f"{_change('-', 'old')} END",
+    # also taken by INSERT ... ON CONFLICT DO UPDATE
+    "CREATE TRIGGER IF NOT EXISTS rates_posts_aggregate_update AFTER UPDATE OF rate, photo_id ON rates_posts BEGIN "
+    f"{_change('-', 'old')} {_change('+', 'new')} END",
+)
+
+POSTGRESQL_RATE_DDL = (
+    "CREATE OR REPLACE FUNCTION rates_posts_aggregate() RETURNS trigger AS $$ BEGIN "
+    f"IF TG_OP IN ('UPDATE', 'DELETE') THEN {_change('-', 'OLD')} END IF; "
+    f"IF TG_OP IN ('INSERT', 'UPDATE') THEN {_change('+', 'NEW')} END IF; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER rates_posts_aggregate AFTER INSERT OR UPDATE OF rate, photo_id OR DELETE ON rates_posts "
+    "FOR EACH ROW EXECUTE FUNCTION rates_posts_aggregate()",
+)
+
+SQLITE_RATE_TRIGGERS = ('rates_posts_aggregate_insert', 'rates_posts_aggregate_delete', 'rates_posts_aggregate_update')
@@ -0,0 +1,106 @@
+"""
+Full-text search index of posts.
+
+PostgreSQL keeps a ``tsvector`` of the description and tag names in ``posts.search_vector``
+with a GIN index. SQLite has no ``tsvector``: the column holds the plain text and an
+external-content FTS5 table, ``posts_fts``, kept in sync by triggers, indexes it.
+"""
+import re
+
+from sqlalchemy import Text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import TypeDecorator
+
+# no stemming and no stop words: descriptions and tags are written in several languages
+TEXT_SEARCH_CONFIG = 'simple'
+
+SQLITE_FTS_TABLE = 'posts_fts'
+
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(search_vector, content='posts', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, search_vector) VALUES (new.id, new.search_vector); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, search_vector) VALUES ('delete', old.id, old.search_vector); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF search_vector ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, search_vector) VALUES ('delete', old.id, old.search_vector); "
+    "INSERT INTO posts_fts(rowid, search_vector) VALUES (new.id, new.search_vector); END",
+)
+
+
+class to_search_vector(FunctionElement):
+    """
+    ``to_tsvector()`` on PostgreSQL, the text itself on other databases.
+    """
+    inherit_cache = True
+
+
+@compiles(to_search_vector)
+def _compile_to_search_vector(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(to_search_vector, 'postgresql')
+def _compile_to_search_vector_postgresql(element, compiler, **kw):
+    return f"to_tsvector('{TEXT_SEARCH_CONFIG}', {compiler.process(element.clauses, **kw)})"
+
+
+class TSVector(TypeDecorator):
+    """
+    Column type of the search document: ``TSVECTOR`` on PostgreSQL, ``TEXT`` elsewhere.
+    Values are written as plain text and converted by the database.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.TSVECTOR())
+        return dialect.type_descriptor(Text())
+
+    def bind_expression(self, bindvalue):
+        return to_search_vector(bindvalue)
+
+
+def search_document(description: str | None, tags: list[str]) -> str:
+    """
+    Builds the text that is indexed for a post.
+
+    :param description: Description of the post
+    :param tags: Tag names of the post
+    :return: Description and tag names separated by spaces
+    """
+    return ' '.join([description or '', *tags]).strip()
+
+
+def search_terms(search_str: str) -> list[str]:
+    """
+    Splits a search string into words. Anything but letters and digits is dropped,
+    so the words are safe to put into a ``tsquery`` or an FTS5 query.
+
+    :param search_str: Search string as typed by the user
+    :return: Lower-cased words
+    """
+    return re.findall(r'[^\W_]+', search_str.lower())
+
+
+def postgresql_prefix_query(terms: list[str]) -> str:
+    """
+    Builds a ``to_tsquery`` argument matching posts with words starting with every term.
+
+    :param terms: Words from search_terms
+    :return: E.g. ``sun:* & set:*``
+    """
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def sqlite_prefix_query(terms: list[str]) -> str:
+    """
+    Builds an FTS5 query matching posts with words starting with every term.
+
+    :param terms: Words from search_terms
+    :return: E.g. ``"sun"* "set"*``
+    """
+    return ' '.join(f'"{term}"*' for term in terms)
@@ -1,40 +1,58 @@
 from datetime import datetime
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from src.database.comment_threads import COMMENT_PATH_WIDTH, SUBTREE_END
 from src.database.models import User, Comment, Post
-from src.schemas import CommentModel
+from src.schemas import CommentBase, CommentModel
+from src.services.pagination import Page, next_cursor, paginate
+from src.services.post_events import post_events
 
+# comments are listed oldest first
+COMMENT_PAGE_KEYS = (Comment.created_at, Comment.id)
+# threads are listed in reply order: every comment followed by the replies below it
+THREAD_PAGE_KEYS = (Comment.path,)
 
-async def create_comment(body: CommentModel, id_of_post: int, db: Session, current_user):
+
+async def create_comment(body: CommentModel, id_of_post: int, db: AsyncSession, current_user,
+                         parent_id: int | None = None):
     """
     The create_comment function creates a new comment in the database.
         Args:
             body (CommentModel): The CommentModel object that contains the data for creating a new comment.
             id_of_post (int): The ID of the post to which this comment belongs.
-            db (Session): A Session instance used to query and update our database.
+            db (AsyncSession): A Session instance used to query and update our database.
 
     :param body: CommentModel: Get the comment_text from the user
     :param id_of_post: int: Identify the post that the comment is being added to
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: Get the user_id of the current user
-    :return: A comment object
+    :param parent_id: int | None: The comment of the same post this one replies to
+    :return: A comment object, None when there is no such post or parent comment
     :doc-author: Trelent
     """
-    post = db.query(Post).filter_by(id=id_of_post).first()
-    if not post:
+    if parent_id is None:
+        found = await db.scalar(select(Post.id).filter_by(id=id_of_post))
+    else:
+        found = await db.scalar(select(Comment.id).filter_by(id=parent_id, post_id=id_of_post))
+    if not found:
         return None
     comment = Comment(
         comment_text=body.comment_text,
         post_id=id_of_post,
-        user_id=current_user.id
+        user_id=current_user.id,
+        parent_id=parent_id
     )
     db.add(comment)
-    db.commit()
+    await db.commit()
+    await db.refresh(comment)
+    await post_events.publish(id_of_post, "comment_created", CommentBase.from_orm(comment))
     return comment
 
 
-async def get_comments(skip: int, limit: int, db: Session, id_of_post: int):
+async def get_comments(skip: int, limit: int, db: AsyncSession, id_of_post: int, cursor: list | None = None):
     """
     The get_comments function takes in a skip, limit, db and id_of_post.
     It then queries the database for all comments that have the same post_id as id_of_post.
@@ -42,46 +60,99 @@ async def get_comments(skip: int, limit: int, db: Session, id_of_post: int):
 
     :param skip: int: Skip a certain amount of comments
     :param limit: int: Limit the number of comments returned
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param id_of_post: int: Filter the comments by post_id
-    :return: A list of comments
+    :param cursor: list | None: Continue after this cursor instead of skipping comments
+    :return: A page of comments
     :doc-author: Trelent
     """
-    comments = db.query(Comment).filter_by(post_id=id_of_post).offset(skip).limit(limit).all()
-    return comments
+    sql = select(Comment).filter_by(post_id=id_of_post)
+    comments = (await db.scalars(paginate(sql, COMMENT_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(comments, next_cursor(comments, limit, COMMENT_PAGE_KEYS))
+
+
+def _select_with_users(*columns):
+    return select(Comment.id, Comment.comment_text, Comment.created_at, Comment.updated_at, Comment.user_id,
+                  Comment.parent_id, Comment.reply_count,
+                  (func.length(Comment.path) // COMMENT_PATH_WIDTH - 1).label('depth'), *columns,
+                  User.first_name.label('user_first_name'), User.last_name.label('user_last_name'), User.username) \
+        .join(User, Comment.user_id == User.id)
+
+
+async def get_comments_with_users(skip: int, limit: int, db: AsyncSession, id_of_post: int,
+                                  cursor: list | None = None):
+    """
+    The get_comments_with_users function returns a page of the comments of a post together with
+    the name fields of their authors, read with one statement.
+
+    :param skip: int: Skip a certain amount of comments
+    :param limit: int: Limit the number of comments returned
+    :param db: AsyncSession: Pass the database session to the function
+    :param id_of_post: int: Filter the comments by post_id
+    :param cursor: list | None: Continue after this cursor instead of skipping comments
+    :return: A page of rows with the comment columns, user_first_name, user_last_name and username
+    """
+    sql = _select_with_users().filter(Comment.post_id == id_of_post)
+    rows = (await db.execute(paginate(sql, COMMENT_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(rows, next_cursor(rows, limit, COMMENT_PAGE_KEYS))
+
+
+async def get_thread(skip: int, limit: int, db: AsyncSession, id_of_post: int, comment_id: int | None = None,
+                     cursor: list | None = None):
+    """
+    The get_thread function returns a page of the comments of a post in reply order, each followed
+    by the replies below it, together with the name fields of their authors. With a comment_id it
+    returns the subtree of that comment only, the comment first. Either is read with one statement,
+    a range scan of the (post_id, path) index.
+
+    :param skip: int: Skip a certain amount of comments
+    :param limit: int: Limit the number of comments returned
+    :param db: AsyncSession: Pass the database session to the function
+    :param id_of_post: int: Filter the comments by post_id
+    :param comment_id: int | None: Root of the subtree to return, the whole post when None
+    :param cursor: list | None: Continue after this cursor instead of skipping comments
+    :return: A page of rows with the comment columns, user_first_name, user_last_name and username
+    """
+    sql = _select_with_users(Comment.path).filter(Comment.post_id == id_of_post)
+    if comment_id is not None:
+        top = aliased(Comment)
+        root = select(top.path).filter(top.id == comment_id, top.post_id == id_of_post).scalar_subquery()
+        sql = sql.filter(Comment.path >= root, Comment.path < root + SUBTREE_END)
+    rows = (await db.execute(paginate(sql, THREAD_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(rows, next_cursor(rows, limit, THREAD_PAGE_KEYS))
 
 
-async def get_comment(db: Session, comment_id: int):
+async def get_comment(db: AsyncSession, comment_id: int):
     """
     The get_comment function takes in a comment_id and returns the Comment object with that id.
         Args:
-            db (Session): The database session to use for querying.
+            db (AsyncSession): The database session to use for querying.
             comment_id (int): The id of the Comment to retrieve from the database.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param comment_id: int: Filter the query to return only a single comment
     :return: The comment object with the given id
     :doc-author: Trelent
     """
-    comment = db.query(Comment).filter_by(id=comment_id).first()
+    comment = await db.scalar(select(Comment).filter_by(id=comment_id))
     return comment
 
 
-async def get_user_by_comment_id(db: Session, user_id: int):
+async def get_user_by_comment_id(db: AsyncSession, user_id: int):
     """
     The get_user_by_comment_id function takes in a database session and a user_id,
     and returns the User object associated with that id. If no such user exists, it returns None.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param user_id: int: Filter the user by id
     :return: The user associated with the comment
     :doc-author: Trelent
     """
-    user = db.query(User).filter_by(id=user_id).first()
+    user = await db.scalar(select(User).filter_by(id=user_id))
     return user
 
 
-async def edit_comments(comment_id: int, body: CommentModel, db: Session, current_user: User):
+async def edit_comments(comment_id: int, body: CommentModel, db: AsyncSession, current_user: User):
     """
     The edit_comments function takes in a comment_id, body, db and current_user.
     It then queries the database for a comment with the given id and user id. If it finds one,
@@ -90,33 +161,37 @@ async def edit_comments(comment_id: int, body: CommentModel, db: Session, curren
 
     :param comment_id: int: Identify the comment to be deleted
     :param body: CommentModel: Pass the data from the request body to the function
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Check if the user is authorized to edit the comment
     :return: The comment that was edited
     :doc-author: Trelent
     """
-    comment = db.query(Comment).filter_by(id=comment_id, user_id=current_user.id).first()
+    comment = await db.scalar(select(Comment).filter_by(id=comment_id, user_id=current_user.id))
     if comment:
         comment.comment_text = body.comment_text
         comment.updated_at = datetime.now()
-        db.commit()
+        await db.commit()
+        await post_events.publish(comment.post_id, "comment_updated", CommentBase.from_orm(comment))
     return comment
 
 
-async def delete_comments(comment_id: int, db: Session):
+async def delete_comments(comment_id: int, db: AsyncSession):
     """
-    The delete_comments function deletes a comment from the database.
+    The delete_comments function deletes a comment and the replies below it from the database.
         Args:
             comment_id (int): The id of the comment to be deleted.
             current_user (User): The user who is deleting the comment.
-            db (Session): A session object for interacting with our database.
+            db (AsyncSession): A session object for interacting with our database.
 
     :param comment_id: int: Identify the comment that is to be deleted
-    :param db: Session: Pass in the database session
+    :param db: AsyncSession: Pass in the database session
     :return: A none type
     :doc-author: Trelent
     """
-    comment = db.query(Comment).filter_by(id=comment_id).first()
+    comment = await db.scalar(select(Comment).filter_by(id=comment_id))
     if comment:
-        db.delete(comment)
-        db.commit()
\ No newline at end of file
+        await db.delete(comment)
+        await db.commit()
+        # the replies below the comment are gone with it
+        await post_events.publish(comment.post_id, "comment_deleted",
+                                  {"id": comment.id, "parent_id": comment.parent_id})
\ No newline at end of file
@@ -0,0 +1,101 @@
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.connect import dialect_insert
+from src.database.models import MediaBlob
+from src.services.media_store import media_store
+from src.services.uploads import StoredUpload
+
+
+async def acquire_media(upload: StoredUpload, db: AsyncSession) -> Row:
+    """
+    Takes a reference to the stored file with the upload's content, registering it if it is new.
+
+    The insert-or-increment is a single statement, so concurrent uploads of the same bytes
+    cannot create two rows. The caller commits.
+
+    :param upload: Staged upload.
+    :type upload: StoredUpload
+    :param db: Database session.
+    :type db: AsyncSession
+    :return: Row with the ``id`` and ``path`` of the media record.
+    :rtype: Row
+    """
+    insert = dialect_insert(db)
+    statement = insert(MediaBlob).values(
+        sha256=upload.sha256, path=media_store.path_for(upload.sha256, upload.extension),
+        size=upload.size, refcount=1,
+    ).on_conflict_do_update(
+        index_elements=[MediaBlob.sha256], set_={"refcount": MediaBlob.refcount + 1},
+    ).returning(MediaBlob.id, MediaBlob.path)
+    return (await db.execute(statement)).one()
+
+
+async def release_media(media_id: int, db: AsyncSession) -> bool:
+    """
+    Drops a reference to a stored file. The record of a file that is no longer referenced is kept,
+    so that an upload of the same content meanwhile takes it again instead of inserting a new one.
+
+    The caller commits and then removes the file with ``discard_unreferenced``.
+
+    :param media_id: Id of the media record.
+    :type media_id: int
+    :param db: Database session.
+    :type db: AsyncSession
+    :return: Whether that was the last reference.
+    :rtype: bool
+    """
+    refcount = await db.scalar(update(MediaBlob).filter(MediaBlob.id == media_id)
+                               .values(refcount=MediaBlob.refcount - 1).returning(MediaBlob.refcount))
+    return refcount is not None and refcount <= 0
+
+
+async def discard_unreferenced(media_id: int, db: AsyncSession) -> str | None:
+    """
+    Deletes the record released by ``release_media`` and its file, unless the same content was
+    uploaded again meanwhile. Commits.
+
+    The file is removed while the deleted record is locked, until the commit: ``acquire_media``
+    of the same content waits for the lock, and ``create_post`` places the file only after its
+    own commit, so the file of a new post is never removed. Taking the record again before the
+    delete leaves nothing to delete.
+
+    :param media_id: Id of the media record.
+    :type media_id: int
+    :param db: Database session.
+    :type db: AsyncSession
+    :return: Path of the removed file, if any.
+    :rtype: str or None
+    """
+    path = await db.scalar(delete(MediaBlob).filter(MediaBlob.id == media_id, MediaBlob.refcount <= 0)
+                           .returning(MediaBlob.path))
+    if path is not None:
+        await media_store.discard(path)
+    await db.commit()
+    return path
+
+
+async def get_dedup_report(db: AsyncSession) -> dict:
+    """
+    Summarizes how much space deduplication saves.
+
+    :param db: Database session.
+    :type db: AsyncSession
+    :return: Number of files and references, stored and logical bytes, bytes saved and dedup ratio.
+    :rtype: dict
+    """
+    files, references, stored_bytes, logical_bytes = (await db.execute(select(
+        func.count(MediaBlob.id).filter(MediaBlob.refcount > 0),
+        func.coalesce(func.sum(MediaBlob.refcount), 0),
+        func.coalesce(func.sum(MediaBlob.size), 0),
+        func.coalesce(func.sum(MediaBlob.size * MediaBlob.refcount), 0),
+    ))).one()
+    return {
+        "files": files,
+        "references": references,
+        "stored_bytes": stored_bytes,
+        "logical_bytes": logical_bytes,
+        "bytes_saved": logical_bytes - stored_bytes,
+        "dedup_ratio": logical_bytes / stored_bytes if stored_bytes else 1.0,
+    }
@@ -1,89 +1,232 @@
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.sql import extract
 
-from src.database.models import Post, User, Tag
+from src.database.models import Post, PostDerivative, User, Tag, UploadStatus
 from src.schemas import PostBase, PostModel, PostCreate
+from src.repository import media as repository_media
 from src.repository import tags as repository_tags
+from src.services.media_store import media_store
+from src.services.pagination import Page, next_cursor, paginate
+from src.services.uploads import StoredUpload
 
+# relationships PostModel serializes: one query each loads them for all the posts read,
+# instead of one lazy load per post
+POST_LOADERS = (selectinload(Post.tags), selectinload(Post.derivatives))
 
-async def create_post(body: PostCreate, file_path: str, db: Session, user: User) -> Post:
+
+async def create_post(body: PostCreate, upload: StoredUpload, db: AsyncSession, user: User) -> Post:
     """
-    Add new post
+    Add new post. The photo is stored once per distinct content and shared between posts
 
     :param body: Data for create new post
     :type body: PostCreate
-    :param file_path: Path to file
-    :type file_path: str
+    :param upload: Staged photo
+    :type upload: StoredUpload
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :param user: User.
     :type user: User
     :return: Added post
     :rtype: Post
     """
+    try:
+        tags_list = await repository_tags.get_tags_list(body.tags, user, db)
+        media = await repository_media.acquire_media(upload, db)
 
-    tags_list = repository_tags.get_tags_list(body.tags, user, db)
-
-    post = Post(photo_url=file_path, description=body.description, user_id=user.id, tags=tags_list)
-    db.add(post)
-    db.commit()
-    db.refresh(post)
+        post = Post(photo_url=media.path, media_id=media.id, description=body.description, user_id=user.id,
+                    tags=tags_list)
+        db.add(post)
+        await db.commit()
+    except BaseException:
+        await media_store.discard(upload.path)
+        raise
+    # placed only after the commit, so a concurrent removal of the last post with the same
+    # content finds the new reference and keeps the file
+    await media_store.place(upload.path, media.path)
+    await db.refresh(post, ["tags", "derivatives"])
 
     return post
 
 
-async def get_post(post_id: int, db: Session) -> Post:
+async def add_derivatives(post_id: int, derivatives: List[tuple[int, int, str]], db: AsyncSession) -> None:
+    """
+    Record resized copies of the post's photo
+
+    :param post_id: Post's ID
+    :type post_id: int
+    :param derivatives: (width, height, path) of every copy
+    :type derivatives: List[tuple[int, int, str]]
+    :param db: Database session
+    :type db: AsyncSession
+    """
+
+    db.add_all([PostDerivative(post_id=post_id, width=width, height=height, photo_url=path)
+                for width, height, path in derivatives])
+    await db.commit()
+
+
+async def get_uploaded_public_id(photo_url: str, db: AsyncSession) -> str | None:
+    """
+    Find the remote copy of a photo another post already uploaded
+
+    :param photo_url: Path of the photo
+    :type photo_url: str
+    :param db: Database session
+    :type db: AsyncSession
+    :return: Public id of the remote copy, if any
+    :rtype: str | None
+    """
+
+    return await db.scalar(select(Post.remote_public_id)
+                           .filter(Post.photo_url == photo_url, Post.upload_status == UploadStatus.uploaded.value)
+                           .limit(1))
+
+
+async def set_upload_state(post_id: int, upload_status: UploadStatus, attempts: int, db: AsyncSession,
+                           public_id: str | None = None) -> None:
+    """
+    Record the outcome of uploading the post's photo to the transformation service
+
+    :param post_id: Post's ID
+    :type post_id: int
+    :param upload_status: New status
+    :type upload_status: UploadStatus
+    :param attempts: Number of upload attempts so far
+    :type attempts: int
+    :param db: Database session
+    :type db: AsyncSession
+    :param public_id: Public id of the remote copy
+    :type public_id: str | None
+    """
+
+    await db.execute(update(Post).filter(Post.id == post_id)
+                     .values(upload_status=upload_status.value, upload_attempts=attempts, remote_public_id=public_id))
+    await db.commit()
+
+
+async def get_posts_to_upload(db: AsyncSession, limit: int = 100) -> List[tuple[int, str]]:
+    """
+    Get posts whose photo is not uploaded to the transformation service yet
+
+    :param db: Database session
+    :type db: AsyncSession
+    :param limit: Maximum number of posts
+    :type limit: int
+    :return: (id, photo_url) of every post, oldest first
+    :rtype: List[tuple[int, str]]
+    """
+
+    rows = await db.execute(select(Post.id, Post.photo_url)
+                            .filter(Post.upload_status != UploadStatus.uploaded.value).order_by(Post.id).limit(limit))
+    return [tuple(row) for row in rows]
+
+
+async def get_post(post_id: int, db: AsyncSession) -> Post:
     """
     Get post by ID
 
     :param post_id: Post's ID
     :type post_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Return post by ID
     :rtype: Post
     """
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).options(*POST_LOADERS).filter(Post.id == post_id))
     return post
 
 
-async def get_user_posts(user_id: int, db: Session) -> List[Post]:
+async def get_posts(post_ids: List[int], db: AsyncSession) -> List[Post]:
+    """
+    Get posts by IDs with one query for the posts, whatever their number, and one for each of their
+    tags and derivatives
+
+    :param post_ids: Posts' IDs, without duplicates
+    :type post_ids: List[int]
+    :param db: Database session
+    :type db: AsyncSession
+    :return: The posts that exist, in the order of their IDs in post_ids
+    :rtype: List[Post]
+    """
+    if not post_ids:
+        return []
+    posts = {post.id: post for post in await db.scalars(select(Post).options(*POST_LOADERS)
+                                                         .filter(Post.id.in_(post_ids)))}
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+async def get_post_detail(post_id: int, db: AsyncSession):
+    """
+    Get post by ID with what its page shows besides comments and transforms, in one query: the username
+    of its owner, its tags and derivatives, joined to the post row, and its counters
+
+    :param post_id: Post's ID
+    :type post_id: int
+    :param db: Database session
+    :type db: AsyncSession
+    :return: A row of the post and the username of its owner, None if there is no such post
+    :rtype: Row
+    """
+    result = await db.execute(select(Post, User.username).join(User, Post.user_id == User.id)
+                              .options(joinedload(Post.tags), joinedload(Post.derivatives))
+                              .filter(Post.id == post_id))
+    return result.unique().first()
+
+
+# posts of a user are listed oldest first
+POST_PAGE_KEYS = (Post.created_at, Post.id)
+
+
+async def get_user_posts(user_id: int, db: AsyncSession, skip: int = 0, limit: int = 20,
+                         cursor: list | None = None) -> List[Post]:
     """
-    Get all user's posts
+    Get a page of user's posts
 
     :param user_id: User's ID
     :type user_id: int
     :param db: Database session
-    :type db: Session
-    :return: Get all user's posts
+    :type db: AsyncSession
+    :param skip: Number of posts to skip when there is no cursor
+    :type skip: int
+    :param limit: Page size
+    :type limit: int
+    :param cursor: Continue after this cursor instead of skipping posts
+    :type cursor: list | None
+    :return: Page of user's posts
     :rtype: List[Post]
     """
 
-    posts = db.query(Post).filter(Post.user_id == user_id).all()
-    return posts
+    sql = select(Post).options(*POST_LOADERS).filter(Post.user_id == user_id)
+    posts = (await db.scalars(paginate(sql, POST_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(posts, next_cursor(posts, limit, POST_PAGE_KEYS))
 
 
-async def remove_post(post_id: int, db: Session):
+async def remove_post(post_id: int, db: AsyncSession):
     """
     Remove post by ID
 
     :param post_id: Post's ID
     :type post_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     """
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).filter(Post.id == post_id))
     if post:
-        db.delete(post)
-        db.commit()
+        await db.delete(post)
+        await db.flush()
+        released = await repository_media.release_media(post.media_id, db) if post.media_id else False
+        await db.commit()
+        if released:
+            await repository_media.discard_unreferenced(post.media_id, db)
     return post
 
 
-async def update_post(post_id: int, body: PostCreate, db: Session, user: User) -> Post | None:
+async def update_post(post_id: int, body: PostCreate, db: AsyncSession, user: User) -> Post | None:
     """
     Update description and tags
 
@@ -92,41 +235,42 @@ async def update_post(post_id: int, body: PostCreate, db: Session, user: User) -
     :param body: Data for update post
     :type body: PostCreate
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :param user: User.
     :type user: User
     :return: Updated post
     :rtype: Post | None
     """
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).options(*POST_LOADERS).filter(Post.id == post_id))
 
     if post:
-        tags_list = repository_tags.get_tags_list(body.tags, user, db)
+        tags_list = await repository_tags.get_tags_list(body.tags, user, db)
 
         post.description = body.description
         post.tags = tags_list
-        db.commit()
-        db.refresh(post)
+        await db.commit()
+        # tags resolved from the tag cache carry only their id and name
+        await db.refresh(post, ["tags"])
     return post
 
 
-async def change_post_mark(post_id: int, db: Session) -> Post | None:
+async def change_post_mark(post_id: int, db: AsyncSession) -> Post | None:
     """
     Change soft-delete mark for post
 
     :param post_id: Post's ID
     :type post_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Post
     :rtype: Post | None
     """
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).filter(Post.id == post_id))
 
     if post:
         post.marked = not post.marked
-        db.commit()
-        db.refresh(post)
+        await db.commit()
+        await db.refresh(post)
     return post
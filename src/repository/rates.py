@@ -1,67 +1,125 @@
-from datetime import datetime
 from typing import List
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, update, case, cast, func, text, Float
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, RatePost, UserRole, Post
-from src.schemas import RateResponse
+from src.schemas import RateDB, RateResponse
+from src.services.pagination import Page, next_cursor, paginate
+from src.services.post_events import post_events
 
 
-async def set_rate_for_image(image_id: int, user_rate: int, current_user: User, db: Session) -> RatePost:
+def rate_average(rate_sum, rate_count):
+    """
+    The rate_average function builds the SQL expression of an average rate, 0 for a post without rates.
+
+    :param rate_sum: Sum of the rates, a column or an expression
+    :param rate_count: Number of the rates, a column or an expression
+    :return: The average as a float expression
+    """
+    return case((rate_count > 0, cast(rate_sum, Float) / rate_count), else_=0.0)
+
+
+# The same statement on PostgreSQL and SQLite. Written as text because SQLAlchemy does not cache the compiled
+# form of the dialects' insert().on_conflict_do_update(), and compiling it took longer than running it.
+SET_RATE = text("""
+    INSERT INTO rates_posts (photo_id, user_id, rate, created_at, updated_at)
+    SELECT posts.id, CAST(:user_id AS INTEGER), CAST(:rate AS INTEGER), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    FROM posts WHERE posts.id = :photo_id AND posts.user_id != :user_id
+    ON CONFLICT (photo_id, user_id) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at
+    RETURNING id, rate, photo_id, user_id, created_at, updated_at
+""").columns(*RatePost.__table__.columns)
+
+
+# {values} is a list of (CAST(:photo_id_n AS INTEGER), CAST(:user_id_n AS INTEGER), CAST(:rate_n AS INTEGER)) rows,
+# whose columns both databases name column1, column2 and column3
+SET_RATES = """
+    INSERT INTO rates_posts (photo_id, user_id, rate, created_at, updated_at)
+    SELECT posts.id, rates.column2, rates.column3, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    FROM (VALUES {values}) AS rates JOIN posts ON posts.id = rates.column1 AND posts.user_id != rates.column2
+    WHERE true
+    ON CONFLICT (photo_id, user_id) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at
+    RETURNING id, rate, photo_id, user_id, created_at, updated_at
+"""
+
+
+async def set_rate_for_image(image_id: int, user_rate: int, current_user: User, db: AsyncSession) -> RatePost:
     """
     The set_rate_for_image function takes in an image_id, a user_rate, the current user and a database session. It
-    then queries the Post table for any posts that match the given image id and are not posted by the current user.
-    If there is such a post it will query for any rates on that post by this particular user. If there is no rate
-    yet, it will create one with this users rating of said photo. Otherwise it updates their previous rating to
-    reflect their new one.
+    rates the image with a single INSERT ... SELECT ... ON CONFLICT DO UPDATE ... RETURNING statement: the SELECT
+    yields a row only if the post exists and is not posted by the current user, a second rate of the same user
+    updates the first one through the unique (photo_id, user_id) constraint, so concurrent requests cannot create
+    duplicate rates. The rate aggregates of the post are changed by the triggers of rates_posts.
 
     :param image_id: int: Identify the image that we want to rate
     :param user_rate: int: Set the rate of the image
     :param current_user: User: Get the id of the user who is currently logged in
-    :param db: Session: Access the database
-    :return: A ratepost object
-    """
-    post = db.query(Post).filter(and_(Post.id == image_id, Post.user_id != current_user.id)).first()
-    rate = None
-    if post:
-        rate = db.query(RatePost).filter(and_(RatePost.photo_id == image_id,
-                                              RatePost.user_id == current_user.id)).first()
-        if rate is None:
-            rate = RatePost(photo_id=image_id, user_id=current_user.id, rate=user_rate)
-            db.add(rate)
-        else:
-            rate.rate = user_rate
-            rate.updated_at = datetime.now()
-        db.commit()
-        db.refresh(rate)
+    :param db: AsyncSession: Access the database
+    :return: A ratepost object, None if the post does not exist or is posted by the current user
+    """
+    rate = await db.scalar(select(RatePost).from_statement(SET_RATE),
+                           {'photo_id': image_id, 'user_id': current_user.id, 'rate': user_rate},
+                           execution_options={'populate_existing': True})
+    await db.commit()
+    if rate is not None:
+        await post_events.publish(rate.photo_id, "rate_set", RateDB.from_orm(rate))
     return rate
 
 
-async def remove_rate_for_image(rate_id: int, current_user: User, db: Session) -> None:
+async def set_rates(rates: List[tuple[int, int, int]], db: AsyncSession) -> int:
+    """
+    The set_rates function writes many rates with one multi-row upsert, as set_rate_for_image does for one:
+    rates of posts that do not exist or are posted by the rating user are skipped.
+
+    :param rates: List[tuple[int, int, int]]: (photo_id, user_id, rate) rows, at most one per photo and user
+    :param db: AsyncSession: Access the database
+    :return: The number of rates written
+    """
+    if not rates:
+        return 0
+    values = ', '.join(f'(CAST(:photo_id_{n} AS INTEGER), CAST(:user_id_{n} AS INTEGER), CAST(:rate_{n} AS INTEGER))'
+                       for n in range(len(rates)))
+    params = {}
+    for n, (photo_id, user_id, rate) in enumerate(rates):
+        params.update({f'photo_id_{n}': photo_id, f'user_id_{n}': user_id, f'rate_{n}': rate})
+    written = (await db.execute(text(SET_RATES.format(values=values)).columns(*RatePost.__table__.columns),
+                                params)).all()
+    await db.commit()
+    for rate in written:
+        await post_events.publish(rate.photo_id, "rate_set", RateDB.from_orm(rate))
+    return len(written)
+
+
+async def remove_rate_for_image(rate_id: int, current_user: User, db: AsyncSession) -> None:
     """
     The remove_rate_for_image function removes a rate for an image.
         Args:
             rate_id (int): The id of the rate to be removed.
             current_user (User): The user who is making the request.
-            db (Session): A database session object used to query and update data in the database.
+            db (AsyncSession): A database session object used to query and update data in the database.
 
     :param rate_id: int: Identify the rate that is to be removed
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: None
     """
     if current_user.user_role == UserRole.User.name:
-        rate = db.query(RatePost).filter(and_(RatePost.id == rate_id, RatePost.user_id == current_user.id)).first()
+        rate = await db.scalar(select(RatePost).filter(and_(RatePost.id == rate_id,
+                                                            RatePost.user_id == current_user.id)))
     else:
-        rate = db.query(RatePost).filter(RatePost.id == rate_id).first()
+        rate = await db.scalar(select(RatePost).filter(RatePost.id == rate_id))
     if rate:
-        db.delete(rate)
-        db.commit()
+        await db.delete(rate)
+        await db.commit()
+        await post_events.publish(rate.photo_id, "rate_removed", {"id": rate.id, "user_id": rate.user_id})
     return rate
 
 
+# rates are listed oldest first
+RATE_PAGE_KEYS = (RatePost.created_at, RatePost.id)
+
+
 async def get_rate_for_image(image_id: int, skip: int, limit: int, current_user: User,
-                             db: Session) -> List[RateResponse]:
+                             db: AsyncSession, cursor: list | None = None) -> List[RateResponse]:
     """
     The get_rate_for_image function returns a list of rates for the image with the given id.
         If current_user is an admin, all rates are returned. Otherwise, only those created by current_user are returned.
@@ -70,21 +128,21 @@ async def get_rate_for_image(image_id: int, skip: int, limit: int, current_user:
     :param skip: int: Skip the first n rows in a result set before beginning to return rows
     :param limit: int: Limit the number of results returned
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
-    :return: The list of rates for the image with the given id
+    :param db: AsyncSession: Access the database
+    :param cursor: list | None: Continue after this cursor instead of skipping rows
+    :return: The page of rates for the image with the given id
     """
+    sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id,
+                 Post.photo_url, RatePost.created_at, RatePost.updated_at) \
+        .select_from(Post).join(RatePost).join(User).filter(RatePost.photo_id == image_id)
     if current_user.user_role == UserRole.User.name:
-        rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                         RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-            and_(Post.id == image_id, Post.user_id == current_user.id)).offset(skip).limit(limit).all()
-    else:
-        rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                         RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-            RatePost.photo_id == image_id).offset(skip).limit(limit).all()
-    return rates
+        sql = sql.filter(Post.user_id == current_user.id)
+    rates = (await db.execute(paginate(sql, RATE_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(rates, next_cursor(rates, limit, RATE_PAGE_KEYS))
 
 
-async def get_rate_for_user(skip: int, limit: int, current_user: User, db: Session) -> List[RateResponse]:
+async def get_rate_for_user(skip: int, limit: int, current_user: User, db: AsyncSession,
+                            cursor: list | None = None) -> List[RateResponse]:
     """
     The get_rate_for_user function returns a list of rate objects for the current user. Args: skip (int): The number
     of items to skip before starting to collect the result set. limit (int): The numbers of items to return after
@@ -96,17 +154,19 @@ async def get_rate_for_user(skip: int, limit: int, current_user: User, db: Sessi
     :param skip: int: Skip the first n records in the query
     :param limit: int: Limit the number of results returned
     :param current_user: User: Get the current user from the database
-    :param db: Session: Access the database
-    :return: A list of rate responses
+    :param db: AsyncSession: Access the database
+    :param cursor: list | None: Continue after this cursor instead of skipping rows
+    :return: A page of rate responses
     """
-    rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                     RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-                     RatePost.user_id == current_user.id).offset(skip).limit(limit).all()
-    return rates
+    sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id,
+                 Post.photo_url, RatePost.created_at, RatePost.updated_at) \
+        .select_from(Post).join(RatePost).join(User).filter(RatePost.user_id == current_user.id)
+    rates = (await db.execute(paginate(sql, RATE_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(rates, next_cursor(rates, limit, RATE_PAGE_KEYS))
 
 
 async def get_rate_from_user(user_id: int, skip: int, limit: int, current_user: User,
-                             db: Session) -> List[RateResponse]:
+                             db: AsyncSession, cursor: list | None = None) -> List[RateResponse]:
     """
     The get_rate_from_user function takes in a user_id, skip, limit, current_user and db. It returns a list of
     RateResponse objects. If the current user is not an admin or moderator then it will query the database for all
@@ -116,12 +176,34 @@ async def get_rate_from_user(user_id: int, skip: int, limit: int, current_user:
     :param skip: int: Skip the first n records
     :param limit: int: Limit the number of results returned
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param cursor: list | None: Continue after this cursor instead of skipping rows
     :return: The rate of a user
     """
-    rates = []
+    rates = Page()
     if current_user.user_role != UserRole.User.name:
-        rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                         RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-            RatePost.user_id == user_id).offset(skip).limit(limit).all()
+        sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id,
+                     Post.photo_url, RatePost.created_at, RatePost.updated_at) \
+            .select_from(Post).join(RatePost).join(User).filter(RatePost.user_id == user_id)
+        rows = (await db.execute(paginate(sql, RATE_PAGE_KEYS, cursor, skip, limit, db))).all()
+        rates = Page(rows, next_cursor(rows, limit, RATE_PAGE_KEYS))
     return rates
+
+
+async def rebuild_rate_aggregates(db: AsyncSession) -> int:
+    """
+    The rebuild_rate_aggregates function recomputes the rate aggregates of every post from rates_posts in bulk,
+    fixing posts whose rates were changed while the triggers of rates_posts were missing or disabled.
+
+    :param db: AsyncSession: Access the database
+    :return: The number of posts whose aggregates were wrong
+    """
+    rate_sum = select(func.coalesce(func.sum(RatePost.rate), 0)).filter(RatePost.photo_id == Post.id) \
+        .scalar_subquery()
+    rate_count = select(func.count(RatePost.id)).filter(RatePost.photo_id == Post.id).scalar_subquery()
+    result = await db.execute(update(Post).filter((Post.rate_sum != rate_sum) | (Post.rate_count != rate_count))
+                              .values(rate_sum=rate_sum, rate_count=rate_count,
+                                      rate_avg=rate_average(rate_sum, rate_count))
+                              .execution_options(synchronize_session=False))
+    await db.commit()
+    return result.rowcount
@@ -1,64 +1,93 @@
 from typing import List
 
-from sqlalchemy import or_, func, text, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, func, select, Select, table, column, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Post, Tag, post_tag, RatePost, User
+from src.database.models import Post, PostDerivative, Tag, post_tag, User
+from src.database.search_index import TEXT_SEARCH_CONFIG, SQLITE_FTS_TABLE, search_terms, postgresql_prefix_query, \
+    sqlite_prefix_query
 from src.services.cloudynary import get_url
 from src.schemas import SearchResponse, SortUserType, SortType
+from src.services.pagination import Page, next_cursor, paginate
 
 
-async def get_search_posts(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: Session)\
-        -> List[SearchResponse]:
+def match_posts(sql: Select, terms: List[str], db: AsyncSession) -> Select:
+    """
+    The match_posts function restricts a query of posts to the ones whose description or tags contain words
+    starting with every term, using the full-text index, and adds their rank as the ``relevance`` column.
+    PostgreSQL ranks with ts_rank over the GIN-indexed tsvector, SQLite with bm25 over the FTS5 table.
+
+    :param sql: Select: Query selecting from posts
+    :param terms: List[str]: Words from search_terms
+    :param db: AsyncSession: Session whose dialect decides how to search
+    :return: The query with the full-text condition and the relevance column
+    """
+    if db.get_bind().dialect.name == 'postgresql':
+        query = func.to_tsquery(literal_column(f"'{TEXT_SEARCH_CONFIG}'"), postgresql_prefix_query(terms))
+        return sql.filter(Post.search_vector.op('@@')(query)) \
+            .add_columns(func.ts_rank(Post.search_vector, query).label('relevance'))
+    fts = table(SQLITE_FTS_TABLE, column('rowid'), column('rank'), column(SQLITE_FTS_TABLE))
+    # bm25 ranks are negative, the best match has the lowest one
+    return sql.join(fts, fts.c.rowid == Post.id) \
+        .filter(fts.c[SQLITE_FTS_TABLE].op('MATCH')(sqlite_prefix_query(terms))) \
+        .add_columns((-fts.c.rank).label('relevance'))
+
+
+async def get_search_posts(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: AsyncSession,
+                           cursor: list | None = None) -> List[SearchResponse]:
     """
     The get_search_posts function is used to search for posts by a given string.
     The function takes in the following parameters:
         - search_str: The string that will be searched for in the database.
-        - sort: The type of sorting that will be applied to the results (either 'rate' or 'date').
+        - sort: The type of sorting that will be applied to the results ('rate', 'date' or 'relevance',
+                best match first).
         - sort_type: A number indicating whether we want ascending or descending order (-/+ 1).
                      If no value is provided, it defaults to ascending order.
                      This parameter only applies if sort == 'rate'. Otherwise, it's ignored.
 
-    :param search_str: str: Search for posts that contain the string in their description or tags
-    :param sort: str: Sort the posts by date or rate
+    :param search_str: str: Search for posts with words in their description or tags starting with every word
+                            of the string, through the full-text index; an empty string matches all posts
+    :param sort: str: Sort the posts by date, by the stored average rate or by relevance
     :param sort_type: int: Sort the posts in ascending or descending order
     :param skip: int: Skip a number of posts, the limit: int parameter is used to limit the number of
     :param limit: int: Limit the number of posts returned by the function
-    :param db: Session: Access the database
-    :return: A list of posts in which the search string is present in the description or
+    :param db: AsyncSession: Access the database
+    :param cursor: list | None: Continue after this cursor of the same search instead of skipping posts
+    :return: A page of posts in which the search string is present in the description or
     :doc-author: Trelent
     """
-    search_list = []
-    search_list.append(Post.description.ilike(f'%{search_str}%'))
-    search_list.append(Tag.tag.ilike(f'%{search_str}%'))
-    sql = db.query(Post, User.username, func.coalesce(func.avg(RatePost.rate), 0).label('rate')) \
-        .select_from(Post).join(User).join(RatePost, isouter=True).join(post_tag, isouter=True).join(Tag, isouter=True)\
-        .filter(or_(*search_list)) \
-        .group_by(Post, User.username)
+    rate = Post.rate_avg.label('rate')
+    sql = select(Post.id, Post.photo_url, Post.description, Post.user_id, Post.created_at, Post.updated_at,
+                 User.username, rate) \
+        .select_from(Post).join(User)
+    terms = search_terms(search_str)
+    if terms:
+        sql = match_posts(sql, terms, db)
+    # the id ends every sort key, so that posts with the same date or rate keep one order between pages
+    keys, descending = (Post.created_at, Post.id), sort_type == -1
+    if sort == SortType.relevance.name:
+        keys, descending = (sql.selected_columns.relevance if terms else Post.created_at, Post.id), True
     if sort == SortType.rate.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc('rate'))
-        else:
-            sql = sql.order_by('rate')
-    if sort == SortType.date.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(Post.created_at))
-        else:
-            sql = sql.order_by(Post.created_at)
-    posts = sql.offset(skip).limit(limit).all()
-    result = []
-    for post in posts:
-        item = {x.name: getattr(post[0], x.name) for x in post[0].__table__.columns}
-        item['username'] = post[1]
-        item['rate'] = post[2]
-        # item['photo_url'] = get_url(item['photo_url'])
-        tags = db.query(Tag).join(post_tag).join(Post).filter(Post.id == item['id']).order_by(Tag.tag).all()
-        item['tags'] = [{'id': tag.id, 'tag': tag.tag} for tag in tags]
-        result.append(item)
-    return result
+        keys = (rate, Post.id)
+    rows = (await db.execute(paginate(sql, keys, cursor, skip, limit, db, descending))).all()
+    if not rows:
+        return Page()
+    post_ids = [row.id for row in rows]
+    # tags and derivatives of the whole page are loaded with one query each
+    tags = {}
+    for post_id, tag_id, tag in await db.execute(select(post_tag.c.post, Tag.id, Tag.tag).join(Tag)
+                                                 .filter(post_tag.c.post.in_(post_ids)).order_by(Tag.tag)):
+        tags.setdefault(post_id, []).append({'id': tag_id, 'tag': tag})
+    derivatives = {}
+    for derivative in await db.scalars(select(PostDerivative).filter(PostDerivative.post_id.in_(post_ids))
+                                       .order_by(PostDerivative.width)):
+        derivatives.setdefault(derivative.post_id, []).append(derivative)
+    return Page([SearchResponse(**row._mapping, tags=tags.get(row.id, []), derivatives=derivatives.get(row.id, []))
+                 for row in rows], next_cursor(rows, limit, keys))
 
 
-async def get_search_users(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: Session):
+async def get_search_users(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: AsyncSession,
+                           cursor: list | None = None):
     """
     The get_search_users function searches for users in the database based on a search string.
     The function takes in a search string, sort type, sort direction (ascending or descending), skip value, limit value and db session.
@@ -69,34 +98,23 @@ async def get_search_users(search_str: str, sort: str, sort_type: int, skip: int
     :param sort_type: int: Determine whether the sort is ascending or descending
     :param skip: int: Skip the first n number of results
     :param limit: int: Limit the number of users returned
-    :param db: Session: Pass the database session to the function
-    :return: A list of users that match the search string
+    :param db: AsyncSession: Pass the database session to the function
+    :param cursor: list | None: Continue after this cursor of the same search instead of skipping users
+    :return: A page of users that match the search string
     """
     list_reg = []
     list_reg.append(User.username.ilike(f"%{search_str}%"))
     list_reg.append(User.first_name.ilike(f"%{search_str}%"))
     list_reg.append(User.last_name.ilike(f"%{search_str}%"))
     list_reg.append(User.email.ilike(f"%{search_str}%"))
-    sql = db.query(User).filter(or_(*list_reg))
-    if sort == SortUserType.username.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(SortUserType.username.name))
-        else:
-            sql = sql.order_by(SortUserType.username.name)
+    sql = select(User).filter(or_(*list_reg))
+    # usernames and emails are unique, the other sort keys end with the id
+    keys = (User.username,)
     if sort == SortUserType.date.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(User.created_at))
-        else:
-            sql = sql.order_by(User.created_at)
+        keys = (User.created_at, User.id)
     if sort == SortUserType.email.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(User.email))
-        else:
-            sql = sql.order_by(User.email)
+        keys = (User.email,)
     if sort == SortUserType.name.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(User.first_name), desc(User.last_name))
-        else:
-            sql = sql.order_by(User.first_name, User.last_name)
-    users = sql.offset(skip).limit(limit).all()
-    return users
+        keys = (User.first_name, User.last_name, User.id)
+    users = (await db.scalars(paginate(sql, keys, cursor, skip, limit, db, sort_type == -1))).all()
+    return Page(users, next_cursor(users, limit, keys))
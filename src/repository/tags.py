@@ -1,33 +1,121 @@
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 from sqlalchemy.sql import extract
 
-from src.database.models import Post, User, Tag
+from src.conf.config import settings
+from src.database.connect import dialect_insert
+from src.database.models import Post, User, Tag, post_tag
 from src.schemas import TagBase, TagModel
+from src.services.cache import TTLCache
 
+# tag name -> id of tags committed to the database. Tags are only ever added, so an entry
+# stays valid until its tag is removed with the user who created it; the TTL bounds how
+# long a worker can keep such an entry.
+tag_cache = TTLCache(settings.tag_cache_size, settings.tag_cache_ttl)
+# session.info key of the tags a session inserted and has not committed yet
+PENDING_TAGS = "pending_tags"
 
-def get_tag_by_name(tag_name: str, db: Session) -> Tag | None:
-    tag = db.query(Tag).filter(Tag.tag == tag_name).first()
+
+@event.listens_for(Session, 'after_commit')
+def _cache_committed_tags(session):
+    for name, tag_id in session.info.pop(PENDING_TAGS, {}).items():
+        tag_cache.set(name, tag_id)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_uncommitted_tags(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_TAGS, None)
+
+
+async def warm_tag_cache(db: AsyncSession) -> int:
+    """
+    Fill the tag cache with the most used tags
+
+    :param db: Database session
+    :type db: AsyncSession
+    :return: Number of tags cached
+    :rtype: int
+    """
+    rows = await db.execute(select(Tag.id, Tag.tag).outerjoin(post_tag, post_tag.c.tag == Tag.id)
+                            .group_by(Tag.id, Tag.tag).order_by(func.count(post_tag.c.post).desc())
+                            .limit(tag_cache.maxsize))
+    rows = rows.all()
+    # the most used tags go in last, so they are the last ones evicted
+    for tag_id, name in reversed(rows):
+        tag_cache.set(name, tag_id)
+    return len(rows)
+
+
+async def _cached_tag(tag_id: int, name: str, db: AsyncSession) -> Tag:
+    tag = Tag(id=tag_id, tag=name)
+    make_transient_to_detached(tag)
+    # attaches the tag without a query; its other columns load with the post's tags
+    return await db.merge(tag, load=False)
+
+
+async def get_tag_by_name(tag_name: str, db: AsyncSession) -> Tag | None:
+    tag = await db.scalar(select(Tag).filter(Tag.tag == tag_name))
     return tag
 
 
-def create_tag(tag_name: str, user, db: Session):
+async def create_tag(tag_name: str, user, db: AsyncSession):
     tag = Tag(tag=tag_name, user_id=user.id)
     db.add(tag)
-    db.commit()
-    db.refresh(tag)
+    await db.commit()
+    await db.refresh(tag)
     return tag
 
 
-def get_tags_list(tags: list, user, db: Session) -> List[Tag]:
-    tags_list = []
-    if len(tags) > 0:
-        for tag_name in tags:
-            tag = get_tag_by_name(tag_name, db)
-            if not tag:
-                tag = create_tag(tag_name, user, db)
-            tags_list.append(tag)
+async def get_tags_list(tags: list, user, db: AsyncSession) -> List[Tag]:
+    """
+    Get the tags with the given names, creating the missing ones
+
+    Tags found in ``tag_cache`` need no query. The others are read with one query and the missing
+    ones are inserted with one ``INSERT ... ON CONFLICT DO NOTHING ... RETURNING``; a tag another
+    transaction inserted meanwhile is read once more. Nothing is committed, the caller's transaction
+    keeps the new tags, and they are cached once it commits.
+
+    :param tags: Tag names
+    :type tags: list
+    :param user: User creating the missing tags
+    :type user: User
+    :param db: Database session
+    :type db: AsyncSession
+    :return: Tags in the order of the names, without repeats
+    :rtype: List[Tag]
+    """
+    names = list(dict.fromkeys(tags))
+    if not names:
+        return []
+    found = {}
+    for name in names:
+        tag_id = tag_cache.get(name)
+        if tag_id is not None:
+            found[name] = await _cached_tag(tag_id, name, db)
+    missing = [name for name in names if name not in found]
+    if not missing:
+        return [found[name] for name in names]
 
-    return tags_list
+    pending = db.info.setdefault(PENDING_TAGS, {})
+    committed = list(await db.scalars(select(Tag).filter(Tag.tag.in_(missing))))
+    missing = [name for name in missing if name not in {tag.tag for tag in committed}]
+    if missing:
+        insert = dialect_insert(db)
+        created = await db.scalars(insert(Tag).values([{"tag": name, "user_id": user.id} for name in missing])
+                                   .on_conflict_do_nothing(index_elements=[Tag.tag]).returning(Tag))
+        for tag in created:
+            found[tag.tag] = tag
+            pending[tag.tag] = tag.id
+        raced = [name for name in missing if name not in found]
+        if raced:
+            committed.extend(await db.scalars(select(Tag).filter(Tag.tag.in_(raced))))
+    for tag in committed:
+        found[tag.tag] = tag
+        # a tag this transaction inserted earlier is cached on commit
+        if tag.tag not in pending:
+            tag_cache.set(tag.tag, tag.id)
+    return [found[name] for name in names]
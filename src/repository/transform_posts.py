@@ -1,12 +1,31 @@
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import TransformPosts, Post, User, UserRole
+from src.services.pagination import Page, next_cursor, paginate
 
-from src.repository.search import get_search_posts
-async def get_image_for_transform(image_id: int, current_user: User, db: Session) -> str | None:
+# transformed images are listed oldest first
+TRANSFORM_PAGE_KEYS = (TransformPosts.created_at, TransformPosts.id)
+
+
+async def get_post_for_transform(image_id: int, current_user: User, db: AsyncSession) -> Post | None:
+    """
+    The get_post_for_transform function is used to retrieve the post whose image is going to be transformed.
+        Admins can transform the image of any post, other users only the images of their own posts.
+
+    :param image_id: int: Get the image from the database
+    :param current_user: User: Check if the user is an admin or not
+    :param db: AsyncSession: Access the database
+    :return: The post with the image that will be transformed, or None
+    """
+    if current_user.user_role == UserRole.Admin.name:
+        return await db.scalar(select(Post).filter(Post.id == image_id))
+    return await db.scalar(select(Post).filter(and_(Post.id == image_id, Post.user_id == current_user.id)))
+
+
+async def get_image_for_transform(image_id: int, current_user: User, db: AsyncSession) -> str | None:
     """
     The get_image_for_transform function is used to retrieve the image path for a given image id.
         The function takes in an integer representing the id of the desired image, a User object representing
@@ -15,21 +34,14 @@ async def get_image_for_transform(image_id: int, current_user: User, db: Session
 
     :param image_id: int: Get the image from the database
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The path to the image that will be transformed
     """
-    if current_user.user_role == UserRole.Admin.name:
-        image = db.query(Post).filter(Post.id == image_id).first()
-    else:
-        image = db.query(Post).filter(and_(Post.id == image_id, Post.user_id == current_user.id)).first()
-    image_path = None
-    if image:
-        image_path = image.photo_url
-    await get_search_posts('qwe', 'date', 1, 0, 20, db)
-    return image_path
+    image = await get_post_for_transform(image_id, current_user, db)
+    return image.photo_url if image else None
 
 
-async def set_transform_image(image_id: int, modify_url: str, current_user: User, db: Session) -> TransformPosts | None:
+async def set_transform_image(image_id: int, modify_url: str, current_user: User, db: AsyncSession) -> TransformPosts | None:
     """
     The set_transform_image function takes in an image_id, modify_url, current_user and db.
         If the user is an admin or if the user owns the photo then it will create a new TransformPosts object with
@@ -38,23 +50,23 @@ async def set_transform_image(image_id: int, modify_url: str, current_user: User
     :param image_id: int: Identify the image that will be modified
     :param modify_url: str: Store the url of the modified image
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A transform posts object or none
     """
     image = None
     if current_user.user_role == UserRole.Admin.name:
-        photo = db.query(Post).filter(Post.id == image_id).first()
+        photo = await db.scalar(select(Post).filter(Post.id == image_id))
     else:
-        photo = db.query(Post).filter(and_(Post.id == image_id, Post.user_id == current_user.id)).first()
+        photo = await db.scalar(select(Post).filter(and_(Post.id == image_id, Post.user_id == current_user.id)))
     if photo:
         image = TransformPosts(photo_url=modify_url, photo_id=photo.id)
         db.add(image)
-        db.commit()
-        db.refresh(image)
+        await db.commit()
+        await db.refresh(image)
     return image
 
 
-async def get_transform_image(image_id: int, current_user: User, db: Session) -> TransformPosts | None:
+async def get_transform_image(image_id: int, current_user: User, db: AsyncSession) -> TransformPosts | None:
     """
     The get_transform_image function is used to retrieve a single image from the database.
         The function takes in an image_id, current_user and db as parameters.
@@ -63,18 +75,18 @@ async def get_transform_image(image_id: int, current_user: User, db: Session) ->
 
     :param image_id: int: Get the image id from the database
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: An image from the database
     """
     if current_user.user_role == UserRole.Admin.name:
-        img = db.query(TransformPosts).filter(TransformPosts.id == image_id).first()
+        img = await db.scalar(select(TransformPosts).filter(TransformPosts.id == image_id))
     else:
-        img = db.query(TransformPosts).join(Post).filter(and_(TransformPosts.id == image_id,
-                                                              Post.user_id == current_user.id)).first()
+        img = await db.scalar(select(TransformPosts).join(Post).filter(and_(TransformPosts.id == image_id,
+                                                                            Post.user_id == current_user.id)))
     return img
 
 
-async def remove_transform_image(image_id: int, current_user: User, db: Session) -> TransformPosts | None:
+async def remove_transform_image(image_id: int, current_user: User, db: AsyncSession) -> TransformPosts | None:
     """
     The remove_transform_image function is used to remove a transform image from the database.
         The function takes in an image_id and current_user as parameters, and returns the removed TransformPosts object.
@@ -82,23 +94,24 @@ async def remove_transform_image(image_id: int, current_user: User, db: Session)
 
     :param image_id: int: Specify the image id of the image that is to be removed
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The image that was removed, or none if it failed
     :doc-author: Trelent
     """
     if current_user.user_role == UserRole.Admin.name:
-        img = db.query(TransformPosts).filter(TransformPosts.id == image_id).first()
+        img = await db.scalar(select(TransformPosts).filter(TransformPosts.id == image_id))
     else:
-        img = db.query(TransformPosts).join(Post).filter(and_(Post.id == image_id,
-                                                              Post.user_id == current_user.id)).first()
+        img = await db.scalar(select(TransformPosts).join(Post).filter(and_(Post.id == image_id,
+                                                                            Post.user_id == current_user.id)))
     if img:
-        db.delete(img)
-        db.commit()
+        await db.delete(img)
+        await db.commit()
     return img
 
 
 async def get_all_transform_images(image_id: int, skip: int, limit: int,
-                                   current_user: User, db: Session) -> List[TransformPosts]:
+                                   current_user: User, db: AsyncSession,
+                                   cursor: list | None = None) -> List[TransformPosts]:
     """
     The get_all_transform_images function returns a list of all transform images for the given image id. Args:
     image_id (int): The id of the original post. skip (int): The number of posts to be skipped. Default is 0,
@@ -110,21 +123,22 @@ async def get_all_transform_images(image_id: int, skip: int, limit: int,
     :param skip: int: Skip the first n number of items in a list
     :param limit: int: Limit the number of images returned
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
-    :return: A list of all the images that have been transformed
+    :param db: AsyncSession: Access the database
+    :param cursor: list | None: Continue after this cursor instead of skipping rows
+    :return: A page of the images that have been transformed
     """
     if current_user.user_role == UserRole.Admin.name:
-        list_image = db.query(TransformPosts).filter(TransformPosts.photo_id == image_id).offset(skip).limit(limit)\
-            .all()
+        sql = select(TransformPosts).filter(TransformPosts.photo_id == image_id)
     else:
-        list_image = db.query(TransformPosts).join(Post).filter(and_(Post.id == image_id,
-                                                                     Post.user_id == current_user.id)).offset(skip)\
-            .limit(limit).all()
-    return list_image
+        sql = select(TransformPosts).join(Post).filter(and_(TransformPosts.photo_id == image_id,
+                                                            Post.user_id == current_user.id))
+    list_image = (await db.scalars(paginate(sql, TRANSFORM_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(list_image, next_cursor(list_image, limit, TRANSFORM_PAGE_KEYS))
 
 
 async def get_all_transform_images_for_user(skip: int, limit: int,
-                                            current_user: User, db: Session) -> List[TransformPosts]:
+                                            current_user: User, db: AsyncSession,
+                                            cursor: list | None = None) -> List[TransformPosts]:
     """
     The get_all_transform_images_for_user function returns a list of all transform images for the current user.
         If the current user is an admin, then it will return all transform images in the database.
@@ -133,12 +147,12 @@ async def get_all_transform_images_for_user(skip: int, limit: int,
     :param skip: int: Skip the first n number of items in a list
     :param limit: int: Limit the number of images returned
     :param current_user: User: Determine if the user is an admin or not
-    :param db: Session: Access the database
-    :return: A list of transform posts objects
+    :param db: AsyncSession: Access the database
+    :param cursor: list | None: Continue after this cursor instead of skipping rows
+    :return: A page of transform posts objects
     """
-    if current_user.user_role == UserRole.Admin.name:
-        list_image = db.query(TransformPosts).offset(skip).limit(limit).all()
-    else:
-        list_image = db.query(TransformPosts).join(Post).filter(Post.user_id == current_user.id).offset(skip)\
-            .limit(limit).all()
-    return list_image
+    sql = select(TransformPosts)
+    if current_user.user_role != UserRole.Admin.name:
+        sql = sql.join(Post).filter(Post.user_id == current_user.id)
+    list_image = (await db.scalars(paginate(sql, TRANSFORM_PAGE_KEYS, cursor, skip, limit, db))).all()
+    return Page(list_image, next_cursor(list_image, limit, TRANSFORM_PAGE_KEYS))
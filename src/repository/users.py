@@ -1,32 +1,45 @@
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, Post, UserRole
 from src.schemas import UserModel, UserProfileModel, UserBase, UserUpdate
+from src.services.cache import user_cache, token_version_cache
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+def forget_user(*emails: str) -> None:
+    """
+    Drops the cached user rows and token versions, so the next request reloads them.
+
+    :param emails: Emails of the changed users.
+    :type emails: str
+    :return: None.
+    """
+    user_cache.invalidate(*emails)
+    token_version_cache.invalidate(*emails)
+
+
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     Creates a new user from provided UserModel.
 
     :param body: User model with initial attributes.
     :type body: UserModel().
     :param db: Database session.
-    :type db: Session.
+    :type db: AsyncSession.
     :return: Created user.
     :rtype: User.
     """
     new_user = User(**body.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_user_self(body: UserBase, user: User, db: Session) -> User | None:
+async def update_user_self(body: UserBase, user: User, db: AsyncSession) -> User | None:
     """
     Updates user profile. Logged-in user can update only its own profile.
 
@@ -35,22 +48,24 @@ async def update_user_self(body: UserBase, user: User, db: Session) -> User | No
     :param user: Logged-in user.
     :type user: User.
     :param db: Database session.
-    :type db: Session.
+    :type db: AsyncSession.
     :return: Updated user.
     :rtype: User or None
     """
-    user = db.query(User).filter(User.id == user.id).first()
+    user = await db.scalar(select(User).filter(User.id == user.id))
     if user:
+        old_email = user.email
         user.username = body.username
         user.first_name = body.first_name
         user.last_name = body.last_name
         user.email = body.email
         user.updated_at = datetime.now()
-        db.commit()
+        await db.commit()
+        forget_user(old_email, body.email)
     return user
 
 
-async def update_user_as_admin(body: UserUpdate, user: User, db: Session) -> User | None:
+async def update_user_as_admin(body: UserUpdate, user: User, db: AsyncSession) -> User | None:
     """
     Updates user profile. Logged-in user with priviledges can update any profile.
 
@@ -59,13 +74,14 @@ async def update_user_as_admin(body: UserUpdate, user: User, db: Session) -> Use
     :param user: User.
     :type user: User.    
     :param db: Database session.
-    :type db: Session.
+    :type db: AsyncSession.
     :return: Updated user.
     :rtype: User or None
     """
-    user_to_update = db.query(User).filter(User.username == body.username).first()
+    user_to_update = await db.scalar(select(User).filter(User.username == body.username))
     if user_to_update:
         if user.user_role == UserRole.Admin.name:
+            old_email = user_to_update.email
             user_to_update.username = body.username
             user_to_update.first_name = body.first_name
             user_to_update.last_name = body.last_name
@@ -73,26 +89,30 @@ async def update_user_as_admin(body: UserUpdate, user: User, db: Session) -> Use
             user_to_update.is_active = body.is_active
             user_to_update.user_role = body.user_role
             user_to_update.updated_at = datetime.now()
-            db.commit()
+            # role and status may have changed, so tokens issued before this update must not be trusted
+            user_to_update.token_version = User.token_version + 1
+            await db.commit()
+            await db.refresh(user_to_update)
+            forget_user(old_email, body.email)
         return user_to_update
     return None
 
 
-async def get_user_profile(username: str, db: Session) -> UserProfileModel | None:
+async def get_user_profile(username: str, db: AsyncSession) -> UserProfileModel | None:
     """
     Retrieves any user profile with additional parameters, such as number of posts.
 
     :param username: A name of the requested user.
     :type username: str
     :param db: Database session.
-    :type db: Session.
+    :type db: AsyncSession.
     :return: An extended user record.
     :rtype: UserProfileModel or None
     """
-    this_user = db.query(User).filter(User.username == username).first()
+    this_user = await db.scalar(select(User).filter(User.username == username))
     user_profile = None    
     if this_user:
-        photo_count = db.query(Post).filter(Post.user_id == this_user.id).count()
+        photo_count = await db.scalar(select(func.count(Post.id)).filter(Post.user_id == this_user.id))
         photo_count = 0 if not photo_count else photo_count
         user_profile = UserProfileModel(
             id=this_user.id, username=this_user.username, first_name=this_user.first_name,
@@ -103,36 +123,36 @@ async def get_user_profile(username: str, db: Session) -> UserProfileModel | Non
     return user_profile
 
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
     Retrieves a user by its email.
 
     :param email: Email of a registered user.
     :type email: str
     :param db: Database session.
-    :type db: Session. 
+    :type db: AsyncSession. 
     :return: The user if found.
     :rtype: User or None
     """    
-    return db.query(User).filter(User.email == email).first()
+    return await db.scalar(select(User).filter(User.email == email))
 
 
-async def get_all_users(user: User, db: Session) -> List[User]:
+async def get_all_users(user: User, db: AsyncSession) -> List[User]:
     """
     Retrieves a list of all users.
 
     :param user: Technical user.
     :type user: User.
     :param db: Database session.
-    :type db: Session.    
+    :type db: AsyncSession.    
     :return: A list of users.
     :rtype: List[User]
     """
-    all_users = db.query(User).filter(and_(user.id == 1)).all()
-    return all_users
+    all_users = await db.scalars(select(User).filter(and_(user.id == 1)))
+    return all_users.all()
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     Updates the refresh token of the user.
 
@@ -141,26 +161,30 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     :param token: A refresh token value.
     :type token: str or None
     :param db: Database session.
-    :type db: Session.    
+    :type db: AsyncSession.    
     :return: None.
     """
     user.refresh_token = token
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(user.email)
 
 
-async def banned_user(user_id: int, db: Session) -> User | None:
+async def banned_user(user_id: int, db: AsyncSession) -> User | None:
     """
     Sets user status to inactive.
 
     :param user_id: A user id to be banned.
     :type user_id: int
     :param db: Database session.
-    :type db: Session.    
+    :type db: AsyncSession.    
     :return: Banned user if found.
     :rtype: User or None
     """
-    to_baned = db.query(User).filter(User.id == user_id).first()
+    to_baned = await db.scalar(select(User).filter(User.id == user_id))
     if to_baned:
         to_baned.is_active = False
-        db.commit()
+        to_baned.token_version = User.token_version + 1
+        await db.commit()
+        await db.refresh(to_baned)
+        forget_user(to_baned.email)
     return to_baned
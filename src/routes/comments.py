@@ -1,13 +1,14 @@
 from typing import List
 
-from fastapi import Path, Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import Path, Depends, HTTPException, status, APIRouter, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User, UserRole
 from src.schemas import CommentModel, CommentBase, CommentResponse
 import src.repository.comments as comment_repository
 from src.services.auth import auth_service
+from src.services.pagination import get_cursor, set_next_cursor
 from src.services.roles import RoleChecker
 
 router = APIRouter(prefix="/{post_id}/comments", tags=["comments"])
@@ -15,7 +16,7 @@ router = APIRouter(prefix="/{post_id}/comments", tags=["comments"])
 
 @router.post("/add_comment", status_code=status.HTTP_201_CREATED, response_model=CommentBase)
 async def add_comments(body: CommentModel, post_id: int = Path(ge=1),
-                       db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+                       db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The add_comments function creates a new comment for the post with the given id.
     The function takes in a CommentModel object, which is validated by Pydantic and then passed to the create_comment method of our repository.
@@ -23,7 +24,7 @@ async def add_comments(body: CommentModel, post_id: int = Path(ge=1),
 
     :param body: CommentModel: Get the data from the request body
     :param post_id: int: Get the post id from the path
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user that is currently logged in
     :return: A commentmodel object, which is a pydantic model
     :doc-author: Trelent
@@ -34,8 +35,29 @@ async def add_comments(body: CommentModel, post_id: int = Path(ge=1),
     return comment
 
 
+@router.post("/{comment_id}/reply", status_code=status.HTTP_201_CREATED, response_model=CommentBase)
+async def reply_to_comment(body: CommentModel, post_id: int = Path(ge=1), comment_id: int = Path(ge=1),
+                           db: AsyncSession = Depends(get_db),
+                           current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The reply_to_comment function creates a comment of the post that replies to the comment with the given id.
+
+    :param body: CommentModel: Get the data from the request body
+    :param post_id: int: Get the post id from the path
+    :param comment_id: int: Get the id of the comment replied to from the path
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the user that is currently logged in
+    :return: The new comment
+    """
+    comment = await comment_repository.create_comment(body, post_id, db, current_user, parent_id=comment_id)
+    if comment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
+    return comment
+
+
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[CommentResponse])
-async def get_comments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), post_id: int = Path(ge=1)):
+async def get_comments(response: Response, skip: int = 0, limit: int = 100, cursor: list | None = Depends(get_cursor),
+                       db: AsyncSession = Depends(get_db), post_id: int = Path(ge=1)):
     """
     The get_comments function returns a list of comments for the specified post.
         The function takes in three parameters: skip, limit, and post_id.
@@ -45,34 +67,44 @@ async def get_comments(skip: int = 0, limit: int = 100, db: Session = Depends(ge
 
     :param skip: int: Skip the first n comments
     :param limit: int: Limit the number of comments returned
-    :param db: Session: Get the database session
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
+    :param db: AsyncSession: Get the database session
     :param post_id: int: Get the comments for a specific post
     :return: A list of commentresponse objects
     :doc-author: Trelent
     """
-    comment_user = []
-    comments = await comment_repository.get_comments(skip, limit, db, post_id)
-    if comments:
-        for comment_model in comments:
-            user_model = await comment_repository.get_user_by_comment_id(db, comment_model.user_id)
-            response = CommentResponse(comment=comment_model,
-                                       user_first_name=user_model.first_name,
-                                       user_last_name=user_model.last_name,
-                                       username=user_model.username,
-                                       user_avatar=None
-                                       )
-            comment_user.append(response)
-    return comment_user
+    comments = await comment_repository.get_comments_with_users(skip, limit, db, post_id, cursor)
+    set_next_cursor(response, comments)
+    return [CommentResponse.from_row(row) for row in comments]
+
+
+@router.get("/thread", status_code=status.HTTP_200_OK, response_model=List[CommentResponse])
+async def get_thread(response: Response, skip: int = 0, limit: int = 100, cursor: list | None = Depends(get_cursor),
+                     db: AsyncSession = Depends(get_db), post_id: int = Path(ge=1)):
+    """
+    The get_thread function returns the comments of the post in reply order: every comment is followed
+    by the replies below it, whose depth tells how far they are nested.
+
+    :param skip: int: Skip the first n comments
+    :param limit: int: Limit the number of comments returned
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
+    :param db: AsyncSession: Get the database session
+    :param post_id: int: Get the comments for a specific post
+    :return: A list of commentresponse objects
+    """
+    comments = await comment_repository.get_thread(skip, limit, db, post_id, cursor=cursor)
+    set_next_cursor(response, comments)
+    return [CommentResponse.from_row(row) for row in comments]
 
 
 @router.get("/{comment_id}", status_code=status.HTTP_200_OK, response_model=CommentResponse)
-async def get_comment(db: Session = Depends(get_db), comment_id: int = Path(ge=1)):
+async def get_comment(db: AsyncSession = Depends(get_db), comment_id: int = Path(ge=1)):
     """
     The get_comment function returns a CommentResponse object containing the comment, user_first_name,
     user_last_name and username of the comment with id = comment_id. If no such comment exists in the database,
     a 404 Not Found error is raised.
 
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param comment_id: int: Get the comment id from the path
     :return: A commentresponse object
     :doc-author: Trelent
@@ -92,8 +124,30 @@ async def get_comment(db: Session = Depends(get_db), comment_id: int = Path(ge=1
     return comment_response
 
 
+@router.get("/{comment_id}/thread", status_code=status.HTTP_200_OK, response_model=List[CommentResponse])
+async def get_subtree(response: Response, skip: int = 0, limit: int = 100, cursor: list | None = Depends(get_cursor),
+                      db: AsyncSession = Depends(get_db), post_id: int = Path(ge=1), comment_id: int = Path(ge=1)):
+    """
+    The get_subtree function returns the comment with id = comment_id followed by the replies below it,
+    in reply order. If the post has no such comment, a 404 Not Found error is raised.
+
+    :param skip: int: Skip the first n comments
+    :param limit: int: Limit the number of comments returned
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
+    :param db: AsyncSession: Get the database session
+    :param post_id: int: Get the post id from the path
+    :param comment_id: int: Get the id of the comment at the top of the subtree from the path
+    :return: A list of commentresponse objects
+    """
+    comments = await comment_repository.get_thread(skip, limit, db, post_id, comment_id, cursor)
+    if not comments and cursor is None and not skip:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    set_next_cursor(response, comments)
+    return [CommentResponse.from_row(row) for row in comments]
+
+
 @router.patch("/{comment_id}/edit_comment", status_code=status.HTTP_200_OK, response_model=CommentBase)
-async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                        current_user: User = Depends(auth_service.get_current_user)):
 
     """
@@ -103,7 +157,7 @@ async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: Ses
 
     :param body: CommentModel: Specify the data that will be sent in the request body
     :param comment_id: int: Get the id of the comment to be deleted
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the user who is currently logged in
     :return: The edited comment
     :doc-author: Trelent
@@ -117,15 +171,13 @@ async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: Ses
 
 @router.delete("/{comment_id}", status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(RoleChecker([UserRole.Admin.name, UserRole.Moderator.name]))])
-async def delete_contact(comment_id: int = Path(ge=1), db: Session = Depends(get_db),
-                         current_user: User = Depends(auth_service.get_current_user)):
+async def delete_contact(comment_id: int = Path(ge=1), db: AsyncSession = Depends(get_db)):
 
     """
     The delete_contact function deletes a contact from the database.
 
     :param comment_id: int: Get the comment id from the url path
-    :param db: Session: Get the database session
-    :param current_user: User: Get the user that is currently logged in
+    :param db: AsyncSession: Get the database session
     :return: A 204 status code
     :doc-author: Trelent
     """
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, status
+
+from src.database.models import UserRole
+from src.repository.tags import tag_cache
+from src.services.cache import user_cache, verified_token_cache
+from src.services.derivatives import derivative_pool
+from src.services.passwords import password_pool
+from src.services.post_events import post_events
+from src.services.rate_buffer import rate_buffer
+from src.services.roles import RoleChecker
+from src.services.transform_backends import transform_backend
+
+router = APIRouter(prefix='/metrics', tags=['metrics'])
+
+
+@router.get('/', status_code=status.HTTP_200_OK,
+            dependencies=[Depends(RoleChecker([UserRole.Admin.name]))])
+async def get_metrics():
+    """
+    The get_metrics function returns in-process counters of the worker that served the request.
+
+    :return: A dictionary of metrics grouped by component
+    """
+    return {
+        "password_pool": password_pool.stats(),
+        "user_cache": user_cache.stats(),
+        "token_cache": verified_token_cache.stats(),
+        "tag_cache": tag_cache.stats(),
+        "derivatives": derivative_pool.stats(),
+        "transforms": transform_backend.stats(),
+        "rate_buffer": rate_buffer.stats(),
+        "post_events": post_events.stats(),
+    }
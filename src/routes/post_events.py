@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.connect import get_db
+from src.database.models import Post
+from src.services.messages_templates import NOT_FOUND
+from src.services.post_events import post_events
+
+router = APIRouter(prefix='/posts', tags=['events'])
+
+
+async def _event_stream(post_id: int, heartbeat: float):
+    # subscribed by the stream itself: a client that leaves before the stream starts leaves no subscription
+    subscription = await post_events.subscribe(post_id)
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # a comment line, which keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            dropped = subscription.take_dropped()
+            if dropped:
+                yield f"data: {json.dumps({'type': 'lagged', 'post_id': subscription.post_id, 'dropped': dropped})}\n\n"
+            yield frame
+    finally:
+        post_events.unsubscribe(subscription)
+
+
+@router.get('/{post_id}/events', response_class=StreamingResponse)
+async def stream_post_events(post_id: int = Path(ge=1), db: AsyncSession = Depends(get_db)):
+    """
+    The stream_post_events function streams the comment and rate events of a post as server-sent events,
+    instead of polling the lists of comments and rates. Every event is one ``data:`` line with a JSON object
+    whose type is comment_created, comment_updated, comment_deleted, rate_set or rate_removed. A client that
+    reads too slowly loses the oldest events and gets a ``lagged`` event with their number before the next one.
+
+    :param post_id: int: Id of the post to follow
+    :param db: AsyncSession: Get the database session
+    :return: A streaming response of text/event-stream
+    """
+    post = await db.scalar(select(Post.id).filter_by(id=post_id))
+    # the stream can stay open for hours: it must not keep a connection of the pool
+    await db.close()
+    if post is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+    return StreamingResponse(_event_stream(post_id, settings.post_events_heartbeat),
+                             media_type='text/event-stream',
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
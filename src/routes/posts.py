@@ -1,26 +1,31 @@
-import uuid
-import pathlib
-
 from typing import Annotated, List
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, File, UploadFile, Form, BackgroundTasks, \
+    Response
 from fastapi_limiter.depends import RateLimiter
 from fastapi_limiter import FastAPILimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import settings
 from src.database.connect import get_db
-from src.database.models import User, Post
+from src.database.models import User, Post, UserRole
 from src.services.auth import auth_service
-from src.schemas import PostBase, PostModel, PostCreate
+from src.schemas import PostBase, PostModel, PostCreate, PostDetailModel, PostBatchResponse, CommentResponse
+from src.repository import comments as comments_repository
 from src.repository import posts as posts_repository
+from src.repository import transform_posts as transform_repository
+from src.services.derivatives import generate_derivatives
+from src.services.pagination import get_cursor, set_next_cursor
+from src.services.transform_backends import transform_backend
+from src.services.uploads import save_upload
 
 
 router = APIRouter(prefix='/posts', tags=['posts'])
 
 
 @router.post('/p', response_model=PostModel, status_code=status.HTTP_201_CREATED)
-async def create_post(body: PostCreate = Depends(), img_file: UploadFile = File(...), db: Session = Depends(get_db),
-                      current_user: User = Depends(auth_service.get_current_user)):
+async def create_post(background_tasks: BackgroundTasks, body: PostCreate = Depends(), img_file: UploadFile = File(...),
+                      db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     # костиль для обхода проблеми коли на вхід всі теги ідуть однією строкою
     tags_list = []
     if len(body.tags) > 0:
@@ -30,28 +35,69 @@ async def create_post(body: PostCreate = Depends(), img_file: UploadFile = File(
     if len(body.tags) > 5:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Too many tags. Available only 5 tags.")
 
-    unique_filename = str(uuid.uuid4())+ pathlib.Path(img_file.filename).suffix
-    file_path = f"media/{unique_filename}"
-    with open(file_path, "wb") as f:
-        f.write(await img_file.read())
-    post = await posts_repository.create_post(body, file_path, db, current_user)
+    upload = await save_upload(img_file)
+    post = await posts_repository.create_post(body, upload, db, current_user)
+    # thumbnails and web sizes are rendered after the response has been sent
+    background_tasks.add_task(generate_derivatives, post.id, post.photo_url)
+    background_tasks.add_task(transform_backend.publish, post.id, post.photo_url)
     return post
 
 
 @router.get('/p/{post_id}', response_model=PostModel, status_code=status.HTTP_200_OK)
-async def get_post(post_id: int, db: Session = Depends(get_db)):
+async def get_post(post_id: int, db: AsyncSession = Depends(get_db)):
     post = await posts_repository.get_post(post_id, db)
     return post
 
 
+@router.get('/batch', response_model=PostBatchResponse, status_code=status.HTTP_200_OK)
+async def get_posts_batch(ids: List[str] = Query(), db: AsyncSession = Depends(get_db)):
+    # the tiles of a feed or a gallery in one request: ids=3,1,2 or ids=3&ids=1&ids=2
+    try:
+        post_ids = [int(post_id) for value in ids for post_id in value.split(",") if post_id.strip()]
+    except ValueError:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Post ids must be integers.")
+    # a repeated id is returned once, at its first place
+    post_ids = list(dict.fromkeys(post_ids))
+    if len(post_ids) > settings.posts_batch_max_size:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST,
+                            detail=f"Too many posts. Available only {settings.posts_batch_max_size} posts.")
+    posts = await posts_repository.get_posts(post_ids, db)
+    found = {post.id for post in posts}
+    return PostBatchResponse(posts=posts, missing=[post_id for post_id in post_ids if post_id not in found])
+
+
+@router.get('/p/{post_id}/detail', response_model=PostDetailModel, status_code=status.HTTP_200_OK)
+async def get_post_detail(post_id: int, comments_limit: int = Query(default=20, ge=1, le=100),
+                          transforms_limit: int = Query(default=20, ge=1, le=100), db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    # the page of a photo in one request; the comments continue from comments_next_cursor
+    # with the cursor parameter of GET /api/{post_id}/comments/
+    row = await posts_repository.get_post_detail(post_id, db)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    post, username = row
+    comments = await comments_repository.get_comments_with_users(0, comments_limit, db, post_id)
+    transforms = []
+    # as GET /api/image/transform/all/{id}, which lists nothing to the other users
+    if post.user_id == current_user.id or current_user.user_role == UserRole.Admin.name:
+        transforms = await transform_repository.get_all_transform_images(post_id, 0, transforms_limit, current_user,
+                                                                         db)
+    return PostDetailModel(**PostModel.from_orm(post).dict(), username=username, rate_avg=post.rate_avg,
+                           rate_count=post.rate_count, comment_count=post.comment_count,
+                           comments=[CommentResponse.from_row(comment) for comment in comments],
+                           comments_next_cursor=comments.next_cursor, transforms=transforms)
+
+
 @router.get('/u/{user_id}', response_model=List[PostModel], status_code=status.HTTP_200_OK)
-async def get_user_posts(user_id: int, db: Session = Depends(get_db)):
-    posts = await posts_repository.get_user_posts(user_id, db)
+async def get_user_posts(user_id: int, response: Response, skip: int = 0, limit: int = 20,
+                         cursor: list | None = Depends(get_cursor), db: AsyncSession = Depends(get_db)):
+    posts = await posts_repository.get_user_posts(user_id, db, skip, limit, cursor)
+    set_next_cursor(response, posts)
     return posts
 
 
 @router.put('/p/{post_id}', response_model=PostModel, status_code=status.HTTP_200_OK)
-async def update_post(post_id: int, body: PostCreate, db: Session = Depends(get_db),
+async def update_post(post_id: int, body: PostCreate, db: AsyncSession = Depends(get_db),
                       current_user: User = Depends(auth_service.get_current_user)):
     if len(body.tags) > 5:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Too many tags. Available only 5 tags.")
@@ -60,7 +106,7 @@ async def update_post(post_id: int, body: PostCreate, db: Session = Depends(get_
 
 
 @router.delete('/p/{post_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def remove_post(post_id: int, db: Session = Depends(get_db)):
+async def remove_post(post_id: int, db: AsyncSession = Depends(get_db)):
     post = await posts_repository.remove_post(post_id, db)
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
@@ -68,7 +114,7 @@ async def remove_post(post_id: int, db: Session = Depends(get_db)):
 
 
 @router.put('/d/{post_id}', status_code=status.HTTP_200_OK)
-async def change_post_mark(post_id: int, db: Session = Depends(get_db)):
+async def change_post_mark(post_id: int, db: AsyncSession = Depends(get_db)):
     post = await posts_repository.change_post_mark(post_id, db)
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
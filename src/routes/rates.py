@@ -1,22 +1,24 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Union
 
 from src.database.connect import get_db
 from src.database.models import User, UserRole
-from src.schemas import RateCreate, RateDB, RateResponse
-from src.services.auth import auth_service
+from src.schemas import RateCreate, RateDB, RateResponse, RatePending
+from src.services.auth import auth_service, TokenUser
 import src.repository.rates as rep_rates
 from src.services.messages_templates import NOT_FOUND
+from src.services.pagination import get_cursor, set_next_cursor
+from src.services.rate_buffer import rate_buffer
 from src.services.roles import RoleChecker
 
 router = APIRouter(prefix='/rate', tags=['rate posts'])
 
 
-@router.post('/{image_id}', response_model=RateDB, status_code=status.HTTP_201_CREATED)
-async def set_rates_for_posts(image_id: int, body: RateCreate,
+@router.post('/{image_id}', response_model=Union[RateDB, RatePending], status_code=status.HTTP_201_CREATED)
+async def set_rates_for_posts(image_id: int, body: RateCreate, response: Response,
                               current_user: User = Depends(auth_service.get_current_user),
-                              db: Session = Depends(get_db)):
+                              db: AsyncSession = Depends(get_db)):
     """
     The set_rates_for_posts function is used to set a rate for an image.
         The function takes in the following parameters:
@@ -26,12 +28,20 @@ async def set_rates_for_posts(image_id: int, body: RateCreate,
               created this post (the user). This parameter uses dependency injection and calls auth service's get
               current user function in order to retrieve this data from our database using SQLAlchemy OR
 
+    With write-behind rating enabled the rate is buffered and written later: the response is 202 Accepted
+    with the pending rate, and rates of missing or own posts are dropped when the buffer is flushed.
+    While the buffer is full, e.g. because the database was unreachable, the rate is written directly.
+
     :param image_id: int: Identify the image that is being rated
     :param body: RateCreate: Get the rate value from the request body
+    :param response: Response: Set the status code of a buffered rate
     :param current_user: User: Get the current user from the database
-    :param db: Session: Get the database session
-    :return: The rate object that was created
+    :param db: AsyncSession: Get the database session
+    :return: The rate object that was created, or the pending rate
     """
+    if rate_buffer.enabled and rate_buffer.add(image_id, current_user.id, body.rate):
+        response.status_code = status.HTTP_202_ACCEPTED
+        return RatePending(rate=body.rate, user_id=current_user.id, photo_id=image_id)
     rate = await rep_rates.set_rate_for_image(image_id, body.rate, current_user, db)
     if rate is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=NOT_FOUND)
@@ -40,7 +50,7 @@ async def set_rates_for_posts(image_id: int, body: RateCreate,
 
 @router.delete('/{rate_id}', status_code=status.HTTP_204_NO_CONTENT)
 async def remove_rate(rate_id: int, current_user: User = Depends(auth_service.get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     The remove_rate function is used to remove a rate from the database.
         The function takes in an integer, which represents the id of the rate that will be removed.
@@ -50,7 +60,7 @@ async def remove_rate(rate_id: int, current_user: User = Depends(auth_service.ge
 
     :param rate_id: int: Identify the rate to be removed
     :param current_user: User: Get the user who is currently logged in
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :return: The rate that was removed
     :doc-author: Trelent
     """
@@ -60,9 +70,10 @@ async def remove_rate(rate_id: int, current_user: User = Depends(auth_service.ge
 
 
 @router.get('/{image_id}', response_model=List[RateResponse], status_code=status.HTTP_200_OK)
-async def get_rates_for_image(image_id: int, skip: int = 0, limit: int = 20,
+async def get_rates_for_image(image_id: int, response: Response, skip: int = 0, limit: int = 20,
+                              cursor: list | None = Depends(get_cursor),
                               current_user: User = Depends(auth_service.get_current_user),
-                              db: Session = Depends(get_db)):
+                              db: AsyncSession = Depends(get_db)):
     """
     The get_rates_for_image function returns a list of rates for the image with the given id.
         The function takes in an optional skip and limit parameter to paginate through results.
@@ -71,17 +82,21 @@ async def get_rates_for_image(image_id: int, skip: int = 0, limit: int = 20,
     :param image_id: int: Get the image id from the url
     :param skip: int: Skip a number of results
     :param limit: int: Limit the number of results returned
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
     :param current_user: User: Get the current user from the auth_service
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A list of all the rates for an image
     """
-    return await rep_rates.get_rate_for_image(image_id,  skip, limit, current_user, db)
+    rates = await rep_rates.get_rate_for_image(image_id, skip, limit, current_user, db, cursor)
+    set_next_cursor(response, rates)
+    return rates
 
 
 @router.get('/', response_model=List[RateResponse], status_code=status.HTTP_200_OK)
-async def get_rates_for_current_user(skip: int = 0, limit: int = 20,
+async def get_rates_for_current_user(response: Response, skip: int = 0, limit: int = 20,
+                                     cursor: list | None = Depends(get_cursor),
                                      current_user: User = Depends(auth_service.get_current_user),
-                                     db: Session = Depends(get_db)):
+                                     db: AsyncSession = Depends(get_db)):
     """
     The get_rates_for_current_user function returns a list of rates for the current user.
         The function takes in three parameters: skip, limit, and current_user.
@@ -91,19 +106,23 @@ async def get_rates_for_current_user(skip: int = 0, limit: int = 20,
 
     :param skip: int: Skip the first n records
     :param limit: int: Limit the number of rates returned
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
     :param current_user: User: Get the current user
-    :param db: Session: Connect to the database
+    :param db: AsyncSession: Connect to the database
     :return: The rates for the current user
     """
-    return await rep_rates.get_rate_for_user(skip, limit, current_user, db)
+    rates = await rep_rates.get_rate_for_user(skip, limit, current_user, db, cursor)
+    set_next_cursor(response, rates)
+    return rates
 
 
 @router.get('/user/{user_id}', response_model=List[RateResponse],
             dependencies=[Depends(RoleChecker([UserRole.Admin.name, UserRole.Moderator.name]))],
             status_code=status.HTTP_200_OK)
-async def get_rate_from_user(user_id: int, skip: int = 0, limit: int = 20,
-                             current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+async def get_rate_from_user(user_id: int, response: Response, skip: int = 0, limit: int = 20,
+                             cursor: list | None = Depends(get_cursor),
+                             current_user: TokenUser = Depends(auth_service.get_token_user),
+                             db: AsyncSession = Depends(get_db)):
     """
     The get_rate_from_user function returns a list of all the ratings that a user has made.
         The function takes in an integer for the user_id, and two optional integers for skip and limit.
@@ -114,8 +133,11 @@ async def get_rate_from_user(user_id: int, skip: int = 0, limit: int = 20,
     :param user_id: int: Get the user id from the url
     :param skip: int: Skip the first n results
     :param limit: int: Limit the number of results returned
-    :param current_user: User: Get the current user's info
-    :param db: Session: Pass the database session to the function
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
+    :param current_user: TokenUser: Get the current user's role from the access token
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of rates that the user has given to other users
     """
-    return await rep_rates.get_rate_from_user(user_id, skip, limit, current_user, db)
+    rates = await rep_rates.get_rate_from_user(user_id, skip, limit, current_user, db, cursor)
+    set_next_cursor(response, rates)
+    return rates
@@ -1,12 +1,13 @@
 from typing import List
 
-from fastapi import APIRouter, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, status, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User, UserRole
 from src.schemas import SearchModel, SearchResponse, UserModel, SearchUserModel
 from src.services.auth import auth_service
+from src.services.pagination import get_cursor, set_next_cursor
 from src.repository.search import get_search_posts, get_search_users
 from src.services.roles import RoleChecker
 
@@ -14,9 +15,10 @@ router = APIRouter(prefix='/search', tags=['search'])
 
 
 @router.post('/posts', response_model=List[SearchResponse], status_code=status.HTTP_200_OK)
-async def search_posts(body: SearchModel, skip: int = 0, limit: int = 20,
+async def search_posts(body: SearchModel, response: Response, skip: int = 0, limit: int = 20,
+                       cursor: list | None = Depends(get_cursor),
                        current_user: User = Depends(auth_service.get_current_user),
-                       db: Session = Depends(get_db)):
+                       db: AsyncSession = Depends(get_db)):
     """
     The search_posts function is used to search for posts based on a string.
     The function takes in the following parameters:
@@ -27,26 +29,29 @@ async def search_posts(body: SearchModel, skip: int = 0, limit: int = 20,
     :param body: SearchModel: Get the search string from the request body
     :param skip: int: Skip the first n posts
     :param limit: int: Limit the number of posts returned
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
     :param current_user: User: Get the current user
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of posts
     :doc-author: Trelent
     """
-    return await get_search_posts(
+    posts = await get_search_posts(
         search_str=body.search_str,
         sort=body.sort,
         sort_type=body.sort_type,
         skip=skip,
         limit=limit,
-        db=db)
+        db=db,
+        cursor=cursor)
+    set_next_cursor(response, posts)
+    return posts
 
 
 @router.post('/users', response_model=List[UserModel],
              dependencies=[Depends(RoleChecker([UserRole.Admin.name, UserRole.Moderator.name]))],
              status_code=status.HTTP_200_OK)
-async def search_posts(body: SearchUserModel, skip: int = 0, limit: int = 20,
-                       current_user: User = Depends(auth_service.get_current_user),
-                       db: Session = Depends(get_db)):
+async def search_posts(body: SearchUserModel, response: Response, skip: int = 0, limit: int = 20,
+                       cursor: list | None = Depends(get_cursor), db: AsyncSession = Depends(get_db)):
     """
     The search_posts function is used to search for users based on a string.
     The function takes in the following parameters:
@@ -57,15 +62,18 @@ async def search_posts(body: SearchUserModel, skip: int = 0, limit: int = 20,
     :param body: SearchUserModel: Get the search string from the request body
     :param skip: int: Skip a number of posts in the database
     :param limit: int: Limit the number of results returned
-    :param current_user: User: Get the current user
-    :param db: Session: Access the database
+    :param cursor: list | None: Continue after the X-Next-Cursor of the previous page instead of skipping
+    :param db: AsyncSession: Access the database
     :return: A list of posts
     :doc-author: Trelent
     """
-    return await get_search_users(
+    users = await get_search_users(
         search_str=body.search_str,
         sort=body.sort,
         sort_type=body.sort_type,
         skip=skip,
         limit=limit,
-        db=db)
+        db=db,
+        cursor=cursor)
+    set_next_cursor(response, users)
+    return users
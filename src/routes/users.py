@@ -1,7 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import src.repository.users as repository_users
 from src.database.connect import get_db
@@ -17,7 +17,7 @@ permission_to_baned = RoleChecker(["Admin"])
 
 
 @router.get('/all', response_model=List[UserModel])
-async def get_contacts(db: Session = Depends(get_db)):
+async def get_contacts(db: AsyncSession = Depends(get_db)):
     all_users = await repository_users.get_all_users(User(id=1), db)
     if all_users is None:
         raise HTTPException(
@@ -26,7 +26,7 @@ async def get_contacts(db: Session = Depends(get_db)):
 
 
 @router.get("/get_user_profile", response_model=UserProfileModel)
-async def get_user_profile(username: str, db: Session = Depends(get_db)):
+async def get_user_profile(username: str, db: AsyncSession = Depends(get_db)):
     user_profile = await repository_users.get_user_profile(username, db)
     if user_profile is None:
         raise HTTPException(
@@ -38,7 +38,7 @@ async def get_user_profile(username: str, db: Session = Depends(get_db)):
 async def update_user_self(
         body: UserBase,
         user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)):
+        db: AsyncSession = Depends(get_db)):
     user = await repository_users.update_user_self(body, user, db)
     if user is None:
         raise HTTPException(
@@ -50,7 +50,7 @@ async def update_user_self(
 async def update_user_as_admin(
         body: UserUpdate,
         user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db)):
+        db: AsyncSession = Depends(get_db)):
     user = await repository_users.update_user_as_admin(body, user, db)
     if user is None:
         raise HTTPException(
@@ -63,7 +63,7 @@ async def update_user_as_admin(
             status_code=200,
             dependencies=[Depends(permission_to_baned)])
 async def banned_user_profile(user_id: int,
-                              db: Session = Depends(get_db)):
+                              db: AsyncSession = Depends(get_db)):
     banned = await repository_users.banned_user(user_id, db)
     if banned is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
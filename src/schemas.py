@@ -6,6 +6,8 @@ from fastapi import Query
 from pydantic import BaseModel
 from pydantic import EmailStr, Field
 
+from src.schemas_transform_posts import TransformImageResponse
+
 
 class UserBase(BaseModel):
     username: str = Field(min_length=2, max_length=15)
@@ -81,12 +83,22 @@ class PostCreate(BaseModel):
     tags: Optional[List[str]]
 
 
+class DerivativeModel(BaseModel):
+    photo_url: str
+    width: int
+    height: int
+
+    class Config:
+        orm_mode = True
+
+
 class PostModel(PostBase):
     id: int
     created_at: datetime
     updated_at: datetime
     user_id: int
     tags: Optional[List[TagModel]]
+    derivatives: List[DerivativeModel] = []
 
     class Config:
         orm_mode = True
@@ -102,6 +114,9 @@ class CommentBase(BaseModel):
     created_at: datetime
     updated_at: datetime | None
     user_id: int
+    parent_id: int | None = None
+    reply_count: int = 0
+    depth: int = 0
 
     class Config:
         orm_mode = True
@@ -114,6 +129,29 @@ class CommentResponse(BaseModel):
     username: str
     user_avatar: str | None
 
+    @classmethod
+    def from_row(cls, row) -> 'CommentResponse':
+        """
+        Builds the response of a row of the comment columns joined with the name fields of its author.
+        """
+        return cls(comment=row, user_first_name=row.user_first_name, user_last_name=row.user_last_name,
+                   username=row.username, user_avatar=None)
+
+
+class PostDetailModel(PostModel):
+    username: str
+    rate_avg: float
+    rate_count: int
+    comment_count: int
+    comments: List[CommentResponse]
+    comments_next_cursor: str | None
+    transforms: List[TransformImageResponse]
+
+
+class PostBatchResponse(BaseModel):
+    posts: List[PostModel]
+    missing: List[int]
+
 
 class RateCreate(BaseModel):
     rate: int = Field(ge=1, le=5)
@@ -131,6 +169,12 @@ class RateDB(BaseModel):
         orm_mode = True
 
 
+class RatePending(BaseModel):
+    rate: int
+    user_id: int
+    photo_id: int
+
+
 class RateResponse(RateDB, BaseModel):
     username: str
     photo_url: str
@@ -139,6 +183,7 @@ class RateResponse(RateDB, BaseModel):
 class SortType(str, Enum):
     rate = 'rate'
     date = 'date'
+    relevance = 'relevance'
 
 
 class SortUserType(str, Enum):
@@ -175,3 +220,4 @@ class SearchResponse(PostBase, BaseModel):
     updated_at: datetime
     rate: int
     tags: Optional[List[TagType]]
+    derivatives: List[DerivativeModel] = []
@@ -1,28 +1,49 @@
+import hashlib
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
 from src.database.connect import get_db
+from src.database.models import User
 from src.repository import users as repository_users
 from src.services.messages_templates import NOT_VALIDATE_CREDENTIALS, INVALID_SCOPE
+from src.services import passwords
+from src.services.passwords import password_pool
+from src.services.cache import user_cache, token_version_cache, verified_token_cache, revoked_token_cache
+
+
+@dataclass
+class TokenUser:
+    """
+    Caller identity as stated by the claims of a verified access token.
+
+    Carries only what authorization needs, so it can be built without loading the user row.
+    """
+    email: str
+    user_role: str
+    is_active: bool
+    token_version: int
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = "secret_key"
     ALGORITHM = "HS256"
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    # bcrypt is CPU-bound, so both run in the bounded password pool instead of on the event loop
+    async def verify_password(self, plain_password, hashed_password):
+        return await password_pool.run(passwords.verify_password, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    async def get_password_hash(self, password: str):
+        return await password_pool.run(passwords.hash_password, password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -37,6 +58,22 @@ class Auth:
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
+    async def create_user_access_token(self, user: User, expires_delta: Optional[float] = None):
+        """
+        The create_user_access_token function issues an access token for the given user.
+            Besides the email the token carries the role, the is_active flag and the user's
+            token_version, so RoleChecker can authorize the request from the token alone.
+
+        :param self: Represent the instance of the class
+        :param user: User: The user the token is issued to
+        :param expires_delta: Optional[float]: Lifetime of the token in seconds
+        :return: An encoded access token
+        """
+        token_version_cache.set(user.email, user.token_version)
+        return await self.create_access_token(
+            data={"sub": user.email, "role": user.user_role, "active": user.is_active, "ver": user.token_version},
+            expires_delta=expires_delta)
+
     # define a function to generate a new refresh token
     async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
         to_encode = data.copy()
@@ -63,29 +100,131 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail=NOT_VALIDATE_CREDENTIALS)
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    @staticmethod
+    def _token_digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def decode_access_token(self, token: str) -> dict:
+        """
+        The decode_access_token function verifies an access token and returns its claims.
+            Clients reuse one token for many requests, so verified claims are cached under the
+            token's digest until the token expires and the signature is checked only once per worker.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token
+        :return: The claims of the token
+        """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=NOT_VALIDATE_CREDENTIALS,
         )
 
+        digest = self._token_digest(token)
+        if revoked_token_cache.get(digest):
+            raise credentials_exception
+        payload = verified_token_cache.get(digest)
+        if payload is not None:
+            return payload
+
         try:
             # Decode JWT
             payload = jwt.decode(token, self.SECRET_KEY,
                                  algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
         except JWTError as e:
             raise credentials_exception
-
-        user = await repository_users.get_user_by_email(email, db)
-        if user is None:
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
             raise credentials_exception
+        if 'exp' in payload:
+            verified_token_cache.set(digest, payload, ttl=payload['exp'] - time.time())
+        return payload
+
+    def revoke_access_token(self, token: str):
+        """
+        The revoke_access_token function makes this worker reject the token until it expires.
+            Revocation is per worker: other workers accept the token until it expires. Bumping the user's
+            token_version instead makes get_current_user reject every token issued before, in every worker
+            once its cached copy of the user has expired (after user_cache_ttl seconds at most).
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token to revoke
+        :return: None
+        """
+        payload = self.decode_access_token(token)
+        digest = self._token_digest(token)
+        verified_token_cache.invalidate(digest)
+        revoked_token_cache.set(digest, True, ttl=payload['exp'] - time.time() if 'exp' in payload else None)
+
+    @staticmethod
+    def _user_snapshot(user: User) -> dict:
+        return {attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs}
+
+    async def get_user(self, email: str, db: AsyncSession) -> User:
+        """
+        The get_user function returns the user with the given email, attached to the session of the request.
+            The cache holds the column values of the user rather than the User instance, which belongs to the
+            session of the request that loaded it. A cached user is rebuilt from them and merged into db
+            without a query, so it can be changed and committed like a loaded one.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :param db: AsyncSession: The session of the request
+        :return: The user
+        """
+        snapshot = user_cache.get(email)
+        if snapshot is None:
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=NOT_VALIDATE_CREDENTIALS)
+            user_cache.set(email, self._user_snapshot(user))
+            return user
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+        The get_current_user function returns the user an access token was issued to.
+            The token is rejected when the user is banned or when it carries an older token_version than the
+            user's, i.e. it was issued before the version was bumped. Tokens without the claim predate it.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token from the Authorization header
+        :param db: AsyncSession: The session of the request
+        :return: The user
+        """
+        payload = self.decode_access_token(token)
+        user = await self.get_user(payload["sub"], db)
+        version = payload.get("ver")
+        if version is not None and version > user.token_version:
+            # issued by a worker that saw the bump after this one cached the user
+            await db.refresh(user)
+            user_cache.set(user.email, self._user_snapshot(user))
+        if not user.is_active or (version is not None and version != user.token_version):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=NOT_VALIDATE_CREDENTIALS)
         return user
 
+    async def get_token_user(self, token: str = Depends(oauth2_scheme),
+                             db: AsyncSession = Depends(get_db)) -> TokenUser:
+        """
+        The get_token_user function identifies the caller from the claims of the access token.
+            The claims are trusted while the token's version matches the version this worker last saw
+            for the user. Otherwise (the version was bumped, the worker has not seen the user yet or the
+            token predates the claims) the user row is loaded and its current role and status are used.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token from the Authorization header
+        :param db: AsyncSession: Only used when the token version is stale
+        :return: A TokenUser object
+        """
+        payload = self.decode_access_token(token)
+        email = payload["sub"]
+        version = payload.get("ver")
+        if version is not None and token_version_cache.get(email) == version:
+            return TokenUser(email=email, user_role=payload["role"], is_active=payload["active"],
+                             token_version=version)
+        user = await self.get_user(email, db)
+        token_version_cache.set(email, user.token_version)
+        return TokenUser(email=user.email, user_role=user.user_role, is_active=user.is_active,
+                         token_version=user.token_version)
 
 auth_service = Auth()
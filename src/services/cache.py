@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from src.conf.config import settings
+
+
+class TTLCache:
+    """
+    In-process LRU cache whose entries also expire after a time-to-live.
+
+    The cache lives in one worker process and is only touched from the event loop,
+    so it needs no locking. Other workers keep their own copy, which is why every
+    entry also has a TTL: that TTL bounds how stale another worker's copy can get.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable):
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
+# email -> the token_version this worker last saw for that user; access tokens carrying
+# the same version are trusted without loading the user row
+token_version_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
+
+# sha256(access token) -> verified claims; every entry is stored with the TTL left until
+# the token's exp, so an expired token is never served from here
+verified_token_cache = TTLCache(settings.token_cache_size, ttl=0.0)
+
+# sha256(access token) -> True for tokens revoked in this worker, kept until their exp
+# (tokens without exp are kept for the default access token lifetime)
+revoked_token_cache = TTLCache(settings.token_cache_size, ttl=15 * 60)
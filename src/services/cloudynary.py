@@ -1,6 +1,5 @@
 import cloudinary
 import cloudinary.uploader
-import cloudinary.api
 import base64
 import io
 import qrcode
@@ -18,13 +17,28 @@ cloudinary.config(
     )
 
 
-def upload_image(image_url: str):
-    try:
-        image_info = cloudinary.api.resource("789.jpg")
-    except cloudinary.exceptions.NotFound:
-        with open(image_url, "rb") as f:
-            file = f.read()
-        cloudinary.uploader.upload(file, public_id=image_url.split('.')[0], overwrite=True)
+def public_id_for(image_url: str) -> str:
+    """
+    The public_id_for function returns the Cloudinary public_id a local image is uploaded under.
+    Stored photos are named after their content, so the same file always gets the same public_id.
+
+    :param image_url: str: Path of the image in the media directory
+    :return: The public_id without file extension
+    """
+    return image_url.rsplit('.', 1)[0]
+
+
+def upload_image(image_url: str, public_id: str) -> str:
+    """
+    The upload_image function uploads a local image to Cloudinary. It blocks on network I/O,
+    so it is only called from the background uploader, in a worker thread.
+
+    :param image_url: str: Path of the image in the media directory
+    :param public_id: str: Public_id to upload the image under
+    :return: The public_id Cloudinary stored the image under
+    """
+    response = cloudinary.uploader.upload(image_url, public_id=public_id, overwrite=False)
+    return response['public_id']
 
 
 def get_url(image_url: str):
@@ -39,18 +53,16 @@ def get_url(image_url: str):
     return cloudinary.CloudinaryImage(image_url).build_url()
 
 
-def get_transformed_url(image_url: str, transform_list: list[dict]):
+def get_transformed_url(public_id: str, transform_list: list[dict]):
     """
-    The get_transformed_url function takes in an image_url and a list of transformations,
-    and returns the url for the transformed image.
-
+    The get_transformed_url function takes in the public_id of an uploaded image and a list of transformations,
+    and returns the url for the transformed image. The url is only built, no request is sent to Cloudinary.
 
-    :param image_url: str: Specify the image to be transformed
+    :param public_id: str: Public_id of the image uploaded by the background uploader
     :param transform_list: list[dict]: Specify the transformations that will be applied to the image
     :return: A url string with the transformations applied
     """
-    upload_image(image_url)
-    return cloudinary.CloudinaryImage(image_url).build_url(transformation=transform_list)
+    return cloudinary.CloudinaryImage(public_id).build_url(transformation=transform_list)
 
 
 def get_qrcode(photo_url: str):
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from PIL import Image, ImageOps
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.repository import posts as repository_posts
+from src.services.media_store import derivative_path
+
+logger = logging.getLogger(__name__)
+
+
+def render_derivatives(source_path: str, widths: tuple[int, ...]) -> list[tuple[int, int, str]]:
+    """
+    Writes downscaled copies of an image next to it. Runs in a worker process.
+
+    Widths that are not smaller than the original are skipped, images are never upscaled.
+    A derivative that already exists (the same content was uploaded before) is not rendered again.
+
+    :param source_path: Path of the original image
+    :param widths: Target widths in pixels
+    :return: (width, height, path) of every derivative
+    """
+    derivatives = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        image_format, extension = ('PNG', '.png') if 'A' in image.getbands() else ('JPEG', '.jpg')
+        for width in sorted(widths):
+            if width >= image.width:
+                continue
+            height = max(round(image.height * width / image.width), 1)
+            path = derivative_path(source_path, width, extension)
+            if not os.path.exists(path):
+                resized = image.resize((width, height), Image.LANCZOS)
+                if image_format == 'JPEG' and resized.mode != 'RGB':
+                    resized = resized.convert('RGB')
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.derivative-')
+                try:
+                    with os.fdopen(fd, 'wb') as file:
+                        resized.save(file, image_format, optimize=True)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            derivatives.append((width, height, path))
+    return derivatives
+
+
+def _timed_render(source_path: str, widths: tuple[int, ...]):
+    started = time.perf_counter()
+    derivatives = render_derivatives(source_path, widths)
+    return time.perf_counter() - started, derivatives
+
+
+class DerivativePool:
+    """
+    Process pool that renders thumbnails and web sizes of uploaded photos.
+
+    Resizing is CPU-bound and holds the GIL, so it runs in separate processes and
+    never on the event loop. Processing time per image is logged and counted.
+    """
+
+    def __init__(self, widths: tuple[int, ...] = (160, 480, 1080), workers: int = 2):
+        self.widths = widths
+        self.workers = workers
+        self._executor: Executor | None = None
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def render(self, source_path: str) -> list[tuple[int, int, str]]:
+        """
+        Renders the configured widths of an image in the pool.
+
+        :param source_path: Path of the original image
+        :return: (width, height, path) of every derivative
+        """
+        self._pending += 1
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            elapsed, derivatives = await loop.run_in_executor(executor, _timed_render, source_path, self.widths)
+        except BrokenProcessPool:
+            # a worker that died (e.g. killed for memory) breaks the whole pool: the next render starts a new one
+            self.failed += 1
+            if self._executor is executor:
+                self._executor = None
+            executor.shutdown(wait=False)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        self.completed += 1
+        self.time_total += elapsed
+        self.time_max = max(self.time_max, elapsed)
+        logger.info("rendered %d derivatives of %s in %.1f ms", len(derivatives), source_path, elapsed * 1000)
+        return derivatives
+
+    def stats(self) -> dict:
+        return {
+            "widths": list(self.widths),
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "processing_avg_ms": self.time_total / self.completed * 1000 if self.completed else 0.0,
+            "processing_max_ms": self.time_max * 1000,
+        }
+
+    async def shutdown(self):
+        """
+        Waits for the renders in flight in a worker thread, so that the event loop keeps running meanwhile.
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True)
+
+
+derivative_pool = DerivativePool(tuple(settings.derivative_widths), settings.derivative_workers)
+
+
+async def generate_derivatives(post_id: int, source_path: str,
+                               session_factory: Callable[[], AsyncSession] = SessionLocal):
+    """
+    Renders and records the derivatives of a new post. Runs as a background task after the response,
+    with a session of its own: the session of the request may be closed by then.
+
+    :param post_id: Id of the post
+    :param source_path: Path of the post's photo
+    :param session_factory: Opens the session the derivatives are recorded with
+    """
+    try:
+        derivatives = await derivative_pool.render(source_path)
+        # no connection is held while the image is rendered
+        async with session_factory() as db:
+            await repository_posts.add_derivatives(post_id, derivatives, db)
+    except Exception:
+        logger.exception("could not create derivatives of post %s", post_id)
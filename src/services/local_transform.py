@@ -0,0 +1,230 @@
+import os
+import tempfile
+
+from PIL import Image, ImageColor, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+
+from src.conf.config import settings
+from src.schemas_transform_posts import TransformImageModel, TransformCropModel, RadiusImageModel, \
+    TypeResizeImage, GravityImage, TypeArtEffect, SimpleEffectType, TypeContrast, TypeBlurEffect
+
+# where the kept part of the image is anchored, as (x, y) fractions; face/auto detection
+# is not available locally, so both fall back to the center
+GRAVITY_CENTERING = {
+    GravityImage.auto: (0.5, 0.5),
+    GravityImage.face: (0.5, 0.5),
+    GravityImage.center: (0.5, 0.5),
+    GravityImage.north: (0.5, 0.0),
+    GravityImage.south: (0.5, 1.0),
+    GravityImage.west: (0.0, 0.5),
+    GravityImage.east: (1.0, 0.5),
+    GravityImage.north_west: (0.0, 0.0),
+    GravityImage.north_east: (1.0, 0.0),
+    GravityImage.south_west: (0.0, 1.0),
+    GravityImage.south_east: (1.0, 1.0),
+}
+
+# Cloudinary's art filters are proprietary; each one is approximated by a color grade of
+# (saturation, contrast, brightness, tint color, tint amount)
+ART_EFFECTS = {
+    TypeArtEffect.al_dente: (1.1, 1.15, 1.05, (255, 220, 170), 0.10),
+    TypeArtEffect.athena: (0.8, 1.1, 1.05, (220, 200, 255), 0.10),
+    TypeArtEffect.audrey: (0.0, 1.3, 1.0, (0, 0, 0), 0.0),
+    TypeArtEffect.aurora: (1.2, 1.0, 1.05, (150, 255, 220), 0.12),
+    TypeArtEffect.daguerre: (0.0, 1.2, 0.95, (200, 170, 120), 0.25),
+    TypeArtEffect.eucalyptus: (0.9, 1.05, 1.0, (160, 220, 180), 0.15),
+    TypeArtEffect.fes: (1.1, 1.1, 1.05, (255, 190, 140), 0.12),
+    TypeArtEffect.frost: (0.7, 1.05, 1.1, (190, 220, 255), 0.18),
+    TypeArtEffect.hairspray: (1.2, 0.9, 1.1, (255, 200, 220), 0.10),
+    TypeArtEffect.hokusai: (1.3, 1.2, 1.0, (120, 170, 220), 0.12),
+    TypeArtEffect.incognito: (0.5, 1.1, 0.9, (90, 110, 130), 0.20),
+    TypeArtEffect.linen: (0.8, 0.9, 1.1, (240, 230, 210), 0.20),
+    TypeArtEffect.peacock: (1.4, 1.1, 1.0, (60, 160, 170), 0.12),
+    TypeArtEffect.primavera: (1.2, 1.0, 1.1, (210, 255, 190), 0.10),
+    TypeArtEffect.quartz: (0.6, 1.2, 1.05, (230, 220, 240), 0.15),
+    TypeArtEffect.red_rock: (1.2, 1.15, 0.95, (220, 100, 60), 0.15),
+    TypeArtEffect.refresh: (1.2, 1.1, 1.1, (200, 255, 255), 0.08),
+    TypeArtEffect.sizzle: (1.5, 1.2, 1.0, (255, 140, 60), 0.12),
+    TypeArtEffect.sonnet: (0.7, 0.95, 1.05, (255, 230, 200), 0.18),
+    TypeArtEffect.ukulele: (1.3, 1.05, 1.1, (255, 210, 120), 0.12),
+    TypeArtEffect.zorro: (0.0, 1.4, 0.9, (0, 0, 0), 0.0),
+}
+
+
+class TransformTooLarge(ValueError):
+    """
+    Raised by a resize whose output would have more than ``max_pixels`` pixels.
+    """
+
+    def __init__(self, max_pixels: int):
+        super().__init__(max_pixels)
+        self.max_pixels = max_pixels
+
+
+def _size(value, full: int) -> int:
+    # a float between 0 and 1 is a fraction of the original size
+    if isinstance(value, float) and value <= 1:
+        return max(round(full * value), 1)
+    return max(int(value), 1)
+
+
+def _color(value: str | None) -> tuple[int, int, int]:
+    if not value:
+        return 0, 0, 0
+    if value.startswith('rgb:'):
+        value = '#' + value[4:]
+    return ImageColor.getrgb(value)[:3]
+
+
+def resize(image: Image.Image, options: TransformCropModel,
+           max_pixels: int = settings.transform_max_pixels) -> Image.Image:
+    width, height = _size(options.width, image.width), _size(options.height, image.height)
+    centering = GRAVITY_CENTERING[options.gravity or GravityImage.center]
+    mode = options.crop or TypeResizeImage.scale
+    # every mode but crop allocates the requested size, whatever the size of the original
+    if mode != TypeResizeImage.crop and width * height > max_pixels:
+        raise TransformTooLarge(max_pixels)
+    if mode == TypeResizeImage.scale:
+        return image.resize((width, height), Image.LANCZOS)
+    if mode == TypeResizeImage.fit:
+        return ImageOps.contain(image, (width, height), Image.LANCZOS)
+    if mode in (TypeResizeImage.fill, TypeResizeImage.thumb):
+        return ImageOps.fit(image, (width, height), Image.LANCZOS, centering=centering)
+    if mode in (TypeResizeImage.pad, TypeResizeImage.fill_pad):
+        return ImageOps.pad(image, (width, height), Image.LANCZOS, color=_color(options.background),
+                            centering=centering)
+    # crop: cut the region out of the original without scaling
+    width, height = min(width, image.width), min(height, image.height)
+    left = round((image.width - width) * centering[0])
+    top = round((image.height - height) * centering[1])
+    return image.crop((left, top, left + width, top + height))
+
+
+def rotate(image: Image.Image, degree: int) -> Image.Image:
+    # Cloudinary rotates clockwise, Pillow counterclockwise
+    return image.rotate(-degree, Image.BICUBIC, expand=True)
+
+
+def round_corners(image: Image.Image, options: RadiusImageModel) -> Image.Image:
+    if options.max:
+        radii = [min(image.size) // 2] * 4
+    elif options.all > 0:
+        radii = [options.all] * 4
+    else:
+        radii = [options.left_top, options.right_top, options.right_bottom, options.left_bottom]
+    mask = Image.new('L', image.size, 255)
+    draw = ImageDraw.Draw(mask)
+    right, bottom = image.width - 1, image.height - 1
+    corners = [(0, 0, 1, 1), (right, 0, -1, 1), (right, bottom, -1, -1), (0, bottom, 1, -1)]
+    for radius, (x, y, dx, dy) in zip(radii, corners):
+        radius = min(radius, min(image.size) // 2)
+        if radius <= 0:
+            continue
+        box = sorted([x, x + dx * radius]), sorted([y, y + dy * radius])
+        draw.rectangle((box[0][0], box[1][0], box[0][1], box[1][1]), fill=0)
+        circle = sorted([x, x + dx * 2 * radius]), sorted([y, y + dy * 2 * radius])
+        draw.ellipse((circle[0][0], circle[1][0], circle[0][1], circle[1][1]), fill=255)
+    rounded = image.convert('RGBA')
+    rounded.putalpha(mask)
+    return rounded
+
+
+def art_effect(image: Image.Image, effect: TypeArtEffect) -> Image.Image:
+    saturation, contrast, brightness, tint, amount = ART_EFFECTS[effect]
+    image = ImageEnhance.Color(image).enhance(saturation)
+    image = ImageEnhance.Contrast(image).enhance(contrast)
+    image = ImageEnhance.Brightness(image).enhance(brightness)
+    if amount:
+        image = Image.blend(image, Image.new('RGB', image.size, tint), amount)
+    return image
+
+
+def simple_effect(image: Image.Image, effect: SimpleEffectType, strength: int) -> Image.Image:
+    if effect == SimpleEffectType.blackwhite:
+        threshold = round(255 * strength / 100) if strength else 128
+        return image.convert('L').point(lambda p: 255 if p > threshold else 0).convert('RGB')
+    if effect == SimpleEffectType.oil_paint:
+        # the mode filter is slow, so the brush strokes are painted on a reduced copy
+        factor = 2 + strength // 25
+        strokes = image.reduce(factor).filter(ImageFilter.ModeFilter(3))
+        return strokes.resize(image.size, Image.BICUBIC).filter(ImageFilter.SMOOTH)
+    if effect == SimpleEffectType.grayscale:
+        changed = ImageOps.grayscale(image).convert('RGB')
+    elif effect == SimpleEffectType.negate:
+        changed = ImageOps.invert(image)
+    else:  # cartoonify: flatten colors and outline edges
+        changed = ImageOps.posterize(image.filter(ImageFilter.SMOOTH_MORE), 3)
+        changed = changed.filter(ImageFilter.EDGE_ENHANCE_MORE)
+    return Image.blend(image, changed, strength / 100)
+
+
+def contrast_effect(image: Image.Image, effect: TypeContrast, level: int) -> Image.Image:
+    enhancer = ImageEnhance.Contrast if effect == TypeContrast.contrast else ImageEnhance.Brightness
+    return enhancer(image).enhance(1 + level / 100)
+
+
+def blur_effect(image: Image.Image, strength: int, x: int | None = None, y: int | None = None,
+                width: int | None = None, height: int | None = None) -> Image.Image:
+    radius = strength / 100
+    left, top = x or 0, y or 0
+    right = image.width if width is None else min(left + width, image.width)
+    bottom = image.height if height is None else min(top + height, image.height)
+    if left >= right or top >= bottom:
+        return image
+    image = image.copy()
+    region = image.crop((left, top, right, bottom)).filter(ImageFilter.GaussianBlur(radius))
+    image.paste(region, (left, top))
+    return image
+
+
+def render_transformation(source_path: str, transformation: dict, output_path: str) -> str:
+    """
+    Applies a TransformImageModel to an image and writes the result. Runs in a worker process.
+
+    Operations are applied in the order Cloudinary gets them from create_list_transformation,
+    except that rounded corners come last so no effect touches the transparent corners.
+
+    :param source_path: Path of the original image
+    :param transformation: TransformImageModel as a dict (it has to be picklable)
+    :param output_path: Path without extension; the extension follows the output format
+    :return: Path of the written image
+    """
+    body = TransformImageModel.parse_obj(transformation)
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    if body.resize:
+        image = resize(image, body.resize)
+    if body.rotate:
+        image = rotate(image, body.rotate.degree)
+    if body.art_effect:
+        image = art_effect(image, body.art_effect.effect)
+    for item in body.simple_effect or []:
+        image = simple_effect(image, item.effect, item.strength)
+    for item in body.contrast_effect or []:
+        image = contrast_effect(image, item.effect, item.level)
+    for item in body.blur_effect or []:
+        image = blur_effect(image, item.strength, item.x, item.y, item.width, item.height)
+    if body.radius:
+        image = round_corners(image, body.radius)
+        path, image_format, options = output_path + '.png', 'PNG', {'compress_level': 3}
+    else:
+        path, image_format, options = output_path + '.jpg', 'JPEG', {'quality': 90}
+    # readers of the path never see a partly written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.transform-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            image.save(file, image_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def unsupported_operations(body: TransformImageModel) -> list[str]:
+    """
+    Lists the requested operations the local engine cannot perform.
+
+    :param body: Requested transformation
+    :return: Names of the unsupported operations
+    """
+    return [item.effect.value for item in body.blur_effect or [] if item.effect == TypeBlurEffect.blur_faces]
@@ -0,0 +1,67 @@
+import asyncio
+import glob
+import os
+import pathlib
+
+from src.conf.config import settings
+
+
+def derivative_path(path: str, width: int, extension: str) -> str:
+    """
+    Path of a resized copy of a stored file, kept next to the original.
+
+    :param path: Path of the original file
+    :param width: Width of the copy in pixels
+    :param extension: Extension of the copy's format
+    :return: ``<original without extension>_<width>w<extension>``
+    """
+    return f"{os.path.splitext(path)[0]}_{width}w{extension}"
+
+
+class MediaStore:
+    """
+    Content-addressed file storage for uploaded photos.
+
+    A file is stored under the SHA-256 of its bytes, sharded into two levels of
+    directories (``ab/cd/abcd...``), so identical uploads map to one file and no
+    directory grows too large. Which posts use a file is tracked in ``media_blobs``.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, sha256: str, extension: str) -> str:
+        return f"{self.root}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+    @staticmethod
+    def _place(staged_path: str, path: str):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged_path, path)
+
+    async def place(self, staged_path: str, path: str):
+        """
+        Atomically moves a staged upload to its content address.
+
+        Replacing an existing file is harmless, since both have the same bytes.
+
+        :param staged_path: Path of the staged upload (in the same file system as ``path``)
+        :param path: Content address from ``path_for``
+        """
+        await asyncio.to_thread(self._place, staged_path, path)
+
+    @staticmethod
+    def _discard(path: str):
+        pathlib.Path(path).unlink(missing_ok=True)
+        for derivative in glob.glob(glob.escape(os.path.splitext(path)[0]) + '_*w.*'):
+            pathlib.Path(derivative).unlink(missing_ok=True)
+
+    async def discard(self, path: str):
+        """
+        Removes a file together with its derivatives.
+
+        :param path: Path of the file
+        """
+        await asyncio.to_thread(self._discard, path)
+
+
+media_store = MediaStore(settings.media_dir)
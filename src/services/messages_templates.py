@@ -19,3 +19,10 @@ WELCOME_MESSAGE = "Welcome to FastAPI!"
 TO_MANY_REQUESTS = 'No more than 10 requests per minute'
 PERMISSION_ERROR = "Permission Error (You are not authorized to perform this operation)"
 FORBIDDEN_ACCESS = "Operation not permitted"
+SERVICE_BUSY = "Server is busy, please try again later"
+FILE_TOO_LARGE = "File is too large"
+NOT_AN_IMAGE = "Only JPEG, PNG, GIF, BMP and WebP images are accepted"
+TRANSFORM_NOT_SUPPORTED = "Not supported by the local transform backend: {}"
+TRANSFORM_TOO_LARGE = "The transformed image would be larger than {} pixels"
+IMAGE_NOT_UPLOADED = "Image is not uploaded to the transformation service yet, please try again later"
+INVALID_CURSOR = "Invalid cursor"
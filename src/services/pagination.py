@@ -0,0 +1,154 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import Select, String, and_, desc, literal, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.services.messages_templates import INVALID_CURSOR
+
+# response header with the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(list):
+    """
+    Items of one page of a list endpoint. ``next_cursor`` continues after the last item,
+    it is None when the page is the last one.
+    """
+
+    def __init__(self, items: Sequence = (), next_cursor: str | None = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values: Sequence) -> str:
+    """
+    The encode_cursor function turns the sort key of a row into an opaque cursor.
+
+    :param values: Sequence: Values of the sort columns, the id last
+    :return: A url-safe string
+    """
+    data = json.dumps(list(values), separators=(',', ':'), default=lambda value: {"dt": value.isoformat()})
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    The decode_cursor function reads back the values encode_cursor was given.
+
+    :param cursor: str: A cursor from encode_cursor
+    :return: The values of the sort columns
+    :raises ValueError: The cursor is not one encode_cursor made
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data, object_hook=lambda value: datetime.fromisoformat(value["dt"]))
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"invalid cursor {cursor!r}") from error
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return values
+
+
+def get_cursor(cursor: str | None = Query(default=None, description="next cursor of the previous page")) \
+        -> list | None:
+    """
+    The get_cursor dependency decodes the ``cursor`` query parameter of list endpoints.
+
+    :param cursor: str | None: Cursor from the X-Next-Cursor header of the previous page
+    :return: The decoded cursor, None for the first page
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR)
+
+
+def _bounds(value: Any, key, db: AsyncSession) -> tuple:
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        python_type = object
+    if python_type is float and isinstance(value, int):
+        python_type = int
+    if value is None or not isinstance(value, python_type):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR)
+    bound = literal(value, key.type)
+    if isinstance(value, datetime) and not value.microsecond and db.get_bind().dialect.name == 'sqlite':
+        # SQLite keeps dates as text: CURRENT_TIMESTAMP defaults write them without the fraction
+        # of a second that dates written by SQLAlchemy always have, both texts are the same date
+        return literal(value.strftime('%Y-%m-%d %H:%M:%S'), String), bound
+    return bound, bound
+
+
+def _after(keys: Sequence, bounds: Sequence[tuple], descending: bool):
+    key, (lowest, highest) = keys[0], bounds[0]
+    beyond = key < lowest if descending else key > highest
+    if len(keys) == 1:
+        return beyond
+    return or_(beyond, and_(key.between(lowest, highest), _after(keys[1:], bounds[1:], descending)))
+
+
+def paginate(sql: Select, keys: Sequence, cursor: list | None, skip: int, limit: int, db: AsyncSession,
+             descending: bool = False) -> Select:
+    """
+    The paginate function orders a query by its sort key and selects one page of it: the rows after
+    the cursor when there is one (keyset pagination, served by an index on the key), otherwise the
+    rows after the first ``skip`` ones.
+
+    :param sql: Select: Query to paginate
+    :param keys: Sequence: Columns of the sort key, ending with a unique one (usually the id)
+    :param cursor: list | None: Decoded cursor of the previous page
+    :param skip: int: Number of rows to skip when there is no cursor
+    :param limit: int: Page size
+    :param db: AsyncSession: Session whose dialect decides how cursor dates are compared
+    :param descending: bool: Sort the key in descending order
+    :return: The query of the page
+    """
+    if cursor is not None:
+        if len(cursor) != len(keys):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR)
+        bounds = [_bounds(value, key, db) for value, key in zip(cursor, keys)]
+        if all(lowest is highest for lowest, highest in bounds):
+            # a row value comparison, which both databases resolve with a range scan of the index
+            position, after = tuple_(*keys), tuple_(*(bound for bound, _ in bounds))
+            sql = sql.filter(position < after if descending else position > after)
+        else:
+            # the bound on the first key alone keeps the range scan of the index
+            lowest, highest = bounds[0]
+            sql = sql.filter(keys[0] <= highest if descending else keys[0] >= lowest,
+                             _after(keys, bounds, descending))
+    else:
+        sql = sql.offset(skip)
+    return sql.order_by(*(desc(key) if descending else key for key in keys)).limit(limit)
+
+
+def next_cursor(rows: Sequence, limit: int, keys: Sequence) -> str | None:
+    """
+    The next_cursor function makes the cursor of the page after ``rows``.
+
+    :param rows: Sequence: Rows or objects of the page, with attributes named after the keys
+    :param limit: int: Page size
+    :param keys: Sequence: Columns of the sort key given to paginate
+    :return: The cursor, None when the page is not full and so the last one
+    """
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor([getattr(rows[-1], key.key) for key in keys])
+
+
+def set_next_cursor(response: Response, page: Page) -> None:
+    """
+    The set_next_cursor function passes the cursor of the next page in the response headers.
+
+    :param response: Response: Response of the list endpoint
+    :param page: Page: The page returned
+    """
+    if page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+from src.services.messages_templates import SERVICE_BUSY
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _timed_call(func, *args):
+    # time.monotonic() is system-wide on Linux, so it is comparable across worker processes
+    return time.monotonic(), func(*args)
+
+
+class PasswordPool:
+    """
+    Bounded executor for bcrypt work, so hashing never runs on the event loop.
+
+    At most ``workers + queue_size`` calls are accepted at once; further calls are
+    rejected with 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, kind: str = 'thread', workers: int = 4, queue_size: int = 64):
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor: Executor | None = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+        return self._executor
+
+    async def run(self, func, *args):
+        """
+        Runs ``func(*args)`` in the pool and records how long the call waited in the queue.
+
+        :param func: Module-level function (it has to be picklable for the process pool)
+        :param args: Positional arguments for ``func``
+        :return: The result of ``func``
+        :raises HTTPException: 503 when the pool and its queue are full
+        """
+        if self._pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=SERVICE_BUSY)
+        self._pending += 1
+        submitted = time.monotonic()
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(executor, _timed_call, func, *args)
+        except BrokenProcessPool:
+            # a worker process that died breaks the whole pool: the next call starts a new one
+            if self._executor is executor:
+                self._executor = None
+            executor.shutdown(wait=False)
+            raise
+        finally:
+            self._pending -= 1
+        wait = max(started - submitted, 0.0)
+        self.completed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": self.wait_total / self.completed * 1000 if self.completed else 0.0,
+            "queue_wait_max_ms": self.wait_max * 1000,
+        }
+
+    async def shutdown(self):
+        """
+        Waits for the calls in flight in a worker thread, so that the event loop keeps running meanwhile.
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True)
+
+
+password_pool = PasswordPool(settings.password_pool_kind, settings.password_pool_workers,
+                             settings.password_pool_queue_size)
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Protocol
+
+from fastapi.encoders import jsonable_encoder
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+# called by a broker with every message published in any worker
+Deliver = Callable[[int, str], None]
+
+
+class PostEventBroker(Protocol):
+    """
+    Carries the events of posts from the worker that publishes them to the hubs of every worker.
+    """
+
+    name: str
+
+    async def start(self, deliver: Deliver) -> None:
+        """
+        Starts passing the messages published from now on to ``deliver``.
+
+        :param deliver: Callback of the hub of this worker, with the post id and the message
+        """
+
+    async def publish(self, post_id: int, message: str) -> None:
+        """
+        Sends a message to the hubs of all workers, this one included.
+
+        :param post_id: Id of the post the message is about
+        :param message: The event encoded as JSON
+        """
+
+    async def close(self) -> None:
+        """
+        Stops the delivery and releases the connections of the broker.
+        """
+
+
+class LocalBroker:
+    """
+    Delivers the events to the hub of this process only: enough for a single worker, and for tests.
+    """
+
+    name = 'local'
+
+    def __init__(self):
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, post_id: int, message: str) -> None:
+        if self._deliver is not None:
+            self._deliver(post_id, message)
+
+    async def close(self) -> None:
+        self._deliver = None
+
+
+class RedisBroker:
+    """
+    Fans the events out to every worker through one Redis pub/sub channel. Every worker receives the events
+    of all posts and its hub passes on those of the posts its clients follow.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str, channel: str = 'post_events'):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        # imported here: only the workers of a multi-worker deployment need redis
+        from redis import asyncio as redis
+
+        # the client connects on first use: publications can go out while the subscription is set up
+        self._redis = redis.from_url(self.url, decode_responses=True)
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub, deliver))
+
+    async def _listen(self, pubsub, deliver: Deliver):
+        try:
+            async for item in pubsub.listen():
+                post_id, _, message = item["data"].partition(' ')
+                deliver(int(post_id), message)
+        finally:
+            await pubsub.close()
+
+    async def publish(self, post_id: int, message: str) -> None:
+        await self._redis.publish(self.channel, f"{post_id} {message}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+class Subscription:
+    """
+    Events of one post for one client, in a queue of at most ``maxsize`` events. A client that reads slower
+    than the events come loses the oldest ones instead of holding memory or the publishers: ``take_dropped``
+    tells it how many, so that it can read the lists again.
+    """
+
+    def __init__(self, post_id: int, maxsize: int):
+        self.post_id = post_id
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self._reported = 0
+
+    def put(self, frame: str) -> bool:
+        """
+        Queues an event, dropping the oldest one when the queue is full.
+
+        :param frame: The event, as sent to the client
+        :return: False when an event was dropped
+        """
+        dropped = self.queue.full()
+        if dropped:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+        return not dropped
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+    def take_dropped(self) -> int:
+        """
+        :return: Number of events dropped since the last call
+        """
+        dropped, self._reported = self.dropped - self._reported, self.dropped
+        return dropped
+
+
+class PostEventHub:
+    """
+    In-process publish/subscribe of the comment and rate events of posts, fed to the event streams
+    of the clients. Events published in any worker reach the clients of every worker through the broker.
+
+    Publishing never fails the write that publishes: the events are a notification, the lists stay the
+    source of truth. A subscription lives in the worker that serves its client and is only touched from
+    the event loop.
+    """
+
+    def __init__(self, broker: PostEventBroker | None = None, queue_size: int = 100):
+        self.broker = broker if broker is not None else LocalBroker()
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self._started = False
+        self.published = 0
+        self.publish_errors = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self):
+        """
+        Starts the broker, once; called by the first subscription or publication.
+        """
+        if self._started:
+            return
+        self._started = True
+        try:
+            await self.broker.start(self.deliver)
+        except BaseException:
+            self._started = False
+            raise
+
+    async def subscribe(self, post_id: int) -> Subscription:
+        """
+        Follows the events of a post.
+
+        :param post_id: Id of the post
+        :return: The subscription, to be given back to unsubscribe
+        """
+        await self.start()
+        subscription = Subscription(post_id, self.queue_size)
+        self._subscriptions[post_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.post_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.post_id]
+
+    async def publish(self, post_id: int, event_type: str, data: Any):
+        """
+        Publishes an event of a post to the clients that follow it in every worker.
+
+        :param post_id: Id of the post
+        :param event_type: Type of the event, as comment_created or rate_set
+        :param data: Payload of the event, a model or anything else jsonable_encoder encodes
+        """
+        message = json.dumps({"type": event_type, "post_id": post_id, "data": jsonable_encoder(data)},
+                             separators=(',', ':'))
+        try:
+            await self.start()
+            await self.broker.publish(post_id, message)
+        except Exception:
+            self.publish_errors += 1
+            logger.warning("publishing %s of post %d failed", event_type, post_id, exc_info=True)
+            return
+        self.published += 1
+
+    def deliver(self, post_id: int, message: str):
+        """
+        Queues a message from the broker for the subscriptions of its post.
+
+        :param post_id: Id of the post
+        :param message: The event encoded as JSON
+        """
+        subscriptions = self._subscriptions.get(post_id)
+        if not subscriptions:
+            return
+        # server-sent event frame, built once for all the clients
+        frame = f"data: {message}\n\n"
+        for subscription in subscriptions:
+            if subscription.put(frame):
+                self.delivered += 1
+            else:
+                self.dropped += 1
+
+    async def shutdown(self):
+        if self._started:
+            self._started = False
+            await self.broker.close()
+
+    def stats(self) -> dict:
+        return {
+            "broker": self.broker.name,
+            "posts": len(self._subscriptions),
+            "subscriptions": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            "published": self.published,
+            "publish_errors": self.publish_errors,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+def get_post_event_broker(name: str = settings.post_events_broker) -> PostEventBroker:
+    """
+    Creates the broker selected in the settings.
+
+    :param name: 'local' or 'redis'
+    :return: The broker
+    """
+    if name == LocalBroker.name:
+        return LocalBroker()
+    if name == RedisBroker.name:
+        return RedisBroker(settings.post_events_redis_url)
+    raise ValueError(f"Unknown post events broker: {name}")
+
+
+post_events = PostEventHub(get_post_event_broker(), queue_size=settings.post_events_queue_size)
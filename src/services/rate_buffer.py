@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.repository import rates as repository_rates
+
+logger = logging.getLogger(__name__)
+
+
+class RateBuffer:
+    """
+    Write-behind buffer of rates: collects them in memory, keeps only the last rate of a user for a
+    post, and writes them with multi-row upserts of at most ``max_size`` rates every ``interval`` seconds
+    or as soon as ``max_size`` rates are waiting.
+
+    Rates are per worker process and not durable until flushed: ``shutdown`` flushes what is left,
+    a crash loses at most one interval of rates. A failed flush keeps its rates for the next one, but
+    at most ``max_pending`` rates are held: while the database is unreachable the buffer fills up and
+    ``add`` refuses further rates, which the caller then writes itself.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = SessionLocal, interval: float = 0.5,
+                 max_size: int = 500, max_pending: int = 10000, enabled: bool = True):
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_size = max_size
+        self.max_pending = max_pending
+        self.pending: dict[tuple[int, int], int] = {}
+        # rates taken out of pending by the flush in progress, put back if it fails
+        self._flushing = 0
+        self._overflowing = False
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.added = 0
+        self.collapsed = 0
+        self.overflowed = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.written = 0
+        self.failed_flushes = 0
+        self.consecutive_failures = 0
+        self.batch_max = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+
+    def add(self, photo_id: int, user_id: int, rate: int) -> bool:
+        """
+        Buffers a rate, replacing a buffered rate of the same user for the same post.
+
+        :param photo_id: Id of the rated post
+        :param user_id: Id of the rating user
+        :param rate: The rate
+        :return: False when the buffer is full and the rate was not buffered
+        """
+        key = (photo_id, user_id)
+        if key in self.pending:
+            self.collapsed += 1
+        elif len(self.pending) + self._flushing >= self.max_pending:
+            if not self._overflowing:
+                self._overflowing = True
+                logger.error("rate buffer is full with %d rates after %d failed flushes, writing rates directly",
+                             self.max_pending, self.consecutive_failures)
+            self.overflowed += 1
+            return False
+        self.pending[key] = rate
+        self.added += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self.pending) >= self.max_size:
+            self._full.set()
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Writes the buffered rates, ``max_size`` at a time, each chunk in its own transaction.
+
+        :return: Number of rates written, also by the chunks committed before a failure
+        """
+        async with self._lock:
+            if not self.pending:
+                return 0
+            rates = [(*key, rate) for key, rate in self.pending.items()]
+            self.pending = {}
+            self._flushing = len(rates)
+            started = time.perf_counter()
+            written = done = 0
+            try:
+                async with self.session_factory() as db:
+                    # at most max_size rates per statement, a pending backlog would exceed the bind parameter limit
+                    for start in range(0, len(rates), self.max_size):
+                        chunk = rates[start:start + self.max_size]
+                        written += await repository_rates.set_rates(chunk, db)
+                        done += len(chunk)
+                        self._flushing = len(rates) - done
+            except BaseException as error:
+                # committed chunks stay written; the upsert is idempotent, writing the others again is safe
+                for photo_id, user_id, rate in rates[done:]:
+                    self.pending.setdefault((photo_id, user_id), rate)
+                self.flushed += done
+                self.written += written
+                if not isinstance(error, Exception):
+                    raise
+                logger.warning("flush of %d rates failed", len(rates) - done, exc_info=True)
+                self.failed_flushes += 1
+                self.consecutive_failures += 1
+                return written
+            finally:
+                self._flushing = 0
+            self.consecutive_failures = 0
+            self._overflowing = False
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.flushed += len(rates)
+            self.written += written
+            self.batch_max = max(self.batch_max, len(rates))
+            self.flush_time_total += elapsed
+            self.flush_time_max = max(self.flush_time_max, elapsed)
+            return written
+
+    async def shutdown(self):
+        """
+        Stops the periodic flush and writes the rates that are still buffered.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "buffered": len(self.pending),
+            "added": self.added,
+            "collapsed": self.collapsed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "consecutive_failures": self.consecutive_failures,
+            # rates written directly because the buffer was full
+            "overflowed": self.overflowed,
+            # rates of missing or own posts are flushed but not written
+            "flushed": self.flushed,
+            "written": self.written,
+            "batch_size_avg": self.flushed / self.flushes if self.flushes else 0.0,
+            "batch_size_max": self.batch_max,
+            "flush_avg_ms": self.flush_time_total / self.flushes * 1000 if self.flushes else 0.0,
+            "flush_max_ms": self.flush_time_max * 1000,
+        }
+
+
+rate_buffer = RateBuffer(interval=settings.rate_flush_interval, max_size=settings.rate_flush_size,
+                         max_pending=settings.rate_buffer_max_pending, enabled=settings.rate_write_behind)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.database.models import UploadStatus
+from src.repository import posts as repository_posts
+from src.services.cloudynary import public_id_for, upload_image
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteUploader:
+    """
+    Uploads the photos of new posts to Cloudinary once, in the background, and records the result.
+
+    The upload call blocks on network I/O, so it runs in a worker thread. Failed attempts are
+    retried with exponential backoff; a photo another post already uploaded is not sent again.
+    Every read and write of the upload state opens a short session of its own, so no connection
+    of the pool is held during an upload or a backoff sleep.
+    """
+
+    def __init__(self, upload: Callable[[str, str], str] = upload_image, max_attempts: int = 5,
+                 backoff: float = 1.0, session_factory: Callable[[], AsyncSession] = SessionLocal):
+        self.upload = upload
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.session_factory = session_factory
+        self.uploaded = 0
+        self.reused = 0
+        self.retries = 0
+        self.failed = 0
+
+    async def _set_upload_state(self, post_id: int, upload_status: UploadStatus, attempts: int,
+                                public_id: str | None = None):
+        async with self.session_factory() as db:
+            await repository_posts.set_upload_state(post_id, upload_status, attempts, db, public_id)
+
+    async def upload_post(self, post_id: int, photo_url: str) -> str | None:
+        """
+        Uploads the photo of a post, unless it is already uploaded, and stores its public_id.
+
+        :param post_id: Id of the post
+        :param photo_url: Path of the post's photo
+        :return: The public_id, or None when every attempt failed
+        """
+        async with self.session_factory() as db:
+            public_id = await repository_posts.get_uploaded_public_id(photo_url, db)
+        if public_id is not None:
+            self.reused += 1
+            await self._set_upload_state(post_id, UploadStatus.uploaded, 0, public_id)
+            return public_id
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                public_id = await asyncio.to_thread(self.upload, photo_url, public_id_for(photo_url))
+            except Exception:
+                logger.warning("upload of post %s failed (attempt %d of %d)", post_id, attempt, self.max_attempts,
+                               exc_info=True)
+                if attempt == self.max_attempts:
+                    break
+                self.retries += 1
+                await self._set_upload_state(post_id, UploadStatus.pending, attempt)
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            else:
+                self.uploaded += 1
+                await self._set_upload_state(post_id, UploadStatus.uploaded, attempt, public_id)
+                return public_id
+        self.failed += 1
+        await self._set_upload_state(post_id, UploadStatus.failed, self.max_attempts)
+        return None
+
+    async def upload_pending(self, limit: int = 100) -> int:
+        """
+        Uploads the photos of posts that are not uploaded yet, e.g. after a restart or a failed upload.
+
+        :param limit: Maximum number of posts
+        :return: Number of posts that are uploaded now
+        """
+        async with self.session_factory() as db:
+            posts = await repository_posts.get_posts_to_upload(db, limit)
+        done = 0
+        for post_id, photo_url in posts:
+            if await self.upload_post(post_id, photo_url) is not None:
+                done += 1
+        return done
+
+    def stats(self) -> dict:
+        return {
+            "uploaded": self.uploaded,
+            "reused": self.reused,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+
+remote_uploader = RemoteUploader(max_attempts=settings.remote_upload_attempts, backoff=settings.remote_upload_backoff)
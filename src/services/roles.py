@@ -1,17 +1,28 @@
 from typing import List
 from fastapi import Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, UserRole
+from src.database.connect import get_db
+from src.database.models import UserRole
 from src.services.auth import auth_service
 from src.services.messages_templates import FORBIDDEN_ACCESS
 
 
 class RoleChecker:
-    def __init__(self, allowed_roles: List[UserRole]):
+    def __init__(self, allowed_roles: List[UserRole], from_token: bool = True):
+        """
+        :param allowed_roles: List[UserRole]: Names of the roles that may pass
+        :param from_token: bool: Authorize from the access token claims and only load the user
+            when the token version is stale; False always loads the user row
+        """
         self.allowed_roles = allowed_roles
+        self.from_token = from_token
 
-    def __call__(self, user: User = Depends(auth_service.get_current_user)):
-        print(user.user_role)
-        print(self.allowed_roles)
-        if user.user_role not in self.allowed_roles:
+    async def __call__(self, token: str = Depends(auth_service.oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        if self.from_token:
+            user = await auth_service.get_token_user(token, db)
+        else:
+            user = await auth_service.get_current_user(token, db)
+        if not user.is_active or user.user_role not in self.allowed_roles:
             raise HTTPException(status_code=403, detail=FORBIDDEN_ACCESS)
+        return user
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import pathlib
+import shutil
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+from src.database.models import Post, UploadStatus
+from src.schemas_transform_posts import TransformImageModel
+from src.services.cloudynary import get_transformed_url
+from src.services.local_transform import TransformTooLarge, render_transformation, unsupported_operations
+from src.services.messages_templates import NOT_FOUND, TRANSFORM_NOT_SUPPORTED, TRANSFORM_TOO_LARGE, \
+    IMAGE_NOT_UPLOADED
+from src.services.remote_uploads import RemoteUploader, remote_uploader
+from src.services.transform_cache import TransformCache
+from src.services.transform_posts import create_list_transformation, transform_hash
+
+logger = logging.getLogger(__name__)
+
+
+class CloudinaryTransformBackend:
+    """
+    Builds a Cloudinary URL that applies the transformation when it is first requested.
+
+    Photos are uploaded once, in the background, when the post is created; building a URL
+    does no network I/O.
+    """
+
+    name = 'cloudinary'
+
+    def __init__(self, uploader: RemoteUploader = remote_uploader):
+        self.uploader = uploader
+
+    async def publish(self, post_id: int, photo_url: str):
+        """
+        Uploads the photo of a new post. Runs as a background task after the response, so the
+        uploader opens sessions of its own.
+
+        :param post_id: Id of the post
+        :param photo_url: Path of the post's photo
+        """
+        await self.uploader.upload_post(post_id, photo_url)
+
+    async def transform(self, post: Post, body: TransformImageModel) -> str:
+        """
+        Returns the URL of the transformed image.
+
+        :param post: Post with the original image
+        :param body: Requested transformation
+        :return: URL of the transformed image
+        :raises HTTPException: 409 while the photo is not uploaded
+        """
+        if post.upload_status != UploadStatus.uploaded.value or not post.remote_public_id:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=IMAGE_NOT_UPLOADED)
+        return get_transformed_url(post.remote_public_id, create_list_transformation(body))
+
+    async def keep(self, url: str) -> str:
+        """
+        Makes a transformed image permanent before it is saved. Cloudinary keeps derived images itself.
+
+        :param url: URL returned by transform
+        :return: URL to save
+        """
+        return url
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "uploads": self.uploader.stats()}
+
+    async def shutdown(self):
+        pass
+
+
+def _timed_transform(source_path: str, transformation: dict, output_path: str):
+    started = time.perf_counter()
+    path = render_transformation(source_path, transformation, output_path)
+    return time.perf_counter() - started, path
+
+
+def _link_or_copy(source: str, target: str):
+    pathlib.Path(target).parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class LocalTransformBackend:
+    """
+    Renders transformations with Pillow in a process pool and writes them into the media directory.
+
+    Rendering is CPU-bound, so it never runs on the event loop. Latency does not depend on a
+    remote service, and processing time per transformation is counted like for derivatives.
+    Renderings are cached on disk, and concurrent requests for the same one share a single render.
+    """
+
+    name = 'local'
+
+    def __init__(self, output_dir: str = os.path.join(settings.media_dir, 'transforms'), workers: int = 2,
+                 cache_max_bytes: int = 512 * 1024 * 1024):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.cache = TransformCache(os.path.join(output_dir, 'cache'), cache_max_bytes)
+        self._executor: Executor | None = None
+        self._rendering: dict[str, asyncio.Future] = {}
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def publish(self, post_id: int, photo_url: str):
+        """
+        Nothing to do, the photo is rendered from the media directory.
+        """
+
+    async def transform(self, post: Post, body: TransformImageModel) -> str:
+        """
+        Returns the rendering of a transformation of a locally stored image, from the cache if possible.
+
+        :param post: Post with the original image in the media directory
+        :param body: Requested transformation
+        :return: Path of the rendered image
+        :raises HTTPException: 404 when the original is missing, 422 when an operation is not supported locally
+            or the output would be larger than the transform_max_pixels setting
+        """
+        image_url = post.photo_url
+        unsupported = unsupported_operations(body)
+        if unsupported:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=TRANSFORM_NOT_SUPPORTED.format(', '.join(unsupported)))
+        # the key covers what is rendered: create_list_transformation drops zero values, which
+        # blur_effect does not treat as missing ones
+        key = self.cache.key_for(image_url, transform_hash(body.dict()))
+        path = await self.cache.get(key)
+        if path is not None:
+            return path
+        rendering = self._rendering.get(key)
+        if rendering is None:
+            if not os.path.isfile(image_url):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+            rendering = asyncio.ensure_future(self._render(image_url, body, key))
+            self._rendering[key] = rendering
+            rendering.add_done_callback(lambda _: self._rendering.pop(key, None))
+        # a client that disconnects must not cancel the render the other waiters share
+        return await asyncio.shield(rendering)
+
+    def _drop_broken_executor(self, executor: Executor):
+        # a worker that died (e.g. killed for memory) breaks the whole pool: the next render starts a new one
+        if self._executor is executor:
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    async def _render(self, image_url: str, body: TransformImageModel, key: str) -> str:
+        self._pending += 1
+        executor = self._get_executor()
+        try:
+            base_path = await self.cache.base_path(key)
+            loop = asyncio.get_running_loop()
+            elapsed, path = await loop.run_in_executor(executor, _timed_transform, image_url, body.dict(), base_path)
+        except TransformTooLarge as error:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=TRANSFORM_TOO_LARGE.format(error.max_pixels))
+        except BrokenProcessPool:
+            self.failed += 1
+            self._drop_broken_executor(executor)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        self.completed += 1
+        self.time_total += elapsed
+        self.time_max = max(self.time_max, elapsed)
+        await self.cache.add(key, path)
+        logger.info("rendered transformation of %s in %.1f ms", image_url, elapsed * 1000)
+        return path
+
+    async def keep(self, url: str) -> str:
+        """
+        Links a cached rendering out of the cache before it is saved, so eviction cannot remove it.
+
+        :param url: Path returned by transform
+        :return: Path to save
+        """
+        if not self.cache.holds(url) or not os.path.isfile(url):
+            return url
+        target = os.path.join(self.output_dir, 'saved', os.path.basename(url))
+        await asyncio.to_thread(_link_or_copy, url, target)
+        return target
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "processing_avg_ms": self.time_total / self.completed * 1000 if self.completed else 0.0,
+            "processing_max_ms": self.time_max * 1000,
+            "cache": self.cache.stats(),
+        }
+
+    async def shutdown(self):
+        """
+        Waits for the renders in flight in a worker thread, so that the event loop keeps running meanwhile.
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True)
+
+
+def get_transform_backend(name: str = settings.transform_backend):
+    """
+    Creates the transform backend selected in the settings.
+
+    :param name: 'cloudinary' or 'local'
+    :return: The backend
+    """
+    if name == LocalTransformBackend.name:
+        return LocalTransformBackend(workers=settings.transform_workers,
+                                     cache_max_bytes=settings.transform_cache_max_bytes)
+    if name == CloudinaryTransformBackend.name:
+        return CloudinaryTransformBackend()
+    raise ValueError(f"Unknown transform backend: {name}")
+
+
+transform_backend = get_transform_backend()
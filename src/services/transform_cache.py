@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import os
+import pathlib
+from collections import OrderedDict
+
+
+class TransformCache:
+    """
+    Rendered transformations on disk, keyed by source image and canonical transformation hash.
+
+    Files are named after their key, so the index is rebuilt from the directory after a restart
+    (oldest modification first). When the files take more than ``max_bytes``, the least recently
+    used ones are deleted. The index is per process, like the other in-process caches. Disk access runs in a
+    worker thread, and the index is only changed between awaits, so it stays consistent for the event loop.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: OrderedDict[str, tuple[str, int]] | None = None
+        self._loading = asyncio.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    @staticmethod
+    def key_for(source: str, transform_hash: str) -> str:
+        """
+        Builds the cache key of a transformation of an image.
+
+        :param source: Path of the original image
+        :param transform_hash: Hash of the canonical transformation list
+        :return: Hex digest naming the rendered file
+        """
+        return hashlib.sha256(f"{source}\0{transform_hash}".encode()).hexdigest()
+
+    def _scan(self) -> list[tuple[str, str, int]]:
+        pathlib.Path(self.root).mkdir(parents=True, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, entry.path, stat.st_size))
+        files.sort()
+        return [(name.split('.')[0], path, size) for _, name, path, size in files]
+
+    async def _load(self) -> OrderedDict[str, tuple[str, int]]:
+        if self._index is None:
+            async with self._loading:
+                if self._index is None:
+                    files = await asyncio.to_thread(self._scan)
+                    index = OrderedDict()
+                    for key, path, size in files:
+                        index[key] = (path, size)
+                        self._bytes += size
+                    self._index = index
+        return self._index
+
+    async def base_path(self, key: str) -> str:
+        """
+        Returns where the file of a key is rendered, without extension.
+
+        :param key: Cache key
+        :return: Path without extension
+        """
+        await self._load()
+        return os.path.join(self.root, key)
+
+    async def get(self, key: str) -> str | None:
+        """
+        Looks up a rendered transformation and marks it as recently used.
+
+        :param key: Cache key
+        :return: Path of the rendered file, or None on a miss
+        """
+        index = await self._load()
+        entry = index.get(key)
+        if entry is not None and not await asyncio.to_thread(os.path.exists, entry[0]):
+            # removed from disk behind our back; the entry may have changed while the thread ran
+            if index.get(key) == entry:
+                del index[key]
+                self._bytes -= entry[1]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        index.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    async def add(self, key: str, path: str):
+        """
+        Records a rendered file and evicts the least recently used ones above the size budget.
+
+        :param key: Cache key
+        :param path: Path of the rendered file
+        """
+        index = await self._load()
+        size = await asyncio.to_thread(os.path.getsize, path)
+        previous = index.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        index[key] = (path, size)
+        self._bytes += size
+        # the newest file stays even if it is larger than the whole budget, its URL was just handed out
+        evicted = []
+        while self._bytes > self.max_bytes and len(index) > 1:
+            _, (old_path, old_size) = index.popitem(last=False)
+            evicted.append(old_path)
+            self._bytes -= old_size
+            self.evictions += 1
+            self.evicted_bytes += old_size
+        if evicted:
+            await asyncio.to_thread(_unlink_all, evicted)
+
+    def holds(self, path: str) -> bool:
+        """
+        Tells whether a file lives in the cache directory and may therefore be evicted.
+
+        :param path: Path of a file
+        :return: True for a cached rendering
+        """
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.root)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._index or ()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _unlink_all(paths: list[str]):
+    for path in paths:
+        pathlib.Path(path).unlink(missing_ok=True)
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import List
 
 from src.schemas_transform_posts import TransformImageModel
@@ -63,3 +65,16 @@ def create_list_transformation(body: TransformImageModel) -> List[dict]:
                         transform_item[key] = t_dict[key]
             transform_list.append(transform_item)
     return transform_list
+
+
+def transform_hash(transformation: List[dict] | dict) -> str:
+    """
+    The transform_hash function returns a stable hash of a transformation: a list made by create_list_transformation,
+    or the dict of a TransformImageModel as it is rendered. The order of lists is kept, since transformations are
+    applied one after another, but the keys of every dict are sorted, so equal transformations always hash the same.
+
+    :param transformation: List[dict] | dict: Transformation list from create_list_transformation, or body.dict()
+    :return: A hex digest identifying the transformation
+    """
+    canonical = json.dumps(transformation, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
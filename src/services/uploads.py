@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import os
+import pathlib
+import tempfile
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile, status
+
+from src.conf.config import settings
+from src.services.messages_templates import FILE_TOO_LARGE, NOT_AN_IMAGE
+
+CHUNK_SIZE = 1024 * 1024
+
+# leading bytes of the image formats we accept -> extension of the stored file
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'BM', '.bmp'),
+)
+
+
+@dataclass
+class StoredUpload:
+    path: str  # staged file, to be moved with media_store.place() or removed with media_store.discard()
+    sha256: str
+    size: int
+    extension: str
+
+
+def sniff_image_extension(head: bytes) -> str | None:
+    """
+    Detects the image format from the first bytes of a file.
+
+    :param head: At least the first 12 bytes of the file
+    :return: Extension of the detected format, or None if the bytes are not a supported image
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def _write_chunk(file, digest, chunk: bytes):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+async def save_upload(upload: UploadFile, media_dir: str = settings.media_dir,
+                      max_size: int = settings.upload_max_size) -> StoredUpload:
+    """
+    Streams an uploaded image into a staged file in ``media_dir`` in fixed-size chunks.
+
+    The SHA-256 is computed while the data is written. The staged file is only returned once
+    the whole upload has been accepted, and it lives in the media file system so it can be
+    renamed to its content address atomically. Disk writes run in a worker thread, off the event loop.
+
+    :param upload: The uploaded file
+    :param media_dir: Directory the file is staged in
+    :param max_size: Maximum accepted size in bytes
+    :return: Path, SHA-256 hex digest, size and extension of the staged file
+    :raises HTTPException: 413 when the file is larger than ``max_size``, 415 when it is not an image
+    """
+    # the multipart parser already knows the size, so an oversized file is rejected before any copying
+    if upload.size is not None and upload.size > max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=FILE_TOO_LARGE)
+    pathlib.Path(media_dir).mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=media_dir, prefix='.upload-')
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            while chunk := await upload.read(CHUNK_SIZE):
+                if extension is None:
+                    extension = sniff_image_extension(chunk)
+                    if extension is None:
+                        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                            detail=NOT_AN_IMAGE)
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail=FILE_TOO_LARGE)
+                await asyncio.to_thread(_write_chunk, file, digest, chunk)
+        if extension is None:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=NOT_AN_IMAGE)
+    except BaseException:
+        pathlib.Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return StoredUpload(path=tmp_path, sha256=digest.hexdigest(), size=size, extension=extension)
@@ -1,3 +1,4 @@
 URL_TO_HEALTHCHECKER = "/api/healthchecker"
 URL_SIGNUP = "/api/auth/signup"
 URL_LOGIN = "/api/auth/login"
+URL_LOGOUT = "/api/auth/logout"
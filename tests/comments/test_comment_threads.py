@@ -0,0 +1,132 @@
+import pytest
+from sqlalchemy import select
+
+from src.database.models import Comment, Post, User
+from src.repository import comments as rep_comments
+from src.schemas import CommentModel
+from src.services.pagination import decode_cursor
+
+
+@pytest.fixture()
+def author(session):
+    user = session.query(User).filter(User.email == 'threader@example.com').first()
+    if user is None:
+        user = User(email='threader@example.com', username='threader', password='secret',
+                    first_name='Thread', last_name='Er')
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.fixture()
+def make_thread(author, session):
+    def make_thread() -> tuple[int, dict]:
+        """
+        A post with the comments a, b and the replies a1, a2 to a, a1x to a1 and b1 to b,
+        written in the order a, b, a1, b1, a2, a1x.
+        """
+        post = Post(photo_url='media/thread.jpg', description='Threads', user_id=author.id)
+        session.add(post)
+        session.commit()
+        ids = {}
+        for name, parent in (('a', None), ('b', None), ('a1', 'a'), ('b1', 'b'), ('a2', 'a'), ('a1x', 'a1')):
+            comment = Comment(comment_text=name, post_id=post.id, user_id=author.id, parent_id=ids.get(parent))
+            session.add(comment)
+            session.commit()
+            ids[name] = comment.id
+        return post.id, ids
+    return make_thread
+
+
+def texts(rows) -> list:
+    return [row.comment_text for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_replies_keep_paths_and_counts(make_thread, async_session):
+    post_id, ids = make_thread()
+
+    comments = {comment.comment_text: comment for comment in
+                (await async_session.scalars(select(Comment).filter_by(post_id=post_id)
+                                             .execution_options(populate_existing=True))).all()}
+
+    assert comments['a1x'].parent_id == ids['a1']
+    assert comments['a1x'].path == f"{ids['a']:010d}{ids['a1']:010d}{ids['a1x']:010d}"
+    assert [comments[name].depth for name in ('a', 'a1', 'a1x')] == [0, 1, 2]
+    assert {name: comment.reply_count for name, comment in comments.items()} == \
+        {'a': 2, 'b': 1, 'a1': 1, 'b1': 0, 'a2': 0, 'a1x': 0}
+
+
+@pytest.mark.asyncio
+async def test_create_reply(make_thread, author, async_session):
+    post_id, ids = make_thread()
+    other_post_id, _ = make_thread()
+
+    reply = await rep_comments.create_comment(CommentModel(comment_text='a3'), post_id, async_session, author,
+                                              ids['a'])
+
+    assert (reply.parent_id, reply.depth) == (ids['a'], 1)
+    assert reply.path == f"{ids['a']:010d}{reply.id:010d}"
+    assert await async_session.scalar(select(Comment.reply_count).filter_by(id=ids['a'])) == 3
+    assert await rep_comments.create_comment(CommentModel(comment_text='lost'), other_post_id, async_session,
+                                             author, ids['a']) is None
+
+
+@pytest.mark.asyncio
+async def test_thread_and_subtree_in_one_query(make_thread, async_session, max_queries):
+    post_id, ids = make_thread()
+
+    with max_queries(1):
+        thread = await rep_comments.get_thread(0, 100, async_session, post_id)
+    with max_queries(1):
+        subtree = await rep_comments.get_thread(0, 100, async_session, post_id, ids['a1'])
+
+    assert texts(thread) == ['a', 'a1', 'a1x', 'a2', 'b', 'b1']
+    assert [row.depth for row in thread] == [0, 1, 2, 1, 0, 1]
+    assert thread[0].username == 'threader'
+    assert texts(subtree) == ['a1', 'a1x']
+    assert await rep_comments.get_thread(0, 100, async_session, post_id + 1, ids['a1']) == []
+
+
+@pytest.mark.asyncio
+async def test_thread_pages_follow_cursor(make_thread, async_session):
+    post_id, _ = make_thread()
+
+    names, cursor = [], None
+    for _ in range(100):
+        page = await rep_comments.get_thread(0, 4, async_session, post_id, cursor=cursor)
+        names.extend(texts(page))
+        if page.next_cursor is None:
+            break
+        cursor = decode_cursor(page.next_cursor)
+    else:
+        pytest.fail("the cursor does not move forward")
+
+    assert names == ['a', 'a1', 'a1x', 'a2', 'b', 'b1']
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_subtree(make_thread, async_session):
+    post_id, ids = make_thread()
+
+    await rep_comments.delete_comments(ids['a1'], async_session)
+
+    assert texts(await rep_comments.get_thread(0, 100, async_session, post_id)) == ['a', 'a2', 'b', 'b1']
+    assert await async_session.scalar(select(Comment.reply_count).filter_by(id=ids['a'])) == 1
+    assert await async_session.scalar(select(Post.comment_count).filter_by(id=post_id)) == 4
+
+
+def test_thread_routes(client, make_thread):
+    post_id, ids = make_thread()
+
+    response = client.get(f"/api/{post_id}/comments/thread")
+    assert response.status_code == 200, response.text
+    assert [(item["comment"]["comment_text"], item["comment"]["depth"]) for item in response.json()] == \
+        [('a', 0), ('a1', 1), ('a1x', 2), ('a2', 1), ('b', 0), ('b1', 1)]
+
+    response = client.get(f"/api/{post_id}/comments/{ids['b']}/thread")
+    assert response.status_code == 200, response.text
+    assert [item["comment"]["comment_text"] for item in response.json()] == ['b', 'b1']
+    assert response.json()[0]["comment"]["reply_count"] == 1
+
+    assert client.get(f"/api/{post_id}/comments/{ids['b'] + 1000}/thread").status_code == 404
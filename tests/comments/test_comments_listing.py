@@ -0,0 +1,50 @@
+import pytest
+
+from src.database.models import Comment, Post, User
+from src.repository.comments import get_comments_with_users
+
+
+@pytest.fixture()
+def commented_post(session):
+    authors = []
+    for index in range(3):
+        user = session.query(User).filter(User.email == f'commenter{index}@example.com').first()
+        if user is None:
+            user = User(email=f'commenter{index}@example.com', username=f'commenter{index}', password='secret',
+                        first_name=f'First{index}', last_name=f'Last{index}')
+            session.add(user)
+            session.commit()
+        authors.append(user)
+    post = Post(photo_url='media/commented.jpg', description='Talk about it', user_id=authors[0].id)
+    session.add(post)
+    session.commit()
+    session.add_all([Comment(comment_text=f'Comment {index}', post_id=post.id, user_id=authors[index % 3].id)
+                     for index in range(30)])
+    session.commit()
+    return post.id
+
+
+@pytest.mark.asyncio
+async def test_comments_with_users_in_one_query(commented_post, async_session, max_queries):
+    with max_queries(1):
+        rows = await get_comments_with_users(0, 100, async_session, commented_post)
+
+    assert len(rows) == 30
+    assert [(row.comment_text, row.username, row.user_first_name, row.user_last_name) for row in rows[:4]] == [
+        ('Comment 0', 'commenter0', 'First0', 'Last0'), ('Comment 1', 'commenter1', 'First1', 'Last1'),
+        ('Comment 2', 'commenter2', 'First2', 'Last2'), ('Comment 3', 'commenter0', 'First0', 'Last0')]
+
+
+@pytest.mark.parametrize('limit', [5, 30])
+def test_comments_route_query_count(limit, client, commented_post, max_queries):
+    with max_queries(1):
+        response = client.get(f"/api/{commented_post}/comments/", params={"limit": limit})
+
+    assert response.status_code == 200
+    comments = response.json()
+    assert len(comments) == limit
+    assert comments[1] == {"comment": {**comments[1]["comment"], "comment_text": "Comment 1"},
+                           "user_first_name": "First1", "user_last_name": "Last1", "username": "commenter1",
+                           "user_avatar": None}
+    assert set(comments[0]["comment"]) == {"id", "comment_text", "created_at", "updated_at", "user_id", "parent_id",
+                                           "reply_count", "depth"}
@@ -2,7 +2,7 @@ from datetime import datetime
 
 import unittest
 from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Comment, User
 from src.schemas import CommentModel
@@ -19,7 +19,7 @@ from src.repository.comments import (
 
 class TestComment(unittest.TestCase):
     def setUp(self):
-        self.db = MagicMock(spec=Session)
+        self.db = MagicMock(spec=AsyncSession)
         self.current_user = User(id=123)
         self.post = MagicMock()
         self.post.id = 1
@@ -39,72 +39,64 @@ class TestComment(unittest.TestCase):
 
     async def test_create_comment_invalid_post_id(self):
         body = CommentModel(comment_text="Hello, world!")
-        self.db.query.return_value.filter_by.return_value.first.return_value = None
+        self.db.scalar.return_value = None
 
         result = await create_comment(body, 999, self.db, self.current_user)
 
         self.assertIsNone(result)
-        self.db.query.return_value.filter_by.assert_called_once_with(id=999)
+        self.db.scalar.assert_awaited_once()
 
     async def test_get_comments_successful(self):
         skip = 0
         limit = 10
         comments = [Comment(), Comment(), Comment()]
-        self.db.query().filter_by().offset(skip).limit(limit).all = comments
+        self.db.scalars.return_value = MagicMock(**{"all.return_value": comments})
 
         result = await get_comments(skip, limit, self.db, self.post.id)
 
         self.assertEqual(result, comments)
-        self.db.query.return_value.filter_by.assert_called_once_with(post_id=self.post.id)
-        self.db.query.return_value.filter_by.return_value.offset.assert_called_once_with(skip)
-        self.db.query.return_value.filter_by.return_value.offset.return_value.limit.assert_called_once_with(limit)
-        self.db.query.return_value.filter_by.return_value.offset.return_value.limit.return_value.all.assert_called_once()
+        self.db.scalars.assert_awaited_once()
 
     async def test_get_user_by_comment_id_successful(self):
         user = User(id=1)
 
+        self.db.scalar.return_value = user
+
         result = await get_user_by_comment_id(self.db, user.id)
 
-        self.assertEqual(result, user.id)
-        self.db.query.return_value.filter_by.assert_called_once_with(id=user.id)
-        self.db.query.return_value.filter_by.return_value.first.assert_called_once()
+        self.assertEqual(result, user)
+        self.db.scalar.assert_awaited_once()
 
     async def test_get_user_by_comment_id_none(self):
         user = User(id=3232323)
 
-        self.db.query.return_value.filter_by.return_value.first.return_value = None
+        self.db.scalar.return_value = None
 
-        result = get_user_by_comment_id(self.db, user.id)
+        result = await get_user_by_comment_id(self.db, user.id)
 
         self.assertIsNone(result)
-        self.db.query.return_value.filter_by.assert_called_once_with(id=user.id)
-        self.db.query.return_value.filter_by.return_value.first.assert_called_once()
+        self.db.scalar.assert_awaited_once()
 
     async def test_get_comment(self):
         # create a mock database session and comment object
         comment = Comment(id=1, comment_text='test comment', post_id=1, user_id=1)
 
-        # mock the query method to return the comment object
-        self.db.query().filter_by().first.return_value = comment
+        # mock the scalar method to return the comment object
+        self.db.scalar.return_value = comment
 
         # call the get_comment function and assert that it returns the comment object
-        assert get_comment(self.db, 1) == comment
+        assert await get_comment(self.db, 1) == comment
 
-        # assert that the query method was called with the correct arguments
-        self.db.query.assert_called_once_with(Comment)
-        self.db.query().filter_by.assert_called_once_with(id=1)
-        self.db.query().filter_by().first.assert_called_once()
+        # assert that the scalar method was awaited once
+        self.db.scalar.assert_awaited_once()
 
     async def test_delete_comments(self):
         comment = Comment()
 
-        self.db.query().filter_by().first.return_value = comment
-
-        # Create a mock User object for testing
-        user = User(id=1)
+        self.db.scalar.return_value = comment
 
         # Call the function with the mock arguments
-        await delete_comments(1, user, self.db)
+        await delete_comments(1, self.db)
 
         # Check that the comment was deleted and committed to the database
         assert self.db.delete.called_with(comment)
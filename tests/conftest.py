@@ -1,11 +1,18 @@
+import contextlib
+
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
-from src.database.connect import get_db
+from src.database.connect import get_db, get_async_url
 from src.database.models import Base
+from src.repository.tags import tag_cache
+from src.services.cache import user_cache, token_version_cache, verified_token_cache, revoked_token_cache
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -14,11 +21,16 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(get_async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def session():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # the tables start empty, so must the tag cache
+    tag_cache.clear()
 
     db = TestingSessionLocal()
     try:
@@ -27,19 +39,63 @@ def session():
         db.close()
 
 
+@pytest_asyncio.fixture()
+async def async_session(session):
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 @pytest.fixture(scope="module")
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    for cache in (user_cache, token_version_cache, verified_token_cache, revoked_token_cache):
+        cache.clear()
 
     yield TestClient(app)
 
 
+@pytest.fixture()
+def query_counter():
+    """
+    Records the SQL statements the application sends through the async test engine.
+
+    :return: The list the statements are appended to
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture()
+def max_queries(query_counter):
+    """
+    Fails the test when the code in the block sends more than ``limit`` SQL statements
+    through the async test engine, e.g. a listing that lazy loads a relationship per row::
+
+        with max_queries(3):
+            await get_user_posts(user_id, db)
+
+    :return: The context manager
+    """
+    @contextlib.contextmanager
+    def max_queries(limit: int):
+        start = len(query_counter)
+        yield
+        issued = query_counter[start:]
+        assert len(issued) <= limit, \
+            f"{len(issued)} queries, at most {limit} expected:\n" + "\n".join(issued)
+    return max_queries
+
+
 @pytest.fixture(scope="module")
 def user():
     return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import src.repository.rates as rep_rate
+from src.database.models import Post, User, RatePost
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture()
+def raters(session):
+    users = []
+    for index in range(8):
+        email = f'rater{index}@example.com'
+        user = session.query(User).filter(User.email == email).first()
+        if user is None:
+            user = User(email=email, username=f'rater{index}', password='testtest', user_role='User')
+            session.add(user)
+            session.commit()
+        users.append(user)
+    return users
+
+
+@pytest.fixture()
+def make_post(raters, session):
+    def make_post() -> int:
+        post = Post(photo_url='media/rated.jpg', description='Rate me', user_id=raters[0].id)
+        session.add(post)
+        session.commit()
+        return post.id
+    return make_post
+
+
+async def aggregates(post_id: int) -> tuple:
+    async with TestingAsyncSessionLocal() as db:
+        post = await db.scalar(select(Post).filter(Post.id == post_id))
+        rates = (await db.scalars(select(RatePost.rate).filter(RatePost.photo_id == post_id))).all()
+    return (post.rate_sum, post.rate_count, post.rate_avg), (sum(rates), len(rates),
+                                                             sum(rates) / len(rates) if rates else 0.0)
+
+
+@pytest.mark.asyncio
+async def test_rate_aggregates_follow_rates(make_post, raters, async_session):
+    post_id = make_post()
+
+    await rep_rate.set_rate_for_image(post_id, 4, raters[1], async_session)
+    rate = await rep_rate.set_rate_for_image(post_id, 1, raters[2], async_session)
+    assert (await aggregates(post_id))[0] == (5, 2, 2.5)
+
+    await rep_rate.set_rate_for_image(post_id, 5, raters[2], async_session)
+    assert (await aggregates(post_id))[0] == (9, 2, 4.5)
+
+    await rep_rate.remove_rate_for_image(rate.id, raters[2], async_session)
+    assert (await aggregates(post_id))[0] == (4, 1, 4.0)
+
+
+@pytest.mark.asyncio
+async def test_rate_aggregates_under_concurrent_rating(make_post, raters):
+    post_id = make_post()
+
+    async def rate(user: User, first: int, second: int, remove: bool):
+        async with TestingAsyncSessionLocal() as db:
+            await rep_rate.set_rate_for_image(post_id, first, user, db)
+            created = await rep_rate.set_rate_for_image(post_id, second, user, db)
+            if remove:
+                await rep_rate.remove_rate_for_image(created.id, user, db)
+
+    await asyncio.gather(*(rate(user, index % 5 + 1, (index * 3) % 5 + 1, index % 3 == 0)
+                           for index, user in enumerate(raters[1:], 1)))
+
+    stored, actual = await aggregates(post_id)
+    assert stored == actual
+    assert stored[1] == 5
+
+
+@pytest.mark.asyncio
+async def test_rate_aggregates_follow_deletes_outside_repository(make_post, raters, session, async_session):
+    post_id = make_post()
+    for user, value in zip(raters[1:4], (2, 3, 5)):
+        await rep_rate.set_rate_for_image(post_id, value, user, async_session)
+
+    # as the cascade of a deleted user does
+    session.query(RatePost).filter(RatePost.photo_id == post_id, RatePost.rate == 5).delete()
+    session.commit()
+
+    stored, actual = await aggregates(post_id)
+    assert stored == actual == (5, 2, 2.5)
+
+
+@pytest.mark.asyncio
+async def test_same_user_rates_once(make_post, raters):
+    post_id = make_post()
+
+    async def rate(value: int):
+        async with TestingAsyncSessionLocal() as db:
+            return await rep_rate.set_rate_for_image(post_id, value, raters[1], db)
+
+    rates = await asyncio.gather(*(rate(value) for value in (1, 2, 3, 4, 5)))
+
+    assert len({rate.id for rate in rates}) == 1
+    stored, actual = await aggregates(post_id)
+    assert stored == actual
+    assert stored[1] == 1
+
+
+@pytest.mark.asyncio
+async def test_rebuild_rate_aggregates(make_post, raters, session, async_session):
+    post_id = make_post()
+    for user, value in zip(raters[1:4], (2, 3, 5)):
+        await rep_rate.set_rate_for_image(post_id, value, user, async_session)
+    # as a bulk load with the triggers dropped would leave them
+    session.query(Post).filter(Post.id == post_id).update({Post.rate_sum: 0, Post.rate_count: 0, Post.rate_avg: 0})
+    session.commit()
+
+    assert await rep_rate.rebuild_rate_aggregates(async_session) >= 1
+
+    stored, actual = await aggregates(post_id)
+    assert stored == actual == (10, 3, 10 / 3)
+    assert await rep_rate.rebuild_rate_aggregates(async_session) == 0
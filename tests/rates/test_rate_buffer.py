@@ -0,0 +1,205 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from src.database.models import Post, User, RatePost
+from src.repository import rates as repository_rates
+from src.repository.rates import set_rates
+from src.services.rate_buffer import RateBuffer
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture()
+def users(session):
+    users = []
+    for name in ('author', 'voter1', 'voter2'):
+        user = session.query(User).filter(User.email == f'{name}@example.com').first()
+        if user is None:
+            user = User(email=f'{name}@example.com', username=name, password='testtest', user_role='User')
+            session.add(user)
+            session.commit()
+        users.append(user)
+    return users
+
+
+@pytest.fixture()
+def make_post(users, session):
+    def make_post() -> int:
+        post = Post(photo_url='media/buffered.jpg', description='Rate me later', user_id=users[0].id)
+        session.add(post)
+        session.commit()
+        return post.id
+    return make_post
+
+
+async def stored(post_id: int) -> dict:
+    async with TestingAsyncSessionLocal() as db:
+        rates = await db.execute(select(RatePost.user_id, RatePost.rate).filter(RatePost.photo_id == post_id))
+        post = await db.scalar(select(Post).filter(Post.id == post_id))
+    return {"rates": dict(rates.all()), "aggregates": (post.rate_sum, post.rate_count)}
+
+
+@pytest.mark.asyncio
+async def test_set_rates_skips_missing_and_own_posts(make_post, users, async_session):
+    post_id = make_post()
+
+    written = await set_rates([(post_id, users[1].id, 4), (post_id, users[0].id, 5), (10 ** 9, users[1].id, 3),
+                               (post_id, users[2].id, 2)], async_session)
+
+    assert written == 2
+    assert await stored(post_id) == {"rates": {users[1].id: 4, users[2].id: 2}, "aggregates": (6, 2)}
+
+
+@pytest.mark.asyncio
+async def test_buffer_collapses_votes_and_flushes_on_interval(make_post, users):
+    post_id = make_post()
+    buffer = RateBuffer(TestingAsyncSessionLocal, interval=0.05)
+
+    for rate in (1, 2, 3):
+        buffer.add(post_id, users[1].id, rate)
+    buffer.add(post_id, users[2].id, 5)
+    assert (await stored(post_id))["rates"] == {}
+    await asyncio.sleep(0.3)
+
+    assert await stored(post_id) == {"rates": {users[1].id: 3, users[2].id: 5}, "aggregates": (8, 2)}
+    stats = buffer.stats()
+    assert (stats["added"], stats["collapsed"], stats["flushes"], stats["written"]) == (4, 2, 1, 2)
+    assert stats["batch_size_max"] == 2 and stats["flush_max_ms"] > 0
+    await buffer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_when_full(make_post, users):
+    first, second = make_post(), make_post()
+    buffer = RateBuffer(TestingAsyncSessionLocal, interval=3600, max_size=2)
+
+    buffer.add(first, users[1].id, 4)
+    buffer.add(second, users[1].id, 2)
+    await asyncio.sleep(0.2)
+
+    assert buffer.stats()["flushes"] == 1
+    assert (await stored(second))["rates"] == {users[1].id: 2}
+    await buffer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_in_chunks(make_post, users, monkeypatch):
+    posts = [make_post() for _ in range(5)]
+    chunks = []
+
+    async def set_rates_failing_third(rates, db):
+        chunks.append(len(rates))
+        if len(chunks) == 3:
+            raise ConnectionError("database unavailable")
+        return await set_rates(rates, db)
+
+    monkeypatch.setattr(repository_rates, "set_rates", set_rates_failing_third)
+    buffer = RateBuffer(TestingAsyncSessionLocal, interval=3600)
+    for post_id in posts:
+        buffer.add(post_id, users[1].id, 3)
+    buffer.max_size = 2
+
+    assert await buffer.flush() == 4
+    assert chunks == [2, 2, 1]
+    assert buffer.pending == {(posts[4], users[1].id): 3}
+    assert (await stored(posts[3]))["rates"] == {users[1].id: 3}
+    await buffer.shutdown()
+
+    assert chunks == [2, 2, 1, 1]
+    assert (await stored(posts[4]))["rates"] == {users[1].id: 3}
+    stats = buffer.stats()
+    assert (stats["flushed"], stats["written"], stats["failed_flushes"]) == (5, 5, 1)
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_on_shutdown(make_post, users):
+    post_id = make_post()
+    buffer = RateBuffer(TestingAsyncSessionLocal, interval=3600)
+
+    buffer.add(post_id, users[2].id, 1)
+    await buffer.shutdown()
+
+    assert (await stored(post_id))["rates"] == {users[2].id: 1}
+    assert buffer.stats()["buffered"] == 0
+
+
+@pytest.mark.asyncio
+async def test_buffer_keeps_rates_of_failed_flush(make_post, users):
+    post_id = make_post()
+
+    def broken_session():
+        raise ConnectionError("database unavailable")
+
+    buffer = RateBuffer(broken_session, interval=3600)
+    buffer.add(post_id, users[1].id, 2)
+    assert await buffer.flush() == 0
+    buffer.add(post_id, users[2].id, 3)
+
+    buffer.session_factory = TestingAsyncSessionLocal
+    await buffer.shutdown()
+
+    assert (await stored(post_id))["rates"] == {users[1].id: 2, users[2].id: 3}
+    assert buffer.stats()["failed_flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded_while_flushes_fail(make_post, users):
+    first, second = make_post(), make_post()
+
+    def broken_session():
+        raise ConnectionError("database unavailable")
+
+    buffer = RateBuffer(broken_session, interval=3600, max_pending=2)
+    assert buffer.add(first, users[1].id, 2) and buffer.add(first, users[2].id, 3)
+    assert await buffer.flush() == 0
+    assert await buffer.flush() == 0
+
+    assert buffer.add(first, users[1].id, 4)
+    assert not buffer.add(second, users[1].id, 5)
+    assert buffer.pending == {(first, users[1].id): 4, (first, users[2].id): 3}
+    stats = buffer.stats()
+    assert (stats["failed_flushes"], stats["consecutive_failures"], stats["overflowed"]) == (2, 2, 1)
+
+    buffer.session_factory = TestingAsyncSessionLocal
+    await buffer.shutdown()
+    assert buffer.stats()["consecutive_failures"] == 0
+    assert buffer.add(second, users[1].id, 5)
+    await buffer.shutdown()
+
+
+def test_rate_route_with_write_behind(client, session, users, make_post, monkeypatch):
+    post_id = make_post()
+    buffer = RateBuffer(TestingAsyncSessionLocal, interval=3600)
+    monkeypatch.setattr("src.routes.rates.rate_buffer", buffer)
+    user = {"username": "buffered", "email": "buffered@example.com", "password": "buffered",
+            "first_name": "buffered", "last_name": "buffered"}
+    client.post("/api/auth/signup", json=user)
+    token = client.post("/api/auth/login",
+                        data={"username": user['email'], "password": user['password']}).json()["access_token"]
+    user_id = session.query(User).filter(User.email == user['email']).first().id
+
+    response = client.post(f"/api/rate/{post_id}", json={"rate": 4}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 202, response.text
+    assert response.json() == {"rate": 4, "user_id": user_id, "photo_id": post_id}
+    assert buffer.pending == {(post_id, user_id): 4}
+    asyncio.run(buffer.shutdown())
+    assert asyncio.run(stored(post_id))["rates"] == {user_id: 4}
+
+
+def test_rate_route_writes_directly_when_buffer_is_full(client, session, users, make_post, monkeypatch):
+    post_id = make_post()
+    buffer = RateBuffer(TestingAsyncSessionLocal, interval=3600, max_pending=0)
+    monkeypatch.setattr("src.routes.rates.rate_buffer", buffer)
+    user = {"username": "overflowed", "email": "overflowed@example.com", "password": "overflowed",
+            "first_name": "overflowed", "last_name": "overflowed"}
+    client.post("/api/auth/signup", json=user)
+    token = client.post("/api/auth/login",
+                        data={"username": user['email'], "password": user['password']}).json()["access_token"]
+
+    response = client.post(f"/api/rate/{post_id}", json={"rate": 3}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 201, response.text
+    assert buffer.pending == {} and buffer.stats()["overflowed"] == 1
+    assert 3 in asyncio.run(stored(post_id))["rates"].values()
@@ -0,0 +1,112 @@
+import pytest
+
+import src.repository.search as rep_search
+from src.database.models import Post, Tag, User
+from src.database.search_index import search_terms, postgresql_prefix_query, sqlite_prefix_query
+
+
+@pytest.fixture()
+def owner(session):
+    user = session.query(User).filter(User.email == 'searcher@example.com').first()
+    if user is None:
+        user = User(email='searcher@example.com', username='searcher', password='searcher')
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.fixture()
+def make_post(owner, session):
+    def make_post(description: str, tags: list[str] = ()) -> int:
+        tag_list = []
+        for name in tags:
+            tag = session.query(Tag).filter(Tag.tag == name).first() or Tag(tag=name, user_id=owner.id)
+            tag_list.append(tag)
+        post = Post(photo_url='media/search.jpg', description=description, user_id=owner.id, tags=tag_list)
+        session.add(post)
+        session.commit()
+        return post.id
+    return make_post
+
+
+async def found(search_str: str, async_session, sort: str = 'date') -> list[int]:
+    response = await rep_search.get_search_posts(search_str, sort, -1, 0, 100, async_session)
+    return [item.id for item in response]
+
+
+def test_search_terms():
+    assert search_terms("Sun-set, O'Hara & 2023!") == ['sun', 'set', 'o', 'hara', '2023']
+    assert postgresql_prefix_query(['sun', 'set']) == 'sun:* & set:*'
+    assert sqlite_prefix_query(['sun', 'set']) == '"sun"* "set"*'
+
+
+@pytest.mark.asyncio
+async def test_search_matches_description_and_tags(make_post, async_session):
+    described = make_post('Quokka on the beach')
+    tagged = make_post('Holiday', ['quokkas'])
+    other = make_post('Kangaroo in the desert')
+
+    assert sorted(await found('quokka', async_session)) == sorted([described, tagged])
+    assert await found('QUOK', async_session) != []
+    assert other not in await found('quokka', async_session)
+
+
+@pytest.mark.asyncio
+async def test_search_requires_every_term(make_post, async_session):
+    both = make_post('Wombat burrow at dusk')
+    make_post('Wombat asleep')
+
+    assert await found('wombat dusk', async_session) == [both]
+    assert await found('wombat platypus', async_session) == []
+
+
+@pytest.mark.asyncio
+async def test_search_empty_string_matches_all(make_post, session, async_session):
+    make_post('Echidna')
+
+    assert len(await found('', async_session)) == session.query(Post).count()
+    assert len(await found('%!?', async_session)) == session.query(Post).count()
+
+
+@pytest.mark.asyncio
+async def test_search_relevance(make_post, async_session):
+    once = make_post('A numbat and a lot of other words around it in the long description')
+    twice = make_post('Numbat numbat', ['numbat'])
+
+    assert await found('numbat', async_session, 'relevance') == [twice, once]
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_changes(make_post, session, async_session):
+    post_id = make_post('Cassowary crossing')
+    post = session.get(Post, post_id)
+
+    post.description = 'Emu crossing'
+    session.commit()
+    assert await found('cassowary', async_session) == []
+    assert await found('emu', async_session) == [post_id]
+
+    post.tags = [Tag(tag='bilby', user_id=post.user_id)]
+    session.commit()
+    assert await found('bilby', async_session) == [post_id]
+
+    session.delete(post)
+    session.commit()
+    assert await found('emu', async_session) == []
+
+
+@pytest.mark.asyncio
+async def test_search_page_query_count(make_post, async_session, query_counter):
+    for index in range(12):
+        make_post(f'Dingo number {index}', ['dingo', f'dingo{index}'])
+
+    counts = {}
+    for limit in (1, 5, 12):
+        query_counter.clear()
+        response = await rep_search.get_search_posts('dingo', 'date', -1, 0, limit, async_session)
+        assert len(response) == limit
+        assert all('dingo' in [tag.tag for tag in item.tags] for item in response)
+        counts[limit] = len(query_counter)
+
+    # the page, its tags and its derivatives
+    assert counts == {1: 3, 5: 3, 12: 3}
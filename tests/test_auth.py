@@ -1,8 +1,15 @@
+from unittest.mock import MagicMock
+
 import pytest
+from jose import jwt
+from sqlalchemy import select
 
 from src.database.models import User
-from src.services.messages_templates import ALREADY_EXISTS, INVALID_PASSWORD, INVALID_EMAIL
-from src.services.urls_templates import URL_SIGNUP, URL_LOGIN
+from src.services.auth import auth_service
+from src.services.cache import revoked_token_cache, user_cache, verified_token_cache
+from src.services.messages_templates import ALREADY_EXISTS, INVALID_PASSWORD, INVALID_EMAIL, NOT_VALIDATE_CREDENTIALS
+from src.services.urls_templates import URL_SIGNUP, URL_LOGIN, URL_LOGOUT
+from tests.conftest import TestingAsyncSessionLocal
 
 
 @pytest.fixture
@@ -68,3 +75,88 @@ def test_login_wrong_email(client, user):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == INVALID_EMAIL
+
+
+def test_verified_token_is_cached(client, user, monkeypatch):
+    response = client.post(
+        URL_LOGIN,
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    token = response.json()["access_token"]
+    verified_token_cache.clear()
+    decode = MagicMock(wraps=jwt.decode)
+    monkeypatch.setattr("src.services.auth.jwt.decode", decode)
+
+    for _ in range(3):
+        assert auth_service.decode_access_token(token)["sub"] == user.get('email')
+    assert decode.call_count == 1
+
+
+def test_logout_revokes_access_token(client, user):
+    response = client.post(
+        URL_LOGIN,
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = client.get("/api/rate", headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.post(URL_LOGOUT, headers=headers)
+    assert response.status_code == 204, response.text
+
+    response = client.get("/api/rate", headers=headers)
+    assert response.status_code == 401, response.text
+    data = response.json()
+    assert data["detail"] == NOT_VALIDATE_CREDENTIALS
+
+
+@pytest.mark.asyncio
+async def test_cached_user_is_attached_to_each_session(client, user):
+    async with TestingAsyncSessionLocal() as db:
+        loaded = await auth_service.get_user(user["email"], db)
+    assert user_cache.get(user["email"])["id"] == loaded.id
+
+    async with TestingAsyncSessionLocal() as db:
+        cached = await auth_service.get_user(user["email"], db)
+        assert cached is not loaded and cached in db
+        cached.first_name = "Wade"
+        await db.commit()
+
+    async with TestingAsyncSessionLocal() as db:
+        stored = await db.scalar(select(User).filter(User.email == user["email"]))
+        assert (stored.first_name, stored.last_name, stored.password) == ("Wade", "Pool", loaded.password)
+
+
+def test_current_user_rejects_stale_tokens(client, user, session):
+    def login() -> dict:
+        response = client.post(URL_LOGIN, data={"username": user.get('email'), "password": user.get('password')})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def status_of(headers: dict) -> int:
+        return client.get("/api/posts/p/999999/detail", headers=headers).status_code
+
+    # a token of the same second as the one logged out above is the same token
+    revoked_token_cache.clear()
+    old = login()
+    assert status_of(old) == 404
+    stored = session.query(User).filter(User.email == user.get('email')).first()
+    stored.token_version += 1
+    session.commit()
+    # as in another worker once its cached copy of the user expired
+    user_cache.clear()
+    assert status_of(old) == 401
+
+    # a worker that cached the user before the bump accepts tokens issued after it
+    new = login()
+    assert status_of(new) == 404
+    user_cache.set(user.get('email'), {**user_cache.get(user.get('email')), "token_version": stored.token_version - 1})
+    assert status_of(new) == 404
+    assert user_cache.get(user.get('email'))["token_version"] == stored.token_version
+    assert status_of(old) == 401
+
+    stored.is_active = False
+    session.commit()
+    user_cache.clear()
+    assert status_of(new) == 401
+    stored.is_active = True
+    session.commit()
@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+from src.services.cache import TTLCache
+
+
+def test_get_set_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = TTLCache(maxsize=2, ttl=10)
+    with patch("src.services.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("src.services.cache.time.monotonic", return_value=109.0):
+        assert cache.get("a") == 1
+    with patch("src.services.cache.time.monotonic", return_value=110.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a", "missing")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
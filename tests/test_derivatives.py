@@ -0,0 +1,123 @@
+import asyncio
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+
+from src.database.models import User
+from src.repository import posts as repository_posts
+from src.repository.search import get_search_posts
+from src.schemas import PostCreate
+from src.services import uploads
+from src.services.derivatives import DerivativePool, derivative_pool, generate_derivatives, render_derivatives
+from src.services.media_store import media_store
+from tests.conftest import TestingAsyncSessionLocal
+
+
+def make_image(mode: str = 'RGB', size: tuple[int, int] = (1200, 800), image_format: str = 'JPEG') -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'white').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture()
+def owner(session):
+    user = session.query(User).filter(User.email == "photographer@example.com").first()
+    if user is None:
+        user = User(email="photographer@example.com", username="photographer", password="password")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    return user
+
+
+@pytest.fixture()
+def media_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "root", str(tmp_path))
+    return tmp_path
+
+
+def test_render_derivatives(tmp_path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(make_image())
+
+    derivatives = render_derivatives(str(source), (1080, 160, 480, 1200, 2000))
+
+    assert [(width, height) for width, height, _ in derivatives] == [(160, 107), (480, 320), (1080, 720)]
+    for width, height, path in derivatives:
+        assert path == str(tmp_path / f"photo_{width}w.jpg")
+        with Image.open(path) as image:
+            assert image.size == (width, height)
+
+    mtime = os.path.getmtime(derivatives[0][2])
+    assert render_derivatives(str(source), (160,)) == derivatives[:1]
+    assert os.path.getmtime(derivatives[0][2]) == mtime
+
+
+def test_render_derivatives_keeps_transparency(tmp_path):
+    source = tmp_path / "logo.png"
+    source.write_bytes(make_image('RGBA', (400, 400), 'PNG'))
+
+    [(width, height, path)] = render_derivatives(str(source), (160,))
+
+    assert path.endswith("_160w.png")
+    with Image.open(path) as image:
+        assert image.mode == 'RGBA'
+
+
+@pytest.mark.asyncio
+async def test_discard_removes_derivatives(tmp_path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(make_image())
+    render_derivatives(str(source), (160, 480))
+
+    await media_store.discard(str(source))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_generate_derivatives_for_post(media_root, owner, async_session):
+    staged = await uploads.save_upload(UploadFile(file=io.BytesIO(make_image()), filename="sunset.jpg"),
+                                       media_dir=str(media_root))
+    post = await repository_posts.create_post(PostCreate(description="sunset", tags=[]), staged, async_session, owner)
+    completed = derivative_pool.completed
+
+    await generate_derivatives(post.id, post.photo_url, TestingAsyncSessionLocal)
+
+    assert derivative_pool.completed == completed + 1
+    assert derivative_pool.stats()["processing_max_ms"] > 0
+    async_session.expunge_all()
+    post = await repository_posts.get_post(post.id, async_session)
+    assert [(d.width, d.height) for d in post.derivatives] == [(160, 107), (480, 320), (1080, 720)]
+    for derivative in post.derivatives:
+        assert os.path.exists(derivative.photo_url)
+
+    [found] = await get_search_posts("sunset", "date", 1, 0, 10, async_session)
+    assert [d.photo_url for d in found.derivatives] == [d.photo_url for d in post.derivatives]
+
+
+@pytest.mark.asyncio
+async def test_pool_is_replaced_after_a_worker_dies(tmp_path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(make_image())
+    pool = DerivativePool((160,), workers=1)
+    try:
+        await pool.render(str(source))
+        executor = pool._executor
+        for process in list(executor._processes.values()):
+            process.kill()
+        while not executor._broken:
+            await asyncio.sleep(0.01)
+
+        with pytest.raises(BrokenProcessPool):
+            await pool.render(str(source))
+        [(width, _, path)] = await pool.render(str(source))
+    finally:
+        await pool.shutdown()
+
+    assert width == 160 and os.path.exists(path)
+    assert (pool.completed, pool.failed) == (2, 1)
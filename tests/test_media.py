@@ -0,0 +1,112 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from src.database.models import User
+from src.repository import media as repository_media
+from src.repository import posts as repository_posts
+from src.schemas import PostCreate
+from src.services.media_store import media_store
+from src.services.uploads import save_upload
+from tests.conftest import TestingAsyncSessionLocal
+
+PHOTO = b'\x89PNG\r\n\x1a\n' + b'\x01' * 1000
+OTHER_PHOTO = b'\xff\xd8\xff\xe0' + b'\x02' * 3000
+
+
+@pytest.fixture()
+def media_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "root", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture()
+def owner(session):
+    user = session.query(User).filter(User.email == "media@example.com").first()
+    if user is None:
+        user = User(email="media@example.com", username="media", password="password")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    return user
+
+
+async def upload_post(data: bytes, media_root, owner, db):
+    staged = await save_upload(UploadFile(file=io.BytesIO(data), filename="photo"), media_dir=str(media_root))
+    return await repository_posts.create_post(PostCreate(description="photo", tags=[]), staged, db, owner)
+
+
+def stored_files(media_root):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(media_root) for name in names)
+
+
+@pytest.mark.asyncio
+async def test_identical_uploads_share_one_file(media_root, owner, async_session):
+    first = await upload_post(PHOTO, media_root, owner, async_session)
+    second = await upload_post(PHOTO, media_root, owner, async_session)
+    other = await upload_post(OTHER_PHOTO, media_root, owner, async_session)
+
+    assert first.photo_url == second.photo_url != other.photo_url
+    assert first.media_id == second.media_id
+    assert first.photo_url.startswith(f"{media_root}/")
+    assert stored_files(media_root) == sorted([first.photo_url, other.photo_url])
+
+    report = await repository_media.get_dedup_report(async_session)
+    assert report["files"] == 2
+    assert report["references"] == 3
+    assert report["stored_bytes"] == len(PHOTO) + len(OTHER_PHOTO)
+    assert report["bytes_saved"] == len(PHOTO)
+
+    await repository_posts.remove_post(first.id, async_session)
+    assert os.path.exists(second.photo_url)
+
+    await repository_posts.remove_post(second.id, async_session)
+    await repository_posts.remove_post(other.id, async_session)
+    assert stored_files(media_root) == []
+    assert (await repository_media.get_dedup_report(async_session))["files"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_post_discards_staged_upload(media_root, owner, async_session, monkeypatch):
+    async def broken_get_tags_list(*args):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(repository_posts.repository_tags, "get_tags_list", broken_get_tags_list)
+    with pytest.raises(RuntimeError):
+        await upload_post(PHOTO, media_root, owner, async_session)
+    assert stored_files(media_root) == []
+
+
+@pytest.mark.asyncio
+async def test_upload_during_discard_keeps_its_file(media_root, owner, async_session, monkeypatch):
+    removed = await upload_post(PHOTO, media_root, owner, async_session)
+    assert await repository_media.release_media(removed.media_id, async_session)
+    await async_session.commit()
+    discard = media_store.discard
+    created = asyncio.Event()
+
+    async def discard_after_upload(path: str):
+        # the file is about to go: let an upload of the same content run, if it can, before it
+        try:
+            await asyncio.wait_for(created.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+        await discard(path)
+
+    async def upload_again():
+        async with TestingAsyncSessionLocal() as db:
+            post = await upload_post(PHOTO, media_root, owner, db)
+        created.set()
+        return post
+
+    monkeypatch.setattr(media_store, "discard", discard_after_upload)
+    async with TestingAsyncSessionLocal() as db:
+        discarded, post = await asyncio.gather(repository_media.discard_unreferenced(removed.media_id, db),
+                                               upload_again())
+
+    assert discarded == removed.photo_url == post.photo_url
+    assert os.path.exists(post.photo_url)
+    assert (await repository_media.get_dedup_report(async_session))["references"] == 1
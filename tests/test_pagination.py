@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+
+import src.repository.comments as rep_comments
+import src.repository.search as rep_search
+from src.database.models import Comment, Post, User
+from src.services.messages_templates import INVALID_CURSOR
+from src.services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+
+
+@pytest.fixture()
+def author(session):
+    user = session.query(User).filter(User.email == 'pager@example.com').first()
+    if user is None:
+        user = User(email='pager@example.com', username='pager', password='pager')
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.fixture()
+def make_posts(author, session):
+    def make_posts(description: str, rates: list) -> list:
+        posts = [Post(photo_url='media/page.jpg', description=description, user_id=author.id, rate_avg=rate)
+                 for rate in rates]
+        session.add_all(posts)
+        session.commit()
+        return [post.id for post in posts]
+    return make_posts
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 10, 17, 12, 30, 5, 120), 3.25, 42]
+
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', encode_cursor([])[:-1], 'eyJhIjoxfQ'])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.asyncio
+async def test_paginate_rejects_cursor_of_another_key(async_session):
+    with pytest.raises(HTTPException) as error:
+        paginate(select(Post), (Post.created_at, Post.id), [1], 0, 20, async_session)
+    assert error.value.detail == INVALID_CURSOR
+
+    with pytest.raises(HTTPException):
+        paginate(select(Post), (Post.created_at, Post.id), [0.5, 1], 0, 20, async_session)
+
+
+@pytest.mark.asyncio
+async def test_comment_pages_follow_cursor(author, make_posts, session, async_session):
+    post_id = make_posts('Commented', [0])[0]
+    # the first three dates as CURRENT_TIMESTAMP writes them, the next ones as SQLAlchemy does
+    for _ in range(3):
+        session.execute(text("INSERT INTO comments (comment_text, post_id, user_id, created_at) "
+                             "VALUES ('early', :post_id, :user_id, '2026-01-01 12:00:00')"),
+                        {"post_id": post_id, "user_id": author.id})
+    session.add_all([Comment(comment_text='same second', post_id=post_id, user_id=author.id,
+                             created_at=datetime(2026, 1, 1, 12)) for _ in range(2)] +
+                    [Comment(comment_text='later', post_id=post_id, user_id=author.id,
+                             created_at=datetime(2026, 1, 1, 12, 0, second, 500)) for second in (1, 2)])
+    session.commit()
+    expected = [comment.id for comment in await rep_comments.get_comments(0, 100, async_session, post_id)]
+
+    ids, cursor = [], None
+    for _ in range(100):
+        page = await rep_comments.get_comments(0, 2, async_session, post_id, cursor)
+        ids.extend(comment.id for comment in page)
+        if page.next_cursor is None:
+            break
+        cursor = decode_cursor(page.next_cursor)
+    else:
+        pytest.fail("the cursor does not move forward")
+
+    assert len(expected) == 7
+    assert ids == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('sort, sort_type', [('rate', -1), ('rate', 1), ('date', 1), ('date', -1), ('relevance', 1)])
+async def test_search_pages_follow_cursor(sort, sort_type, make_posts, async_session):
+    make_posts('Keyset walk', [2, 4, 2, 4, 2, 3])
+    expected = [post.id for post in await rep_search.get_search_posts('keyset', sort, sort_type, 0, 100,
+                                                                     async_session)]
+
+    ids, cursor = [], None
+    for _ in range(100):
+        page = await rep_search.get_search_posts('keyset', sort, sort_type, 0, 4, async_session, cursor)
+        ids.extend(post.id for post in page)
+        if page.next_cursor is None:
+            break
+        cursor = decode_cursor(page.next_cursor)
+    else:
+        pytest.fail("the cursor does not move forward")
+
+    assert ids == expected
+    assert len(set(ids)) == len(ids)
+
+
+def test_user_posts_route_pages(client, author, make_posts):
+    created = make_posts('Paged route', [0] * 5)
+
+    ids, params = [], {"limit": 2}
+    for _ in range(100):
+        response = client.get(f"/api/posts/u/{author.id}", params=params)
+        assert response.status_code == 200, response.text
+        ids.extend(post["id"] for post in response.json())
+        if NEXT_CURSOR_HEADER not in response.headers:
+            break
+        params = {"limit": 2, "cursor": response.headers[NEXT_CURSOR_HEADER]}
+    else:
+        pytest.fail("the cursor does not move forward")
+
+    assert set(created) <= set(ids)
+    assert ids == sorted(ids)
+    assert [post["id"] for post in client.get(f"/api/posts/u/{author.id}", params={"skip": 2, "limit": 2}).json()] \
+        == ids[2:4]
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', encode_cursor([1])])
+def test_list_route_rejects_invalid_cursor(client, author, cursor):
+    response = client.get(f"/api/posts/u/{author.id}", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == INVALID_CURSOR
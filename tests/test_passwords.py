@@ -0,0 +1,69 @@
+import asyncio
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.passwords import PasswordPool, hash_password, verify_password
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_in_pool():
+    pool = PasswordPool(workers=2, queue_size=2)
+    hashed = await pool.run(hash_password, "secret")
+    assert await pool.run(verify_password, "secret", hashed)
+    assert not await pool.run(verify_password, "wrong", hashed)
+    stats = pool.stats()
+    assert stats["completed"] == 3
+    assert stats["pending"] == 0
+    await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pool_rejects_when_saturated():
+    pool = PasswordPool(workers=1, queue_size=1)
+    release = threading.Event()
+    busy = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as error:
+        await pool.run(release.wait)
+    assert error.value.status_code == 503
+
+    release.set()
+    await asyncio.gather(*busy)
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["queue_wait_max_ms"] > 0
+    await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_without_blocking_the_loop():
+    pool = PasswordPool(workers=1, queue_size=1)
+    release = threading.Event()
+    busy = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0.05)
+
+    shutdown = asyncio.create_task(pool.shutdown())
+    await asyncio.sleep(0.05)
+    assert not shutdown.done()
+
+    release.set()
+    await asyncio.wait_for(shutdown, 1)
+    assert await busy
+
+
+@pytest.mark.asyncio
+async def test_process_pool_is_replaced_after_a_worker_dies():
+    pool = PasswordPool(kind='process', workers=1, queue_size=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(os._exit, 1)
+        hashed = await pool.run(hash_password, "secret")
+        assert await pool.run(verify_password, "secret", hashed)
+    finally:
+        await pool.shutdown()
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+
+import src.repository.comments as rep_comments
+import src.repository.rates as rep_rates
+from src.database.models import Post, User
+from src.routes.post_events import stream_post_events
+from src.schemas import CommentModel
+from src.services.post_events import LocalBroker, PostEventHub, post_events
+
+
+class FailingBroker(LocalBroker):
+    async def publish(self, post_id: int, message: str) -> None:
+        raise ConnectionError("broker is down")
+
+
+def events(subscription) -> list:
+    frames = []
+    while not subscription.queue.empty():
+        frames.append(json.loads(subscription.queue.get_nowait().removeprefix("data: ")))
+    return frames
+
+
+@pytest.fixture()
+def users(session):
+    users = []
+    for index in range(2):
+        email = f'follower{index}@example.com'
+        user = session.query(User).filter(User.email == email).first()
+        if user is None:
+            user = User(email=email, username=f'follower{index}', password='secret', first_name='Fol',
+                        last_name='Lower')
+            session.add(user)
+            session.commit()
+        users.append(user)
+    return users
+
+
+@pytest.fixture()
+def post_id(users, session):
+    post = Post(photo_url='media/followed.jpg', description='Followed', user_id=users[0].id)
+    session.add(post)
+    session.commit()
+    return post.id
+
+
+@pytest.mark.asyncio
+async def test_hub_fans_out_per_post():
+    hub = PostEventHub(LocalBroker(), queue_size=10)
+    first, second, other = await hub.subscribe(1), await hub.subscribe(1), await hub.subscribe(2)
+
+    await hub.publish(1, "comment_created", {"id": 7})
+    hub.unsubscribe(second)
+    await hub.publish(1, "comment_deleted", {"id": 7})
+
+    assert [event["type"] for event in events(first)] == ["comment_created", "comment_deleted"]
+    assert events(second) == [{"type": "comment_created", "post_id": 1, "data": {"id": 7}}]
+    assert events(other) == []
+    assert hub.stats()["subscriptions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_loses_oldest_events():
+    hub = PostEventHub(LocalBroker(), queue_size=3)
+    subscription = await hub.subscribe(1)
+
+    for index in range(5):
+        await hub.publish(1, "rate_set", {"id": index})
+
+    assert [event["data"]["id"] for event in events(subscription)] == [2, 3, 4]
+    assert subscription.take_dropped() == 2
+    assert subscription.take_dropped() == 0
+    assert hub.stats()["dropped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_broker_failure_does_not_fail_publisher():
+    hub = PostEventHub(FailingBroker())
+
+    await hub.publish(1, "rate_set", {"id": 1})
+
+    assert hub.stats()["publish_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_publish_events(users, post_id, async_session):
+    subscription = await post_events.subscribe(post_id)
+    try:
+        comment = await rep_comments.create_comment(CommentModel(comment_text='live'), post_id, async_session,
+                                                    users[1])
+        await rep_comments.edit_comments(comment.id, CommentModel(comment_text='edited'), async_session, users[1])
+        rate = await rep_rates.set_rate_for_image(post_id, 4, users[1], async_session)
+        await rep_rates.set_rates([(post_id, users[1].id, 2)], async_session)
+        await rep_rates.remove_rate_for_image(rate.id, users[1], async_session)
+        await rep_comments.delete_comments(comment.id, async_session)
+    finally:
+        post_events.unsubscribe(subscription)
+
+    published = events(subscription)
+    assert [event["type"] for event in published] == ["comment_created", "comment_updated", "rate_set", "rate_set",
+                                                      "rate_removed", "comment_deleted"]
+    assert published[0]["data"]["comment_text"] == 'live'
+    assert published[1]["data"]["comment_text"] == 'edited'
+    assert [published[index]["data"]["rate"] for index in (2, 3)] == [4, 2]
+    assert published[5]["data"] == {"id": comment.id, "parent_id": None}
+
+
+@pytest.mark.asyncio
+async def test_event_stream(users, post_id, async_session):
+    response = await stream_post_events(post_id, async_session)
+    stream = response.body_iterator
+    assert post_id not in post_events._subscriptions
+    first = asyncio.ensure_future(stream.__anext__())
+    while post_id not in post_events._subscriptions:
+        await asyncio.sleep(0)
+    subscription = next(subscription for subscription in post_events._subscriptions[post_id])
+    subscription.dropped = 1
+
+    await rep_comments.create_comment(CommentModel(comment_text='streamed'), post_id, async_session, users[1])
+
+    assert json.loads((await first).removeprefix("data: ")) == {"type": "lagged", "post_id": post_id, "dropped": 1}
+    frame = await stream.__anext__()
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    assert json.loads(frame.removeprefix("data: "))["data"]["comment_text"] == 'streamed'
+    await stream.aclose()
+    assert post_id not in post_events._subscriptions
+
+
+@pytest.mark.asyncio
+async def test_event_stream_not_started_leaves_no_subscription(users, post_id, async_session):
+    subscriptions = post_events.stats()["subscriptions"]
+
+    response = await stream_post_events(post_id, async_session)
+    await response.body_iterator.aclose()
+
+    assert post_events.stats()["subscriptions"] == subscriptions
+    assert post_id not in post_events._subscriptions
+
+
+def test_event_stream_of_missing_post(client):
+    response = client.get("/api/posts/999999/events")
+
+    assert response.status_code == 404
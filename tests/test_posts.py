@@ -1,16 +1,22 @@
 import unittest
-from unittest.mock import MagicMock
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
-from sqlalchemy.orm import Session
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Post
-from src.repository.posts import create_post, get_post, get_user_posts, update_post, remove_post, change_post_mark
-from src.schemas import PostCreate
+from src.conf.config import settings
+from src.database.models import User, Post, PostDerivative, Tag, Comment, RatePost, TransformPosts, UserRole
+from src.repository.posts import create_post, get_post, get_posts, get_user_posts, update_post, remove_post, \
+    change_post_mark
+from src.schemas import PostCreate, PostModel
+from src.services.media_store import MediaStore
+from src.services.uploads import StoredUpload
 
 
 class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.user_mock = User(id=1)
 
     async def test_create_post(self):
@@ -18,12 +24,19 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             description="Test description",
             tags=["first", "second", "third"]
         )
-        file_path = "test_path"
+        upload = StoredUpload(path="media/.upload-test", sha256="ab" * 32, size=10, extension=".png")
+        file_path = "media/ab/ab/" + upload.sha256 + ".png"
+        self.session.execute.return_value = MagicMock(**{"one.return_value": SimpleNamespace(id=1, path=file_path)})
+        # no known tags, then the inserted ones
+        self.session.scalars.side_effect = [[], [Tag(id=index, tag=name) for index, name in enumerate(body.tags)]]
 
-        result = await create_post(body, file_path, self.session, self.user_mock)
+        with patch("src.repository.posts.media_store", spec=MediaStore) as media_store:
+            result = await create_post(body, upload, self.session, self.user_mock)
 
+        media_store.place.assert_awaited_once_with(upload.path, file_path)
         self.assertEqual(result.description, body.description)
         self.assertEqual(result.photo_url, file_path)
+        self.assertEqual(result.media_id, 1)
         self.assertEqual(result.user_id, self.user_mock.id)
         self.assertEqual(len(result.tags), len(body.tags))
         # self.assertEqual(result.tags[0].tag, body.tags[0])
@@ -39,7 +52,7 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             photo_url="test_path"
         )
 
-        self.session.query().filter().first.return_value = post
+        self.session.scalar.return_value = post
 
         result = await get_post(post_id=post_id, db=self.session)
 
@@ -49,14 +62,14 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_post_not_found(self):
 
-        self.session.query(Post).filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await get_post(post_id=0, db=self.session)
         self.assertIsNone(result)
 
     async def test_get_user_posts(self):
         return_value = [Post(), Post(), Post()]
-        self.session.query(Post).filter().all.return_value = return_value
+        self.session.scalars.return_value = MagicMock(**{"all.return_value": return_value})
         result = await get_user_posts(user_id=0, db=self.session)
 
         self.assertEqual(return_value, result)
@@ -70,7 +83,7 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             tags=[]
         )
 
-        self.session.query().filter().first.return_value = return_value
+        self.session.scalar.return_value = return_value
 
         body = PostCreate(
             description="Update description",
@@ -82,13 +95,13 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.description, body.description)
 
     async def test_update_post_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         body = PostCreate(
             description="Update description",
             tags=[]
         )
-        self.session.query(Post).filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await update_post(post_id=0, body=body, db=self.session, user=self.user_mock)
         self.assertIsNone(result)
@@ -102,14 +115,14 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             photo_url="test_path"
         )
 
-        self.session.query().filter().first.return_value = post
+        self.session.scalar.return_value = post
 
         result = await remove_post(post_id=post_id, db=self.session)
 
         self.assertEqual(post, result)
 
     async def test_remove_post_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await remove_post(post_id=1, db=self.session)
 
@@ -125,19 +138,168 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             marked=marked
         )
 
-        self.session.query().filter().first.return_value = post
+        self.session.scalar.return_value = post
 
         result = await change_post_mark(post_id=post_id, db=self.session)
 
         self.assertEqual(marked, not result.marked)
 
     async def test_change_post_mark_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await change_post_mark(post_id=1, db=self.session)
 
         self.assertIsNone(result)
 
 
+@pytest.fixture()
+def make_user_posts(session):
+    def make_user_posts(username: str, count: int) -> User:
+        user = User(email=f'{username}@example.com', username=username, password='secret')
+        session.add(user)
+        session.commit()
+        for index in range(count):
+            session.add(Post(photo_url=f'media/{username}{index}.jpg', description=f'Post {index}', user_id=user.id,
+                             tags=[Tag(tag=f'{username}-{index}-{tag}', user_id=user.id) for tag in range(3)],
+                             derivatives=[PostDerivative(photo_url=f'media/{username}{index}-{width}.jpg',
+                                                         width=width, height=width) for width in (160, 480)]))
+        session.commit()
+        return user
+    return make_user_posts
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('count', [1, 10])
+async def test_get_user_posts_loads_relationships_eagerly(count, make_user_posts, async_session, max_queries):
+    user = make_user_posts(f'lister{count}', count)
+
+    # the posts, their tags and their derivatives, whatever the number of posts
+    with max_queries(3):
+        posts = [PostModel.from_orm(post) for post in await get_user_posts(user.id, async_session)]
+
+    assert len(posts) == count
+    assert all(len(post.tags) == 3 and len(post.derivatives) == 2 for post in posts)
+
+
+@pytest.mark.asyncio
+async def test_get_post_loads_relationships_eagerly(make_user_posts, async_session, max_queries):
+    user = make_user_posts('reader', 1)
+    post_id = (await get_user_posts(user.id, async_session))[0].id
+    async_session.expunge_all()
+
+    with max_queries(3):
+        post = PostModel.from_orm(await get_post(post_id, async_session))
+
+    assert [tag.tag for tag in post.tags] == ['reader-0-0', 'reader-0-1', 'reader-0-2']
+
+
+@pytest.mark.asyncio
+async def test_get_posts_keeps_order_in_one_query(make_user_posts, async_session, max_queries):
+    user = make_user_posts('batched', 4)
+    post_ids = [post.id for post in await get_user_posts(user.id, async_session)]
+    async_session.expunge_all()
+    wanted = [post_ids[2], 999999, post_ids[0], post_ids[3]]
+
+    # the posts, their tags and their derivatives, whatever the number of posts
+    with max_queries(3):
+        posts = [PostModel.from_orm(post) for post in await get_posts(wanted, async_session)]
+
+    assert [post.id for post in posts] == [post_ids[2], post_ids[0], post_ids[3]]
+    assert all(len(post.tags) == 3 and len(post.derivatives) == 2 for post in posts)
+
+
+def test_get_posts_batch(client, make_user_posts, session, monkeypatch):
+    user = make_user_posts('tiles', 3)
+    post_ids = [post.id for post in session.query(Post).filter(Post.user_id == user.id).order_by(Post.id)]
+
+    response = client.get("/api/posts/batch",
+                          params={"ids": f"{post_ids[1]},999999,{post_ids[0]},{post_ids[1]}"})
+    assert response.status_code == 200, response.text
+    assert [post["id"] for post in response.json()["posts"]] == [post_ids[1], post_ids[0]]
+    assert response.json()["missing"] == [999999]
+    assert response.json()["posts"][0]["tags"][0]["tag"] == 'tiles-1-0'
+
+    response = client.get("/api/posts/batch", params=[("ids", post_ids[2]), ("ids", post_ids[0])])
+    assert [post["id"] for post in response.json()["posts"]] == [post_ids[2], post_ids[0]]
+
+    assert client.get("/api/posts/batch", params={"ids": "1,two"}).status_code == 422
+    monkeypatch.setattr(settings, "posts_batch_max_size", 2)
+    assert client.get("/api/posts/batch", params={"ids": "1,2,3"}).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_update_post_queries_do_not_grow_with_tags(make_user_posts, async_session, query_counter):
+    user = make_user_posts('updater', 1)
+    post_id = (await get_user_posts(user.id, async_session))[0].id
+    counts = {}
+    for count in (1, 5):
+        async_session.expunge_all()
+        query_counter.clear()
+        body = PostCreate(description=f'{count} new tags', tags=[f'updated-{count}-{index}' for index in range(count)])
+        post = PostModel.from_orm(await update_post(post_id, body, async_session, user))
+        assert len(post.tags) == count and all(tag.created_at for tag in post.tags)
+        counts[count] = len(query_counter)
+
+    assert counts[1] == counts[5]
+
+
+def test_user_posts_route_query_count(client, make_user_posts, max_queries):
+    user = make_user_posts('routed', 5)
+
+    with max_queries(3):
+        response = client.get(f"/api/posts/u/{user.id}")
+
+    assert response.status_code == 200
+    assert [len(post["tags"]) for post in response.json()] == [3] * 5
+
+
+@pytest.fixture()
+def login(client, session):
+    def login(username: str) -> tuple[User, dict]:
+        client.post("/api/auth/signup", json={"username": username, "email": f"{username}@example.com",
+                                              "password": "secret", "first_name": username, "last_name": username})
+        user = session.query(User).filter(User.email == f"{username}@example.com").first()
+        user.is_active = True
+        user.user_role = UserRole.User.name
+        session.commit()
+        response = client.post("/api/auth/login", data={"username": user.email, "password": "secret"})
+        return user, {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
+
+
+def test_post_detail_in_one_request(client, login, make_user_posts, session, max_queries):
+    owner, headers = login('detailed')
+    viewer, viewer_headers = login('viewer')
+    post = Post(photo_url='media/detailed.jpg', description='All of it', user_id=owner.id,
+                tags=[Tag(tag=f'detailed-{index}', user_id=owner.id) for index in range(2)])
+    session.add(post)
+    session.commit()
+    session.add_all([RatePost(photo_id=post.id, user_id=viewer.id, rate=4),
+                     TransformPosts(photo_url='media/detailed-gray.jpg', photo_id=post.id)] +
+                    [Comment(comment_text=f'Comment {index}', post_id=post.id, user_id=viewer.id)
+                     for index in range(3)])
+    session.commit()
+    client.get(f"/api/posts/p/{post.id}/detail", headers=headers)
+
+    # the post with its owner and tags, the comments and the transforms
+    with max_queries(3):
+        response = client.get(f"/api/posts/p/{post.id}/detail", params={"comments_limit": 2}, headers=headers)
+
+    assert response.status_code == 200, response.text
+    detail = response.json()
+    assert (detail["id"], detail["username"], [tag["tag"] for tag in detail["tags"]]) == \
+        (post.id, 'detailed', ['detailed-0', 'detailed-1'])
+    assert (detail["rate_avg"], detail["rate_count"], detail["comment_count"]) == (4.0, 1, 3)
+    assert [comment["comment"]["comment_text"] for comment in detail["comments"]] == ['Comment 0', 'Comment 1']
+    assert detail["comments"][0]["username"] == 'viewer'
+    assert detail["comments_next_cursor"] is not None
+    assert [transform["photo_url"] for transform in detail["transforms"]] == ['media/detailed-gray.jpg']
+
+    response = client.get(f"/api/posts/p/{post.id}/detail", headers=viewer_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["transforms"] == []
+    assert client.get("/api/posts/p/999999/detail", headers=headers).status_code == 404
+
+
 if __name__ == '__main__':
     unittest.main()
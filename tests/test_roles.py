@@ -0,0 +1,107 @@
+import pytest
+from jose import jwt
+
+from src.database.models import Comment, Post, User, UserRole
+from src.repository import users as repository_users
+from src.services.auth import auth_service
+from src.services.cache import user_cache, token_version_cache
+from src.services.messages_templates import FORBIDDEN_ACCESS
+
+
+@pytest.fixture()
+def moderator():
+    return {"username": "moderator", "email": "moderator@example.com", "password": "moderator",
+            "first_name": "moder", "last_name": "ator"}
+
+
+@pytest.fixture()
+def moderator_token(moderator, client, session):
+    client.post("/api/auth/signup", json=moderator)
+    user: User = session.query(User).filter(User.email == moderator['email']).first()
+    user.user_role = UserRole.Moderator.name
+    user.is_active = True
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": moderator['email'], "password": moderator['password']},
+    )
+    # start every test without the user row cached, as after an eviction or in a fresh worker
+    user_cache.clear()
+    return response.json()["access_token"]
+
+
+def test_access_token_carries_claims(moderator_token):
+    payload = jwt.decode(moderator_token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+    assert payload["role"] == UserRole.Moderator.name
+    assert payload["active"] is True
+    assert isinstance(payload["ver"], int)
+
+
+def test_search_users_skips_user_query(client, moderator_token, query_counter):
+    response = client.post('/api/search/users', json={"search_str": "mod", "sort": "name", "sort_type": 1},
+                           headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 200, response.text
+    # only the search itself
+    assert len(query_counter) == 1
+
+
+def test_rate_from_user_skips_user_query(client, moderator_token, query_counter):
+    response = client.get('/api/rate/user/1', headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 200, response.text
+    assert len(query_counter) == 1
+
+
+def test_delete_comment_skips_user_query(client, moderator_token, session, query_counter):
+    post = Post(photo_url='url', description='post with comment')
+    session.add(post)
+    session.commit()
+    comment = Comment(post_id=post.id, comment_text="to delete")
+    session.add(comment)
+    session.commit()
+
+    response = client.delete(f"/api/{post.id}/comments/{comment.id}",
+                             headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 204, response.text
+    # select and delete of the comment
+    assert len(query_counter) == 2
+
+
+def test_unknown_token_version_loads_user(client, moderator_token, query_counter):
+    token_version_cache.clear()
+    response = client.get('/api/rate/user/1', headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 200, response.text
+    assert len(query_counter) == 2
+
+    query_counter.clear()
+    response = client.get('/api/rate/user/1', headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 200, response.text
+    assert len(query_counter) == 1
+
+
+def test_stale_token_uses_current_role(client, moderator, moderator_token, session):
+    user: User = session.query(User).filter(User.email == moderator['email']).first()
+    user.user_role = UserRole.User.name
+    user.token_version += 1
+    session.commit()
+    token_version_cache.invalidate(moderator['email'])
+
+    response = client.get('/api/rate/user/1', headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 403, response.text
+    assert response.json()['detail'] == FORBIDDEN_ACCESS
+
+
+@pytest.mark.asyncio
+async def test_banned_user_token_rejected(client, moderator, moderator_token, session, async_session):
+    moderator_id = session.query(User.id).filter(User.email == moderator['email']).scalar()
+    await repository_users.banned_user(moderator_id, async_session)
+
+    response = client.get('/api/rate/user/1', headers={"Authorization": f"Bearer {moderator_token}"})
+    assert response.status_code == 403, response.text
+
+
+def test_token_without_claims_loads_user(client, moderator, moderator_token, query_counter):
+    legacy_token = jwt.encode({"sub": moderator['email'], "scope": "access_token"}, auth_service.SECRET_KEY,
+                              algorithm=auth_service.ALGORITHM)
+    response = client.get('/api/rate/user/1', headers={"Authorization": f"Bearer {legacy_token}"})
+    assert response.status_code == 200, response.text
+    assert len(query_counter) == 2
@@ -1,16 +1,20 @@
+import asyncio
 import unittest
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Tag
-from src.repository.tags import get_tag_by_name, create_tag, get_tags_list
+from src.database.models import User, Tag, Post
+from src.repository.tags import get_tag_by_name, create_tag, get_tags_list, tag_cache, warm_tag_cache
 from src.schemas import TagCreate, TagBase
+from tests.conftest import TestingAsyncSessionLocal
 
 
 class TestTag(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.user_mock = User(id=1)
 
     async def test_get_tag_by_name(self):
@@ -21,18 +25,18 @@ class TestTag(unittest.IsolatedAsyncioTestCase):
             tag=tag_name
         )
 
-        self.session.query(Tag).filter().first.return_value = tag
-        result = get_tag_by_name(tag_name=tag_name, db=self.session)
+        self.session.scalar.return_value = tag
+        result = await get_tag_by_name(tag_name=tag_name, db=self.session)
         self.assertEqual(result.tag, tag_name)
 
     async def test_get_tag_by_name_not_found(self):
-        self.session.query(Tag).filter().first.return_value = None
-        result = get_tag_by_name(tag_name="", db=self.session)
+        self.session.scalar.return_value = None
+        result = await get_tag_by_name(tag_name="", db=self.session)
         self.assertIsNone(result)
 
     async def test_create_tag(self):
         tag_name = "test"
-        result = create_tag(tag_name=tag_name, user=self.user_mock, db=self.session)
+        result = await create_tag(tag_name=tag_name, user=self.user_mock, db=self.session)
         self.assertEqual(tag_name, result.tag)
         self.assertTrue(hasattr(result, "id"))
 
@@ -44,12 +48,101 @@ class TestTag(unittest.IsolatedAsyncioTestCase):
             tag=tag_name
         )
 
-        self.session.query(Tag).filter().first.return_value = tag
+        self.session.scalars.return_value = [tag]
 
-        result = get_tags_list(tags=tags, user=self.user_mock, db=self.session)
+        result = await get_tags_list(tags=tags, user=self.user_mock, db=self.session)
         self.assertEqual(len(result), 1)
         self.assertEqual(tag_name, result[0].tag)
 
 
+@pytest.fixture()
+def tagger(session):
+    user = session.query(User).filter(User.email == 'tagger@example.com').first()
+    if user is None:
+        user = User(email='tagger@example.com', username='tagger', password='tagger')
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_batches_queries(tagger, session, async_session, query_counter):
+    session.add(Tag(tag='batch-old', user_id=tagger.id))
+    session.commit()
+    query_counter.clear()
+
+    tags = await get_tags_list(['batch-new1', 'batch-old', 'batch-new2', 'batch-new1', 'batch-new3'], tagger,
+                               async_session)
+
+    assert [tag.tag for tag in tags] == ['batch-new1', 'batch-old', 'batch-new2', 'batch-new3']
+    assert all(tag.id is not None for tag in tags)
+    # one select of the known tags, one insert of the new ones
+    assert len(query_counter) == 2
+    await async_session.commit()
+    assert [tag.id for tag in await get_tags_list(['batch-new3', 'batch-old'], tagger, async_session)] == \
+        [tags[3].id, tags[1].id]
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_leaves_commit_to_caller(tagger, async_session):
+    await get_tags_list(['uncommitted'], tagger, async_session)
+    await async_session.rollback()
+
+    assert await async_session.scalar(select(Tag).filter(Tag.tag == 'uncommitted')) is None
+
+    assert tag_cache.get('uncommitted') is None
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_resolves_cached_tags_without_queries(tagger, async_session, query_counter):
+    tags = await get_tags_list(['cached1', 'cached2'], tagger, async_session)
+    await async_session.commit()
+    query_counter.clear()
+
+    async with TestingAsyncSessionLocal() as db:
+        cached = await get_tags_list(['cached2', 'cached1'], tagger, db)
+        post = Post(photo_url='media/cached.jpg', user_id=tagger.id, tags=cached)
+        db.add(post)
+        await db.commit()
+        assert len(query_counter) == 2  # the post and its post_tag rows
+        await db.refresh(post, ['tags'])
+
+    assert [tag.id for tag in cached] == [tags[1].id, tags[0].id]
+    assert sorted((tag.tag, tag.user_id) for tag in post.tags) == [('cached1', tagger.id), ('cached2', tagger.id)]
+
+
+@pytest.mark.asyncio
+async def test_warm_tag_cache_loads_most_used_tags(tagger, session, async_session):
+    session.add_all([Post(photo_url='media/warm.jpg', user_id=tagger.id, tags=[Tag(tag='warm-popular')]),
+                     Tag(tag='warm-unused', user_id=tagger.id)])
+    session.commit()
+    tag_cache.clear()
+
+    assert await warm_tag_cache(async_session) == session.query(Tag).count()
+    assert tag_cache.get('warm-popular') == session.query(Tag.id).filter(Tag.tag == 'warm-popular').scalar()
+    assert tag_cache.get('warm-unused') is not None
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_from_concurrent_workers(tagger, session):
+    names = ['race1', 'race2', 'race3']
+    everyone_read = asyncio.Barrier(4)
+
+    async def worker(number: int, commit: bool) -> dict:
+        async with TestingAsyncSessionLocal() as db:
+            await everyone_read.wait()
+            tags = await get_tags_list(names[number % 3:] + names[:number % 3], tagger, db)
+            resolved = {tag.tag: tag.id for tag in tags}
+            await db.commit() if commit else await db.rollback()
+        return resolved
+
+    results = await asyncio.gather(*(worker(number, commit=number != 3) for number in range(4)))
+
+    stored = dict(session.query(Tag.tag, Tag.id).filter(Tag.tag.in_(names)).all())
+    assert len(stored) == 3
+    assert all(resolved == stored for resolved in results[:3])
+    assert {name: tag_cache.get(name) for name in names} == stored
+
+
 if __name__ == '__main__':
     unittest.main()
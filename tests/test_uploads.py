@@ -0,0 +1,68 @@
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from src.services.uploads import save_upload, sniff_image_extension
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 2_500_000
+
+
+def make_upload(data: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="photo.png", size=size)
+
+
+@pytest.mark.parametrize("head, extension", [
+    (b'\xff\xd8\xff\xe0\x00\x10JFIF', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n\x00\x00\x00\x0d', '.png'),
+    (b'GIF89a\x01\x00\x01\x00\x00\x00', '.gif'),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', '.webp'),
+    (b'%PDF-1.7\n%\xe2\xe3\xcf\xd3', None),
+])
+def test_sniff_image_extension(head, extension):
+    assert sniff_image_extension(head) == extension
+
+
+@pytest.mark.asyncio
+async def test_save_upload(tmp_path):
+    stored = await save_upload(make_upload(PNG), media_dir=str(tmp_path), max_size=len(PNG))
+
+    assert stored.extension == '.png'
+    assert stored.size == len(PNG)
+    assert stored.sha256 == hashlib.sha256(PNG).hexdigest()
+    with open(stored.path, 'rb') as f:
+        assert f.read() == PNG
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.asyncio
+async def test_save_upload_too_large(tmp_path):
+    with pytest.raises(HTTPException) as e:
+        await save_upload(make_upload(PNG), media_dir=str(tmp_path), max_size=len(PNG) - 1)
+    assert e.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_save_upload_too_large_by_declared_size(tmp_path):
+    with pytest.raises(HTTPException) as e:
+        await save_upload(make_upload(PNG, size=len(PNG)), media_dir=str(tmp_path), max_size=1024)
+    assert e.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_save_upload_not_an_image(tmp_path):
+    with pytest.raises(HTTPException) as e:
+        await save_upload(make_upload(b'#!/bin/sh\nrm -rf /\n'), media_dir=str(tmp_path))
+    assert e.value.status_code == 415
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_save_upload_empty(tmp_path):
+    with pytest.raises(HTTPException) as e:
+        await save_upload(make_upload(b''), media_dir=str(tmp_path))
+    assert e.value.status_code == 415
+    assert list(tmp_path.iterdir()) == []
@@ -1,29 +1,37 @@
 import unittest
 from unittest.mock import Mock, MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, UserRole, Post
 from src.repository.users import banned_user, create_user, update_user_self, update_user_as_admin, \
     update_token, get_all_users, get_user_by_email, get_user_profile
 from src.schemas import UserCreate, UserBase, UserUpdate, UserProfileModel
+from src.services.cache import user_cache
 
 
 class TestBannedUser(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session_mock = Mock(spec=Session)
+        self.session_mock = Mock(spec=AsyncSession)
         self.user_mock = Mock(spec=User)
 
     async def test_banned_user_success(self):
         self.user_mock.user_role = UserRole.Admin.name
         result = await banned_user(123, self.session_mock)
         self.assertEqual(result.is_active, False)
-        self.session_mock.commit.assert_called_once()
+        self.session_mock.commit.assert_awaited_once()
+
+    async def test_banned_user_invalidates_cache(self):
+        banned = User(id=123, email="banned@example.com", is_active=True)
+        user_cache.set(banned.email, {"id": banned.id, "email": banned.email, "is_active": True})
+        self.session_mock.scalar.return_value = banned
+        await banned_user(123, self.session_mock)
+        self.assertIsNone(user_cache.get(banned.email))
 
 
 class TestUserCRUD(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session_mock = MagicMock(spec=Session)
+        self.session_mock = MagicMock(spec=AsyncSession)
         self.post_mock = MagicMock(spec=Post)
         self.user_mock = MagicMock(spec=User)
 
@@ -50,7 +58,7 @@ class TestUserCRUD(unittest.IsolatedAsyncioTestCase):
             last_name="test_last_",
             email="test@example.com"
         )
-        self.session_mock.query().filter().first.return_value = self.user_mock
+        self.session_mock.scalar.return_value = self.user_mock
         self.session_mock.commit.return_value = None
         result = await update_user_self(body, self.user_mock, self.session_mock)
         self.assertEqual(result.username, body.username)
@@ -65,7 +73,7 @@ class TestUserCRUD(unittest.IsolatedAsyncioTestCase):
             last_name="test_last",
             email="test@example.com"
         )
-        self.session_mock.query().filter().first.return_value = None
+        self.session_mock.scalar.return_value = None
         self.session_mock.commit.return_value = None
         result = await update_user_self(body, self.user_mock, self.session_mock)
         self.assertIsNone(result)
@@ -81,7 +89,7 @@ class TestUserCRUD(unittest.IsolatedAsyncioTestCase):
         )
         self.user_mock.username = "test_user"
         self.user_mock.user_role = UserRole.Admin.name
-        self.session_mock.query().filter().first.return_value = self.user_mock
+        self.session_mock.scalar.return_value = self.user_mock
         self.session_mock.commit.return_value = None
         result = await update_user_as_admin(body, self.user_mock, self.session_mock)
         self.assertEqual(result.username, body.username)
@@ -100,22 +108,25 @@ class TestUserCRUD(unittest.IsolatedAsyncioTestCase):
             is_active=False,
             user_role=UserRole.Admin.name
         )
-        self.session_mock.query().filter().first.return_value = None
+        self.session_mock.scalar.return_value = None
         self.session_mock.commit.return_value = None
         result = await update_user_as_admin(body, self.user_mock, self.session_mock)
         self.assertIsNone(result)
 
     async def test_update_user_token(self):
         token = "some_token"
-        self.session_mock.query().filter().first.return_value = self.user_mock
+        self.session_mock.scalar.return_value = self.user_mock
         self.session_mock.commit.return_value = None
         await update_token(self.user_mock, token, self.session_mock)
         self.assertEqual(self.user_mock.refresh_token, token)
 
     async def test_get_user_profile_found(self):
         self.user_mock.username = "test_user"
-        self.session_mock.query.return_value.filter.return_value.first.return_value = self.user_mock
-        self.session_mock.query.return_value.filter.return_value.first.return_value = self.post_mock
+        self.user_mock.first_name = "test_first"
+        self.user_mock.last_name = "test_last"
+        self.user_mock.email = "test@example.com"
+        self.user_mock.is_active = True
+        self.session_mock.scalar.side_effect = [self.user_mock, 3]
         self.assertEqual(self.user_mock.username, "test_user")
         result = await get_user_profile("", self.session_mock)
         self.assertIsInstance(result, UserProfileModel)
@@ -123,26 +134,25 @@ class TestUserCRUD(unittest.IsolatedAsyncioTestCase):
         self.assertIsNotNone(result.number_of_photos)
 
     async def test_get_user_profile_not_found(self):
-        self.session_mock.query(User).filter().first.return_value = self.user_mock
-        self.session_mock.query(Post).filter().first.return_value = None
+        self.session_mock.scalar.return_value = None
         result = await get_user_profile("no_user", self.session_mock)
         self.assertIsNone(result)
 
     async def test_get_user_by_email_found(self):
         self.user_mock.email = "test_email"
-        self.session_mock.query().filter().first.return_value = self.user_mock
+        self.session_mock.scalar.return_value = self.user_mock
         result = await get_user_by_email("test_email", self.session_mock)
         self.assertEqual(result, self.user_mock)
 
     async def test_get_user_by_email_not_found(self):
         self.user_mock.email = "test_email"
-        self.session_mock.query().filter().first.return_value = None
+        self.session_mock.scalar.return_value = None
         result = await get_user_by_email("test_email", self.session_mock)
         self.assertIsNone(result)
 
     async def test_get_all_users(self):
         users = [User(), User(), User()]
-        self.session_mock.query().filter().all.return_value = users
+        self.session_mock.scalars.return_value = MagicMock(**{"all.return_value": users})
         result = await get_all_users(self.user_mock, self.session_mock)
         self.assertEqual(result, users)
 
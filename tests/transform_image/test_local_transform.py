@@ -0,0 +1,191 @@
+import asyncio
+import os
+
+import pytest
+from PIL import Image
+
+from src.conf.config import settings
+from src.database.models import Post, User
+from src.schemas_transform_posts import TransformImageModel, TransformCropModel, RadiusImageModel
+from src.services import local_transform
+from src.services.local_transform import TransformTooLarge, render_transformation
+from src.services.messages_templates import TRANSFORM_NOT_SUPPORTED, TRANSFORM_TOO_LARGE
+from src.services.transform_backends import LocalTransformBackend, get_transform_backend, \
+    CloudinaryTransformBackend
+
+
+@pytest.fixture()
+def c_user():
+    return {"username": "local", "email": "local@example.com", "password": "localtest", "first_name": "local",
+            "last_name": "local"}
+
+
+@pytest.fixture()
+def token(c_user, client):
+    client.post("/api/auth/signup", json=c_user)
+    response = client.post("/api/auth/login", data={"username": c_user['email'], "password": c_user['password']})
+    return response.json()["access_token"]
+
+
+@pytest.fixture()
+def source(tmp_path):
+    path = tmp_path / "photo.jpg"
+    image = Image.new('RGB', (400, 200), (200, 40, 40))
+    image.paste((40, 40, 200), (200, 0, 400, 200))
+    image.save(path, 'JPEG')
+    return str(path)
+
+
+@pytest.fixture()
+def local_backend(tmp_path, monkeypatch):
+    backend = LocalTransformBackend(output_dir=str(tmp_path / "transforms"), workers=1)
+    monkeypatch.setattr("src.routes.transform_posts.transform_backend", backend)
+    yield backend
+    asyncio.run(backend.shutdown())
+
+
+@pytest.fixture()
+def local_post_id(c_user, token, session, source):
+    cur_user = session.query(User).filter(User.email == c_user['email']).first()
+    post = Post(photo_url=source, description='Local photo', user_id=cur_user.id)
+    session.add(post)
+    session.commit()
+    return post.id
+
+
+def render(source, tmp_path, **transformation):
+    path = render_transformation(source, TransformImageModel(**transformation).dict(), str(tmp_path / "out"))
+    return path, Image.open(path)
+
+
+@pytest.mark.parametrize("crop, size", [
+    ("scale", (100, 100)),
+    ("fit", (100, 50)),
+    ("fill", (100, 100)),
+    ("pad", (100, 100)),
+    ("crop", (100, 100)),
+])
+def test_resize(source, tmp_path, crop, size):
+    path, image = render(source, tmp_path, resize={"width": 100, "height": 100, "crop": crop})
+
+    assert path.endswith(".jpg")
+    assert image.size == size
+
+
+def test_crop_follows_gravity(source):
+    image = Image.open(source)
+
+    west = local_transform.resize(image, TransformCropModel(width=100, height=100, crop="crop", gravity="west"))
+    east = local_transform.resize(image, TransformCropModel(width=100, height=100, crop="crop", gravity="east"))
+
+    assert west.getpixel((50, 50))[0] > 150
+    assert east.getpixel((50, 50))[2] > 150
+
+
+def test_resize_output_is_bounded(source):
+    with Image.open(source) as image:
+        with pytest.raises(TransformTooLarge):
+            local_transform.resize(image, TransformCropModel(width=40000, height=40000, crop='fill'),
+                                   max_pixels=10 ** 6)
+        # a crop never outgrows the original
+        assert local_transform.resize(image, TransformCropModel(width=40000, height=40000, crop='crop'),
+                                      max_pixels=10 ** 6).size == (400, 200)
+
+
+def test_rotate(source, tmp_path):
+    _, image = render(source, tmp_path, rotate={"degree": 90})
+
+    assert image.size == (200, 400)
+    # clockwise: the red left half ends up on top
+    assert image.getpixel((100, 50))[0] > 150
+
+
+def test_radius_makes_corners_transparent(source, tmp_path):
+    path, image = render(source, tmp_path, radius={"all": 40})
+
+    assert path.endswith(".png")
+    assert image.mode == 'RGBA'
+    assert image.getpixel((0, 0))[3] == 0
+    assert image.getpixel((200, 100))[3] == 255
+
+
+def test_radius_single_corner(source):
+    image = local_transform.round_corners(Image.open(source), RadiusImageModel(right_bottom=50))
+
+    assert image.getpixel((399, 199))[3] == 0
+    assert image.getpixel((0, 0))[3] == 255
+
+
+def test_effects(source, tmp_path):
+    _, gray = render(source, tmp_path, simple_effect=[{"effect": "grayscale", "strength": 100}])
+    r, g, b = gray.getpixel((50, 50))
+    assert abs(r - g) < 8 and abs(g - b) < 8
+
+    _, negative = render(source, tmp_path, simple_effect=[{"effect": "negative", "strength": 100}])
+    assert negative.getpixel((50, 50))[0] < 100
+
+    _, dark = render(source, tmp_path, contrast_effect=[{"effect": "brightness", "level": -100}])
+    assert max(dark.getpixel((50, 50))) < 10
+
+    for effect in ("cartoonify", "oil_paint", "black_white"):
+        _, image = render(source, tmp_path, simple_effect=[{"effect": effect, "strength": 50}])
+        assert image.size == (400, 200)
+
+    _, image = render(source, tmp_path, art_effect={"effect": "sizzle"})
+    assert image.size == (400, 200)
+
+
+def test_blur_region_leaves_rest_untouched(source, tmp_path):
+    _, image = render(source, tmp_path, blur_effect=[{"effect": "blur_region", "strength": 1000,
+                                                      "x": 150, "y": 0, "width": 100, "height": 200}])
+
+    blurred = image.getpixel((199, 100))
+    assert 60 < blurred[0] < 180 and 60 < blurred[2] < 180
+    assert image.getpixel((10, 100))[0] > 150
+
+
+def test_get_transform_backend():
+    assert isinstance(get_transform_backend("cloudinary"), CloudinaryTransformBackend)
+    assert isinstance(get_transform_backend("local"), LocalTransformBackend)
+    with pytest.raises(ValueError):
+        get_transform_backend("imagemagick")
+
+
+def test_transformation_for_image_local(local_post_id, local_backend, client, token):
+    transformation = {"resize": {"crop": "fill", "width": 100, "height": 100},
+                      "simple_effect": [{"effect": "grayscale", "strength": 100}]}
+    response = client.post(f'/api/image/transform/{local_post_id}', json=transformation,
+                           headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200, response.text
+    url = response.json()['url']
+    assert url.startswith(local_backend.output_dir)
+    assert Image.open(url).size == (100, 100)
+    assert local_backend.stats()["completed"] == 1
+
+
+def test_transformation_for_image_local_blur_faces(local_post_id, local_backend, client, token):
+    transformation = {"blur_effect": [{"effect": "blur_faces", "strength": 500}]}
+    response = client.post(f'/api/image/transform/{local_post_id}', json=transformation,
+                           headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 422, response.text
+    assert response.json()['detail'] == TRANSFORM_NOT_SUPPORTED.format("blur_faces")
+
+
+def test_transformation_for_image_local_missing_file(local_post_id, local_backend, client, token, source):
+    os.remove(source)
+    response = client.post(f'/api/image/transform/{local_post_id}', json={"rotate": {"degree": 90}},
+                           headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 404, response.text
+
+
+def test_transformation_for_image_local_too_large(local_post_id, local_backend, client, token):
+    transformation = {"resize": {"width": 40000, "height": 40000, "crop": "scale"}}
+    response = client.post(f'/api/image/transform/{local_post_id}', json=transformation,
+                           headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"] == TRANSFORM_TOO_LARGE.format(settings.transform_max_pixels)
+    assert local_backend.stats()["failed"] == 0
@@ -0,0 +1,193 @@
+import contextlib
+
+import pytest
+from sqlalchemy import select
+
+from src.database.models import Post, User, UploadStatus
+from src.services.cloudynary import get_transformed_url
+from src.services.messages_templates import IMAGE_NOT_UPLOADED
+from src.services.remote_uploads import RemoteUploader
+from src.services.transform_backends import CloudinaryTransformBackend
+from tests.conftest import TestingAsyncSessionLocal
+
+
+class FakeUploadApi:
+    """
+    Stands in for cloudinary.uploader: records the uploads and fails the first ``failures`` of them.
+    """
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, image_url: str, public_id: str) -> str:
+        self.calls.append((image_url, public_id))
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("upload API unavailable")
+        return public_id
+
+
+def make_uploader(api: FakeUploadApi, **options) -> RemoteUploader:
+    return RemoteUploader(api, session_factory=TestingAsyncSessionLocal, **options)
+
+
+@pytest.fixture()
+def c_user():
+    return {"username": "uploader", "email": "uploader@example.com", "password": "uploader", "first_name": "uploader",
+            "last_name": "uploader"}
+
+
+@pytest.fixture()
+def owner(c_user, session):
+    user = session.query(User).filter(User.email == c_user['email']).first()
+    if user is None:
+        user = User(email=c_user['email'], username=c_user['username'], password=c_user['password'])
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.fixture()
+def make_post(owner, session):
+    def make_post(photo_url: str) -> int:
+        post = Post(photo_url=photo_url, description='upload me', user_id=owner.id)
+        session.add(post)
+        session.commit()
+        return post.id
+    return make_post
+
+
+async def load(post_id: int, async_session) -> Post:
+    async_session.expunge_all()
+    return await async_session.scalar(select(Post).filter(Post.id == post_id))
+
+
+@pytest.mark.asyncio
+async def test_upload_post(make_post, async_session):
+    post_id = make_post('media/ab/cd/abcd.jpg')
+    api = FakeUploadApi()
+
+    public_id = await make_uploader(api, backoff=0).upload_post(post_id, 'media/ab/cd/abcd.jpg')
+
+    assert public_id == 'media/ab/cd/abcd'
+    assert api.calls == [('media/ab/cd/abcd.jpg', 'media/ab/cd/abcd')]
+    post = await load(post_id, async_session)
+    assert (post.upload_status, post.remote_public_id, post.upload_attempts) == ('uploaded', 'media/ab/cd/abcd', 1)
+
+
+@pytest.mark.asyncio
+async def test_upload_post_retries(make_post, async_session):
+    post_id = make_post('media/ef/01/ef01.jpg')
+    uploader = make_uploader(FakeUploadApi(failures=2), max_attempts=3, backoff=0)
+
+    assert await uploader.upload_post(post_id, 'media/ef/01/ef01.jpg') == 'media/ef/01/ef01'
+
+    post = await load(post_id, async_session)
+    assert (post.upload_status, post.upload_attempts) == ('uploaded', 3)
+    assert uploader.stats() == {"uploaded": 1, "reused": 0, "retries": 2, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_upload_post_gives_up(make_post, async_session):
+    post_id = make_post('media/23/45/2345.jpg')
+    api = FakeUploadApi(failures=10)
+    uploader = make_uploader(api, max_attempts=3, backoff=0)
+
+    assert await uploader.upload_post(post_id, 'media/23/45/2345.jpg') is None
+
+    assert len(api.calls) == 3
+    post = await load(post_id, async_session)
+    assert (post.upload_status, post.remote_public_id, post.upload_attempts) == ('failed', None, 3)
+    assert uploader.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_post_holds_no_session_while_uploading(make_post):
+    post_id = make_post('media/cd/02/cd02.jpg')
+    open_sessions = []
+
+    @contextlib.asynccontextmanager
+    async def session_factory():
+        async with TestingAsyncSessionLocal() as db:
+            open_sessions.append(db)
+            try:
+                yield db
+            finally:
+                open_sessions.remove(db)
+
+    class CheckingUploadApi(FakeUploadApi):
+        def __call__(self, image_url: str, public_id: str) -> str:
+            assert not open_sessions
+            return super().__call__(image_url, public_id)
+
+    api = CheckingUploadApi(failures=1)
+    uploader = RemoteUploader(api, max_attempts=2, backoff=0, session_factory=session_factory)
+
+    assert await uploader.upload_post(post_id, 'media/cd/02/cd02.jpg') == 'media/cd/02/cd02'
+    assert len(api.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_same_photo_is_uploaded_once(make_post, async_session):
+    first, second = make_post('media/67/89/6789.jpg'), make_post('media/67/89/6789.jpg')
+    api = FakeUploadApi()
+    uploader = make_uploader(api, backoff=0)
+
+    await uploader.upload_post(first, 'media/67/89/6789.jpg')
+    await uploader.upload_post(second, 'media/67/89/6789.jpg')
+
+    assert len(api.calls) == 1
+    post = await load(second, async_session)
+    assert (post.upload_status, post.remote_public_id) == ('uploaded', 'media/67/89/6789')
+    assert uploader.stats()["reused"] == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_pending(make_post, async_session):
+    pending, failed = make_post('media/aa/00/aa00.jpg'), make_post('media/aa/11/aa11.jpg')
+    await make_uploader(FakeUploadApi(failures=1), max_attempts=1).upload_post(failed, 'media/aa/11/aa11.jpg')
+    api = FakeUploadApi()
+
+    assert await make_uploader(api, backoff=0).upload_pending() >= 2
+
+    assert ('media/aa/00/aa00.jpg', 'media/aa/00/aa00') in api.calls
+    for post_id in (pending, failed):
+        assert (await load(post_id, async_session)).upload_status == UploadStatus.uploaded.value
+
+
+@pytest.mark.asyncio
+async def test_cloudinary_backend_publish(make_post, async_session):
+    post_id = make_post('media/bb/00/bb00.jpg')
+    backend = CloudinaryTransformBackend(make_uploader(FakeUploadApi(), backoff=0))
+
+    await backend.publish(post_id, 'media/bb/00/bb00.jpg')
+
+    assert backend.stats() == {"backend": "cloudinary",
+                               "uploads": {"uploaded": 1, "reused": 0, "retries": 0, "failed": 0}}
+
+
+def test_get_transformed_url_builds_url_only():
+    url = get_transformed_url('media/ab/cd/abcd', [{'effect': 'grayscale:100'}])
+
+    assert url.startswith('https://res.cloudinary.com/')
+    assert url.endswith('/image/upload/e_grayscale:100/v1/media/ab/cd/abcd')
+
+
+def test_transformation_for_image_not_uploaded(client, session, monkeypatch):
+    monkeypatch.setattr("src.routes.transform_posts.transform_backend", CloudinaryTransformBackend())
+    user = {"username": "waiting", "email": "waiting@example.com", "password": "waiting1", "first_name": "waiting",
+            "last_name": "waiting"}
+    client.post("/api/auth/signup", json=user)
+    token = client.post("/api/auth/login",
+                        data={"username": user['email'], "password": user['password']}).json()["access_token"]
+    post = Post(photo_url='media/cc/00/cc00.jpg', description='still uploading',
+                user_id=session.query(User).filter(User.email == user['email']).first().id)
+    session.add(post)
+    session.commit()
+    post_id = post.id
+
+    response = client.post(f'/api/image/transform/{post_id}', json={"rotate": {"degree": 90}},
+                           headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 409, response.text
+    assert response.json()['detail'] == IMAGE_NOT_UPLOADED
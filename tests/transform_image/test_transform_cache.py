@@ -0,0 +1,155 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from src.database.models import Post
+from src.schemas_transform_posts import TransformImageModel
+from src.services.transform_backends import LocalTransformBackend
+from src.services.transform_cache import TransformCache
+from src.services.transform_posts import create_list_transformation, transform_hash
+
+
+def write(path, size: int) -> str:
+    with open(path, 'wb') as file:
+        file.write(b'x' * size)
+    return str(path)
+
+
+@pytest.fixture()
+def source(tmp_path):
+    path = tmp_path / "photo.jpg"
+    Image.new('RGB', (300, 200), 'orange').save(path, 'JPEG')
+    return str(path)
+
+
+def test_transform_hash_is_canonical():
+    first = TransformImageModel(resize={"width": 100, "height": 50, "crop": "fill", "gravity": "north"},
+                                rotate={"degree": 90})
+    second = TransformImageModel.parse_raw('{"rotate": {"degree": 90}, '
+                                           '"resize": {"gravity": "north", "crop": "fill", "height": 50, "width": 100}}')
+    rotated_first = TransformImageModel(rotate={"degree": 90}, simple_effect=[{"effect": "grayscale", "strength": 1},
+                                                                              {"effect": "negative", "strength": 1}])
+    rotated_second = TransformImageModel(rotate={"degree": 90}, simple_effect=[{"effect": "negative", "strength": 1},
+                                                                               {"effect": "grayscale", "strength": 1}])
+
+    assert transform_hash(create_list_transformation(first)) == transform_hash(create_list_transformation(second))
+    assert transform_hash([{"angle": 90, "radius": 5}]) == transform_hash([{"radius": 5, "angle": 90}])
+    # effects are applied in order, so a different order is a different transformation
+    assert transform_hash(create_list_transformation(rotated_first)) != \
+        transform_hash(create_list_transformation(rotated_second))
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used(tmp_path):
+    cache = TransformCache(str(tmp_path), max_bytes=250)
+    for key in ("a", "b", "c"):
+        await cache.add(key, write(tmp_path / f"{key}.jpg", 100))
+
+    assert await cache.get("a") is None
+    assert await cache.get("b") == str(tmp_path / "b.jpg")
+    await cache.add("d", write(tmp_path / "d.jpg", 100))
+
+    assert await cache.get("c") is None
+    assert not os.path.exists(tmp_path / "c.jpg")
+    assert await cache.get("b") is not None
+    assert cache.stats() == {"size": 2, "bytes": 200, "max_bytes": 250, "hits": 2, "misses": 2,
+                             "evictions": 2, "evicted_bytes": 200, "hit_ratio": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_cache_keeps_file_larger_than_budget(tmp_path):
+    cache = TransformCache(str(tmp_path), max_bytes=50)
+
+    await cache.add("a", write(tmp_path / "a.jpg", 100))
+
+    assert await cache.get("a") is not None
+
+
+@pytest.mark.asyncio
+async def test_cache_index_survives_restart(tmp_path):
+    write(tmp_path / "old.jpg", 100)
+    write(tmp_path / ".transform-partial", 100)
+    os.utime(tmp_path / "old.jpg", (1, 1))
+    write(tmp_path / "new.png", 100)
+
+    cache = TransformCache(str(tmp_path), max_bytes=150)
+    assert cache.stats()["size"] == 0
+    await cache.add("newest", write(tmp_path / "newest.jpg", 10))
+
+    assert await cache.get("old") is None
+    assert await cache.get("new") == str(tmp_path / "new.png")
+    assert cache.stats()["evicted_bytes"] == 100
+
+
+@pytest.mark.asyncio
+async def test_local_backend_renders_once(source, tmp_path):
+    backend = LocalTransformBackend(output_dir=str(tmp_path / "transforms"), workers=1)
+    body = TransformImageModel(resize={"width": 100, "height": 100, "crop": "fill"})
+    try:
+        paths = await asyncio.gather(*(backend.transform(Post(photo_url=source), body) for _ in range(4)))
+        again = await backend.transform(Post(photo_url=source), TransformImageModel.parse_obj(body.dict()))
+    finally:
+        await backend.shutdown()
+
+    assert len(set(paths + [again])) == 1
+    assert backend.completed == 1
+    assert backend.stats()["cache"]["hits"] == 1
+    assert os.listdir(backend.cache.root) == [os.path.basename(again)]
+
+
+@pytest.mark.asyncio
+async def test_keep_links_rendering_out_of_cache(source, tmp_path):
+    backend = LocalTransformBackend(output_dir=str(tmp_path / "transforms"), workers=1, cache_max_bytes=1)
+    try:
+        path = await backend.transform(Post(photo_url=source), TransformImageModel(rotate={"degree": 90}))
+        kept = await backend.keep(path)
+        await backend.transform(Post(photo_url=source), TransformImageModel(rotate={"degree": 180}))
+    finally:
+        await backend.shutdown()
+
+    assert not os.path.exists(path)
+    assert os.path.exists(kept)
+    assert not backend.cache.holds(kept)
+    assert await backend.keep("https://res.cloudinary.com/demo/image/upload/sample.jpg") == \
+        "https://res.cloudinary.com/demo/image/upload/sample.jpg"
+
+
+@pytest.mark.asyncio
+async def test_local_backend_keys_zero_apart_from_missing(source, tmp_path):
+    backend = LocalTransformBackend(output_dir=str(tmp_path / "transforms"), workers=1)
+    # a width of 0 blurs nothing, a missing width blurs the whole width
+    empty = TransformImageModel(blur_effect=[{"effect": "blur_region", "strength": 500, "width": 0, "height": 0}])
+    whole = TransformImageModel(blur_effect=[{"effect": "blur_region", "strength": 500}])
+    try:
+        paths = [await backend.transform(Post(photo_url=source), body) for body in (empty, whole)]
+    finally:
+        await backend.shutdown()
+
+    assert create_list_transformation(empty) == create_list_transformation(whole)
+    assert paths[0] != paths[1]
+    assert backend.completed == 2
+
+
+@pytest.mark.asyncio
+async def test_local_backend_replaces_broken_pool(source, tmp_path):
+    backend = LocalTransformBackend(output_dir=str(tmp_path / "transforms"), workers=1)
+    try:
+        await backend.transform(Post(photo_url=source), TransformImageModel(rotate={"degree": 90}))
+        executor = backend._executor
+        for process in list(executor._processes.values()):
+            process.kill()
+        while not executor._broken:
+            await asyncio.sleep(0.01)
+
+        with pytest.raises(BrokenProcessPool):
+            await backend.transform(Post(photo_url=source), TransformImageModel(rotate={"degree": 180}))
+        path = await backend.transform(Post(photo_url=source), TransformImageModel(rotate={"degree": 180}))
+    finally:
+        await backend.shutdown()
+
+    assert backend._executor is None or backend._executor is not executor
+    assert os.path.isfile(path)
+    assert (backend.completed, backend.failed) == (2, 1)
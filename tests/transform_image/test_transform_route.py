@@ -1,6 +1,6 @@
 import pytest
 
-from src.database.models import Post, User
+from src.database.models import Post, User, UploadStatus
 from src.services.messages_templates import NOT_FOUND
 
 
@@ -30,6 +30,11 @@ def post_id(c_user, token, session):
         session.add(post)
         session.commit()
         session.refresh(post)
+    if post.upload_status != UploadStatus.uploaded.value:
+        # what the background uploader records once the photo is on Cloudinary
+        post.remote_public_id = 'media/test'
+        post.upload_status = UploadStatus.uploaded.value
+        session.commit()
     return post.id
 
 